@@ -0,0 +1,118 @@
+"""
+Regrid benchmark: legacy per-call xe.Regridder vs. cached SparseRegridder.
+
+Synthetic 3 km RAVE lat/lon tile regridded onto a rotated ~3 km
+HRRR-like curvilinear clip around a single fire.
+
+    python benchmarks/bench_regrid.py --timesteps 24 --repeat 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+import numpy as np
+import xarray as xr
+import xesmf as xe
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from processors.grid import silence_c_errors, RegridderCache
+
+
+def make_rave_tile(lat0=34.0, lon0=-119.0, span=2.0, res=0.03, timesteps=1, seed=0):
+    lats = np.arange(lat0, lat0 + span, res)
+    lons = np.arange(lon0, lon0 + span, res) % 360
+    lon2d, lat2d = np.meshgrid(lons, lats)
+    rng = np.random.default_rng(seed)
+    frp = rng.gamma(0.3, 20.0, size=(timesteps, *lat2d.shape)).astype("float32")
+    return xr.Dataset(
+        {"rave_frp": (("time", "grid_yt", "grid_xt"), frp)},
+        coords={
+            "time": np.arange(timesteps),
+            "lat": (("grid_yt", "grid_xt"), lat2d),
+            "lon": (("grid_yt", "grid_xt"), lon2d),
+        },
+    )
+
+
+def make_hrrr_clip(lat0=34.2, lon0=-118.8, span=1.6, res=0.027, rotation_deg=12.0):
+    """Rotated regular grid standing in for a Lambert Conformal HRRR clip."""
+    n = int(span / res)
+    jj, ii = np.meshgrid(np.arange(n), np.arange(n))
+    theta = np.deg2rad(rotation_deg)
+    dx = (jj * np.cos(theta) - ii * np.sin(theta)) * res
+    dy = (jj * np.sin(theta) + ii * np.cos(theta)) * res
+    return xr.Dataset(coords={
+        "lat": (("y", "x"), lat0 + dy),
+        "lon": (("y", "x"), (lon0 + dx) % 360),
+    })
+
+
+def legacy_regrid(rave_ds, hrrr_ds, weights_path):
+    """The pre-cache path: rebuild xe.Regridder from the weights file on every call."""
+    weights_exist = Path(weights_path).exists()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        with silence_c_errors():
+            regridder = xe.Regridder(
+                rave_ds, hrrr_ds, "bilinear",
+                filename=str(weights_path), reuse_weights=weights_exist
+            )
+            if not weights_exist:
+                regridder.to_netcdf(str(weights_path))
+        out = regridder(rave_ds)
+    del regridder
+    return out
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAVE -> HRRR regrid benchmark")
+    parser.add_argument("--timesteps", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rave = make_rave_tile(timesteps=args.timesteps)
+    hrrr = make_hrrr_clip()
+    print(f"RAVE tile {rave.lat.shape} -> HRRR clip {hrrr.lat.shape}, {args.timesteps} timesteps")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_weights = os.path.join(tmp, "legacy.nc")
+        legacy_regrid(rave.isel(time=[0]), hrrr, legacy_weights)  # warm weights on disk
+
+        cache = RegridderCache(Path(tmp) / "store")
+        sparse = cache.get(rave, hrrr)  # warm weights + CSR
+
+        # Legacy pipeline: one xESMF call per hour
+        t_legacy = timed(
+            lambda: [legacy_regrid(rave.isel(time=[i]), hrrr, legacy_weights) for i in range(args.timesteps)],
+            args.repeat,
+        )
+        # Sparse path: all hours in one batched product
+        t_sparse = timed(lambda: sparse(rave, hrrr), args.repeat)
+
+        ref = xr.concat(
+            [legacy_regrid(rave.isel(time=[i]), hrrr, legacy_weights) for i in range(args.timesteps)], dim="time"
+        )
+        err = float(np.nanmax(np.abs(ref["rave_frp"].values - sparse(rave, hrrr)["rave_frp"].values)))
+
+    print(f"{'path':<24}{'seconds':>12}{'per hour (ms)':>16}")
+    print(f"{'xESMF per call':<24}{t_legacy:>12.4f}{1000 * t_legacy / args.timesteps:>16.3f}")
+    print(f"{'SparseRegridder batch':<24}{t_sparse:>12.4f}{1000 * t_sparse / args.timesteps:>16.3f}")
+    print(f"speedup: {t_legacy / t_sparse:.1f}x, max abs diff: {err:.2e}")
+
+
+if __name__ == "__main__":
+    main()
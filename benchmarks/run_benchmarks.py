@@ -0,0 +1,412 @@
+"""
+Offline benchmark suite. Every input is synthetic (see synthetic.py) and
+RAVE/WFIGS are served from localhost (see servers.py), so runs are
+reproducible without network access and comparable across commits.
+
+    python benchmarks/run_benchmarks.py --out bench.json
+    python benchmarks/run_benchmarks.py --out new.json --compare bench.json --threshold 0.15
+
+Suites: subset, decoded, regrid, tasks, fetch, pipeline (default: all).
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import xarray as xr
+import geopandas as gpd
+
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import synthetic
+import servers
+
+from fetchers.hrrr_fetcher import HRRRFetcher
+from fetchers.rave_fetcher import RAVEFetcher
+from fetchers.wfigs_fetcher import WFIGSFetcher
+from processors import grid, grid_index
+from processors.grid import regrid_rave_to_hrrr
+from processors.grid_index import union_bbox
+from pipeline.metrics import METRICS
+
+
+def best_of(fn, repeat):
+    """Best wall time over `repeat` calls, plus the last return value."""
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def reset_caches():
+    """Drops the in-process grid index and regridder registries (cold start)."""
+    grid_index._INDEXES.clear()
+    grid._CACHES.clear()
+
+
+def legacy_spatial_subset(ds, lon_min, lon_max, lat_min, lat_max):
+    """The pre-index HRRR subset: full-grid boolean mask per call."""
+    if ds.longitude.max() > 180:
+        lon_min %= 360
+        lon_max %= 360
+    mask = (
+        (ds.longitude >= lon_min) & (ds.longitude <= lon_max) &
+        (ds.latitude >= lat_min) & (ds.latitude <= lat_max)
+    ).compute()
+    y, x = np.where(mask.values)
+    if len(y) == 0:
+        raise ValueError("BBox does not intersect HRRR grid.")
+    return ds.isel(y=slice(y.min(), y.max() + 1), x=slice(x.min(), x.max() + 1))
+
+
+# ---- suites ----
+
+def bench_subset(args, tmp):
+    hrrr = synthetic.make_hrrr_hour("2025-07-01 00:00")
+    fetcher = HRRRFetcher(save_dir=tmp / "hrrr", index_dir=tmp / "grid_index")
+    results = []
+
+    for n in args.fires:
+        bboxes = synthetic.make_fire_bboxes(n, seed=n)
+
+        t_legacy, _ = best_of(lambda: [legacy_spatial_subset(hrrr, *b) for b in bboxes], args.repeat)
+
+        def cold():
+            reset_caches()
+            for p in (tmp / "grid_index").glob("*.json"):
+                p.unlink()
+            return [fetcher._spatial_subset(hrrr, *b) for b in bboxes]
+
+        t_cold, _ = best_of(cold, args.repeat)
+        t_warm, _ = best_of(lambda: [fetcher._spatial_subset(hrrr, *b) for b in bboxes], args.repeat)
+
+        results.append({"name": f"subset.legacy[fires={n}]", "seconds": t_legacy})
+        results.append({"name": f"subset.index_cold[fires={n}]", "seconds": t_cold})
+        results.append({"name": f"subset.index_warm[fires={n}]", "seconds": t_warm})
+    return results
+
+
+def bench_decoded(args, tmp):
+    """Decoded-HRRR cache: writing one CONUS hour, then reading back only the fire envelope."""
+    t = pd.Timestamp("2025-07-01 00:00")
+    conus = synthetic.make_hrrr_hour(t).isel(time=0)
+    search = "|".join(HRRRFetcher.DEFAULT_VARS)
+    fetcher = HRRRFetcher(
+        save_dir=tmp / "hrrr", index_dir=tmp / "grid_index",
+        decoded_dir=tmp / "hrrr_decoded", decoded_bytes=None,
+    )
+
+    t_store, _ = best_of(lambda: fetcher.decoded.store(t, search, conus), 1)
+    results = [{
+        "name": "decoded.store[hours=1]", "seconds": t_store,
+        "bytes": fetcher.decoded.total_bytes, "in_memory_bytes": int(conus.nbytes),
+    }]
+
+    for n in args.fires:
+        envelope = union_bbox(synthetic.make_fire_bboxes(n, seed=n))
+        t_read, _ = best_of(lambda: fetcher._finish(fetcher._open_decoded(t, search), envelope, lazy=True), args.repeat)
+        results.append({"name": f"decoded.read_envelope[fires={n}]", "seconds": t_read})
+    return results
+
+
+def bench_regrid(args, tmp):
+    hrrr = synthetic.make_hrrr_hour("2025-07-01 00:00")
+    bboxes = synthetic.make_fire_bboxes(max(args.fires), seed=1)
+    centres = [((b[2] + b[3]) / 2, (b[0] + b[1]) / 2) for b in bboxes]
+    times = pd.date_range("2025-07-01", periods=max(args.hours), freq="1h")
+    rave = xr_concat_time([synthetic.make_rave_hour(t, fires=centres) for t in times])
+
+    hrrr_fetcher = HRRRFetcher(save_dir=tmp / "hrrr", index_dir=tmp / "grid_index")
+    rave_fetcher = RAVEFetcher(save_dir=tmp / "rave", index_dir=tmp / "grid_index")
+
+    results = []
+    for n in args.fires:
+        pairs = []
+        for b in bboxes[:n]:
+            h = hrrr_fetcher._spatial_subset(hrrr, *b).rename({"latitude": "lat", "longitude": "lon"})
+            r = rave_fetcher._spatial_subset(rave, *b).rename({"grid_latt": "lat", "grid_lont": "lon"})
+            src = r[["FRP_MEAN"]].rename({"FRP_MEAN": "rave_frp"}).assign_coords(lat=r.lat, lon=r.lon)
+            pairs.append((src, h))
+
+        def run(weights_dir):
+            return [regrid_rave_to_hrrr(src, dst, weights_dir) for src, dst in pairs]
+
+        def cold():
+            reset_caches()
+            return run(tempfile.mkdtemp(dir=tmp))
+
+        t_cold, _ = best_of(cold, 1)
+        weights_dir = tmp / f"weights_{n}"
+        run(weights_dir)
+        t_warm, _ = best_of(lambda: run(weights_dir), args.repeat)
+
+        results.append({"name": f"regrid.cold[fires={n},hours={len(times)}]", "seconds": t_cold})
+        results.append({"name": f"regrid.warm[fires={n},hours={len(times)}]", "seconds": t_warm})
+    return results
+
+
+def bench_tasks(args, tmp):
+    fetcher = WFIGSFetcher()
+    results = []
+    for n in args.incidents:
+        features = synthetic.make_wfigs_features(n, "2025-06-01", "2025-09-01", seed=n)
+        gdf = gpd.GeoDataFrame.from_features(features).set_crs(epsg=4326)
+        t, tasks = best_of(lambda: fetcher.generate_fire_tasks(gdf), args.repeat)
+        results.append({"name": f"tasks.generate_fire_tasks[incidents={n}]", "seconds": t, "tasks": len(tasks)})
+    return results
+
+
+def bench_fetch(args, tmp):
+    """Blocking vs async client: WFIGS paging and RAVE listing + downloads from localhost."""
+    results = []
+    features = synthetic.make_wfigs_features(max(args.incidents), "2025-06-01", "2025-09-01", seed=1)
+    with servers.wfigs_server(features, max_record_count=1000) as srv, \
+            patched(WFIGSFetcher, "URL", srv.url + "query"):
+        fetcher = WFIGSFetcher(page_size=1000)
+        window = ("2025-06-03", "2025-08-30")
+        t, _ = best_of(quiet(lambda: fetcher.fetch_data(*window, min_acres=0)), args.repeat)
+        results.append({"name": f"fetch.wfigs_sync[incidents={len(features)}]", "seconds": t})
+        t, _ = best_of(quiet(lambda: asyncio.run(fetcher.fetch_data_async(*window, min_acres=0))), args.repeat)
+        results.append({"name": f"fetch.wfigs_async[incidents={len(features)}]", "seconds": t})
+
+    for hours in args.hours:
+        start = pd.Timestamp("2025-07-01 00:00")
+        end = start + pd.Timedelta(hours=hours - 1)
+        synthetic.write_rave_files(tmp / f"fetch_rave_{hours}", pd.date_range(start, end, freq="1h"))
+
+        with servers.rave_server(tmp / f"fetch_rave_{hours}") as srv, patched(RAVEFetcher, "BASE_URL", srv.url):
+            def run(prefetch, mode):
+                # Fresh cache dir and listing each call so every repeat downloads everything
+                run_dir = Path(tempfile.mkdtemp(dir=tmp, prefix=f"{mode}_"))
+                fetcher = RAVEFetcher(save_dir=run_dir / "rave", cache_bytes=None)
+                return prefetch(fetcher)
+
+            t, _ = best_of(quiet(lambda: run(lambda f: f.prefetch(start, end), "sync")), args.repeat)
+            results.append({"name": f"fetch.rave_sync[hours={hours}]", "seconds": t})
+            t, _ = best_of(quiet(lambda: run(lambda f: asyncio.run(f.prefetch_async(start, end)), "async")), args.repeat)
+            results.append({"name": f"fetch.rave_async[hours={hours}]", "seconds": t})
+
+    results.extend(bench_hrrr_ranges(args, tmp))
+    return results
+
+
+def bench_hrrr_ranges(args, tmp):
+    """HRRR subset download: one request per GRIB message vs coalesced ranges, cold vs cached .idx."""
+    results = []
+    search = "|".join(HRRRFetcher.DEFAULT_VARS)
+    for hours in args.hours:
+        start = pd.Timestamp("2025-07-01 00:00")
+        times = pd.date_range(start, periods=hours, freq="1h")
+        synthetic.write_hrrr_archive(tmp / f"hrrr_archive_{hours}", times)
+
+        with servers.file_server(tmp / f"hrrr_archive_{hours}") as srv:
+            url = srv.url + "hrrr.{date:%Y%m%d}/conus/hrrr.t{date:%H}z.wrfsfcf00.grib2"
+            local_source = lambda self, t: [(url.format(date=t), url.format(date=t) + ".idx")]
+            with patched(HRRRFetcher, "_sources", local_source):
+                for label, max_gap in (("per_message", -1), ("coalesced", 1 << 20)):
+                    idx_dir = tmp / f"hrrr_idx_{hours}_{label}"
+
+                    def run():
+                        # Fresh raw dir each call; the .idx cache persists unless removed below
+                        fetcher = HRRRFetcher(save_dir=Path(tempfile.mkdtemp(dir=tmp)), idx_dir=idx_dir, max_gap=max_gap)
+                        for t in times:
+                            fetcher._download_subset(t, search, fetcher._subset_path(t, search))
+
+                    def cold():
+                        shutil.rmtree(idx_dir, ignore_errors=True)
+                        run()
+
+                    METRICS.reset()
+                    t_cold, _ = best_of(quiet(cold), 1)
+                    requests = METRICS.snapshot()["counters"].get("hrrr.range_requests", 0)
+                    t_warm, _ = best_of(quiet(run), args.repeat)
+                    results.append({"name": f"fetch.hrrr_ranges_{label}_cold_idx[hours={hours}]", "seconds": t_cold, "range_requests": requests})
+                    results.append({"name": f"fetch.hrrr_ranges_{label}_cached_idx[hours={hours}]", "seconds": t_warm})
+    return results
+
+
+def bench_pipeline(args, tmp):
+    import run_pipeline
+
+    def fake_fetch_hour(self, t, bbox=None, search=None):
+        # Stands in for download + cfgrib decode; everything after it is real
+        ds = synthetic.make_hrrr_hour(t)
+        if bbox:
+            try:
+                ds = self._spatial_subset(ds, *bbox)
+            except ValueError:
+                return None
+        return ds
+
+    results = []
+    for hours in args.hours:
+        start = pd.Timestamp("2025-07-01 00:00")
+        end = start + pd.Timedelta(hours=hours - 1)
+        times = pd.date_range(start, end, freq="1h")
+
+        for n in args.fires:
+            run_dir = tmp / f"pipeline_{n}_{hours}"
+            features = synthetic.make_wfigs_features(n, start, end, seed=n)
+            centres = [tuple(f["geometry"]["coordinates"][::-1]) for f in features]
+            synthetic.write_rave_files(run_dir / "rave_server", times, fires=centres)
+
+            with servers.rave_server(run_dir / "rave_server") as rave_srv, \
+                    servers.wfigs_server(features) as wfigs_srv, \
+                    patched(HRRRFetcher, "_fetch_hour", fake_fetch_hour), \
+                    patched(RAVEFetcher, "BASE_URL", rave_srv.url), \
+                    patched(WFIGSFetcher, "URL", wfigs_srv.url + "query"), \
+                    patched(sys, "argv", [
+                        "run_pipeline.py", "--start", str(start), "--end", str(end),
+                        "--data_root", str(run_dir / "data"),
+                        "--workers", str(args.workers),
+                        "--metrics_file", str(run_dir / "metrics.json"),
+                    ]):
+                reset_caches()
+                METRICS.reset()
+                cwd = os.getcwd()
+                os.chdir(PROJECT_ROOT)  # run_pipeline reads ./config.yaml
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        t0 = time.perf_counter()
+                        run_pipeline.main()
+                        elapsed = time.perf_counter() - t0
+                finally:
+                    os.chdir(cwd)
+
+            with open(run_dir / "metrics.json") as f:
+                stages = json.load(f)["spans"]
+            results.append({
+                "name": f"pipeline.main[fires={n},hours={hours}]",
+                "seconds": elapsed,
+                "stages": {k: round(v["total_s"], 4) for k, v in sorted(stages.items())},
+            })
+    return results
+
+
+SUITES = {
+    "subset": bench_subset,
+    "decoded": bench_decoded,
+    "regrid": bench_regrid,
+    "tasks": bench_tasks,
+    "fetch": bench_fetch,
+    "pipeline": bench_pipeline,
+}
+
+
+# ---- helpers ----
+
+@contextlib.contextmanager
+def patched(obj, attr, value):
+    old = getattr(obj, attr)
+    setattr(obj, attr, value)
+    try:
+        yield
+    finally:
+        setattr(obj, attr, old)
+
+
+def quiet(fn):
+    """fn with the fetchers' progress prints swallowed."""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+    return run
+
+
+def xr_concat_time(datasets):
+    return xr.concat(datasets, dim="time", data_vars="minimal", coords="minimal", compat="override")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(report, baseline, threshold):
+    """Returns the names of cases that got slower than baseline by more than `threshold`."""
+    base = {r["name"]: r["seconds"] for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'case':<52}{'base s':>10}{'new s':>10}{'change':>10}")
+    for r in report["results"]:
+        old = base.get(r["name"])
+        if old is None:
+            continue
+        change = (r["seconds"] - old) / old if old > 0 else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{r['name']:<52}{old:>10.4f}{r['seconds']:>10.4f}{change:>+10.1%}{flag}")
+        if flag:
+            regressions.append(r["name"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LabFetch offline benchmarks")
+    parser.add_argument("--suites", default=",".join(SUITES), help="Comma-separated subset of: " + ", ".join(SUITES))
+    parser.add_argument("--fires", default="1,10,50", help="Fire counts for subset/regrid/pipeline cases.")
+    parser.add_argument("--hours", default="6,24", help="Time spans (hours) for regrid/pipeline cases.")
+    parser.add_argument("--incidents", default="1000,10000,50000", help="Incident counts for generate_fire_tasks.")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="benchmark_report.json")
+    parser.add_argument("--compare", default=None, help="Baseline report to diff against.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown flagged as a regression.")
+    args = parser.parse_args()
+
+    args.fires = [int(x) for x in args.fires.split(",")]
+    args.hours = [int(x) for x in args.hours.split(",")]
+    args.incidents = [int(x) for x in args.incidents.split(",")]
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": pd.Timestamp.now(tz="UTC").isoformat(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="labfetch_bench_") as tmp:
+        for name in args.suites.split(","):
+            print(f"--- {name} ---")
+            for r in SUITES[name](args, Path(tmp)):
+                print(f"  {r['name']:<52}{r['seconds']:>10.4f} s")
+                report["results"].append(r)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
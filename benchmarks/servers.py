@@ -0,0 +1,127 @@
+"""
+Local stand-ins for the NOAA RAVE directory tree, the HRRR AWS archive and
+the WFIGS ArcGIS query endpoint, served from a background thread.
+"""
+import hashlib
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FileHandler(_Handler):
+    """Range-capable static files under `root` (the HRRR archive stand-in)."""
+    root = None
+
+    def _resolve(self):
+        path = (self.root / urlparse(self.path).path.lstrip("/")).resolve()
+        if not str(path).startswith(str(self.root.resolve())) or not path.exists():
+            return None
+        return path
+
+    def do_GET(self):
+        path = self._resolve()
+        if path is None or path.is_dir():
+            return self._send(404)
+        return self._send_file(path)
+
+    def _send_file(self, path):
+        data = path.read_bytes()
+        rng = self.headers.get("Range")
+        if rng and rng.startswith("bytes="):
+            first, _, last = rng[6:].partition("-")
+            start = int(first)
+            stop = min(int(last), len(data) - 1) if last else len(data) - 1
+            if start >= len(data):
+                return self._send(416, headers={"Content-Range": f"bytes */{len(data)}"})
+            return self._send(206, data[start:stop + 1], {"Content-Range": f"bytes {start}-{stop}/{len(data)}"})
+        return self._send(200, data)
+
+
+class RaveHandler(FileHandler):
+    """Apache-style month listings with ETag/304 and Range-capable file serving."""
+
+    def do_GET(self):
+        path = self._resolve()
+        if path is None:
+            return self._send(404)
+
+        if path.is_dir():
+            names = sorted(p.name for p in path.iterdir() if p.suffix == ".nc")
+            body = "<html><body>" + "".join(f'<a href="{n}">{n}</a>\n' for n in names) + "</body></html>"
+            body = body.encode()
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, headers={"ETag": etag})
+            return self._send(200, body, {"Content-Type": "text/html", "ETag": etag})
+
+        return self._send_file(path)
+
+
+class WFIGSHandler(_Handler):
+    """Minimal ArcGIS FeatureServer /query: count-only and offset paging over a fixed feature list."""
+    features = []
+    max_record_count = 2000
+
+    def do_GET(self):
+        q = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        if q.get("returnCountOnly") == "true":
+            return self._send(200, json.dumps({"count": len(self.features)}).encode())
+
+        offset = int(q.get("resultOffset", 0))
+        count = min(int(q.get("resultRecordCount", self.max_record_count)), self.max_record_count)
+        page = self.features[offset:offset + count]
+        exceeded = offset + count < len(self.features) and len(page) == self.max_record_count
+        body = {"type": "FeatureCollection", "features": page, "exceededTransferLimit": exceeded}
+        return self._send(200, json.dumps(body).encode(), {"Content-Type": "application/geo+json"})
+
+
+class LocalServer:
+    """Context manager running a handler class on 127.0.0.1:<random port>."""
+
+    def __init__(self, handler):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def file_server(root):
+    handler = type("BoundFileHandler", (FileHandler,), {"root": Path(root)})
+    return LocalServer(handler)
+
+
+def rave_server(root):
+    handler = type("BoundRaveHandler", (RaveHandler,), {"root": Path(root)})
+    return LocalServer(handler)
+
+
+def wfigs_server(features, max_record_count=2000):
+    handler = type("BoundWFIGSHandler", (WFIGSHandler,), {"features": list(features), "max_record_count": max_record_count})
+    return LocalServer(handler)
@@ -0,0 +1,197 @@
+"""
+Synthetic HRRR / RAVE / WFIGS fixtures for offline benchmarks.
+
+Shapes and naming follow the real products closely enough to exercise the
+same code paths: a 1059 x 1799 Lambert Conformal HRRR grid with 0-360
+longitudes, RAVE NetCDFs carrying grid_latt/grid_lont/FRP_MEAN, and WFIGS
+GeoJSON features with epoch-ms dates.
+"""
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from pyproj import Proj
+
+# ---- HRRR CONUS grid (GRIB2 template 3.30) ----
+HRRR_NY, HRRR_NX = 1059, 1799
+HRRR_DX = 3000.0
+HRRR_FIRST_LAT, HRRR_FIRST_LON = 21.138123, -122.719528
+HRRR_PROJ = dict(proj="lcc", lat_1=38.5, lat_2=38.5, lat_0=38.5, lon_0=-97.5, R=6371229)
+
+# Interior of the HRRR domain, used to place synthetic fires
+FIRE_LAT = (30.0, 48.0)
+FIRE_LON = (-122.0, -100.0)
+
+_HRRR_GRID = None
+
+
+def hrrr_grid():
+    """(lat, lon) 2D arrays of the HRRR grid, lon in 0-360. Cached per process."""
+    global _HRRR_GRID
+    if _HRRR_GRID is None:
+        p = Proj(**HRRR_PROJ)
+        x0, y0 = p(HRRR_FIRST_LON, HRRR_FIRST_LAT)
+        xx, yy = np.meshgrid(x0 + HRRR_DX * np.arange(HRRR_NX), y0 + HRRR_DX * np.arange(HRRR_NY))
+        lon, lat = p(xx, yy, inverse=True)
+        _HRRR_GRID = (lat, lon % 360)
+    return _HRRR_GRID
+
+
+def make_hrrr_hour(t, seed=0):
+    """One decoded HRRR hour as HRRRFetcher._fetch_hour returns it (before bbox subset)."""
+    lat, lon = hrrr_grid()
+    rng = np.random.default_rng(seed + int(pd.Timestamp(t).value // 3_600_000_000_000))
+    shape = lat.shape
+
+    def field(mean, spread):
+        return (mean + spread * rng.standard_normal(shape)).astype("float32")
+
+    ds = xr.Dataset(
+        {
+            "t2m": (("y", "x"), field(288.0, 8.0)),
+            "d2m": (("y", "x"), field(278.0, 6.0)),
+            "u10": (("y", "x"), field(0.0, 4.0)),
+            "v10": (("y", "x"), field(0.0, 4.0)),
+            "blh": (("y", "x"), field(800.0, 300.0)),
+            "sp": (("y", "x"), field(95000.0, 4000.0)),
+            "elevation": (("y", "x"), field(800.0, 600.0)),
+        },
+        coords={
+            "time": pd.Timestamp(t),
+            "step": np.timedelta64(0, "ns"),
+            "latitude": (("y", "x"), lat),
+            "longitude": (("y", "x"), lon),
+        },
+    )
+    return ds.expand_dims("time")
+
+
+# ---- RAVE 3 km ----
+RAVE_LAT = np.arange(20.0, 55.0, 0.03)
+RAVE_LON = np.arange(230.0, 300.0, 0.03)
+
+
+def rave_filename(t):
+    t = pd.Timestamp(t)
+    stamp = t.strftime("%Y%m%d%H%M%S") + "0"
+    return f"RAVE-HrlyEmiss-3km_v2r0_blend_s{stamp}_e{stamp}_c{stamp}.nc"
+
+
+def make_rave_hour(t, fires=(), seed=0):
+    """RAVE-like hourly dataset with FRP hot spots at the given fire centres."""
+    lon2d, lat2d = np.meshgrid(RAVE_LON, RAVE_LAT)
+    frp = np.zeros(lat2d.shape, dtype="float32")
+
+    rng = np.random.default_rng(seed)
+    ny, nx = frp.shape
+    for lat_c, lon_c in fires:
+        j = int((lat_c - RAVE_LAT[0]) / 0.03)
+        i = int(((lon_c % 360) - RAVE_LON[0]) / 0.03)
+        if 0 <= j < ny - 5 and 0 <= i < nx - 5:
+            frp[j:j + 5, i:i + 5] = rng.gamma(2.0, 30.0, size=(5, 5))
+
+    return xr.Dataset(
+        {
+            "FRP_MEAN": (("time", "grid_yt", "grid_xt"), frp[None]),
+            "grid_latt": (("grid_yt", "grid_xt"), lat2d.astype("float32")),
+            "grid_lont": (("grid_yt", "grid_xt"), lon2d.astype("float32")),
+        },
+        coords={"time": [pd.Timestamp(t)]},
+    )
+
+
+def write_rave_files(directory, times, fires=()):
+    """Writes one RAVE NetCDF per hour under directory/YYYY/MM/. Returns the paths."""
+    paths = []
+    for t in pd.DatetimeIndex(times):
+        month_dir = directory / t.strftime("%Y") / t.strftime("%m")
+        month_dir.mkdir(parents=True, exist_ok=True)
+        path = month_dir / rave_filename(t)
+        ds = make_rave_hour(t, fires=fires)
+        ds.to_netcdf(path, encoding={v: {"zlib": True, "complevel": 1} for v in ds.data_vars})
+        paths.append(path)
+    return paths
+
+
+# ---- HRRR archive (.grib2 + .idx) ----
+
+# A slice of the wrfsfcf00 inventory, in file order; every DEFAULT_VARS term appears
+HRRR_SFC_FIELDS = [
+    "REFC:entire atmosphere", "RETOP:cloud top", "VIS:surface", "GUST:surface",
+    "UGRD:250 mb", "VGRD:250 mb", "TMP:500 mb", "HGT:500 mb",
+    "PRES:surface", "HGT:surface", "TMP:surface", "ASNOW:surface",
+    "TMP:2 m above ground", "SPFH:2 m above ground", "DPT:2 m above ground", "RH:2 m above ground",
+    "UGRD:10 m above ground", "VGRD:10 m above ground", "WIND:10 m above ground",
+    "CAPE:surface", "CIN:surface", "APCP:surface", "PWAT:entire atmosphere",
+    "TCDC:entire atmosphere", "DSWRF:surface", "DLWRF:surface", "HPBL:surface",
+    "PBLH:surface", "LAND:surface", "ICEC:surface",
+]
+
+
+def write_hrrr_archive(directory, times, seed=0, message_bytes=(200_000, 1_200_000)):
+    """
+    AWS-style hrrr.YYYYMMDD/conus/ tree with one wrfsfcf00 file per hour.
+    Messages are random bytes (not decodable GRIB) behind a real-format .idx,
+    which is what the index cache and range planner read.
+    """
+    rng = np.random.default_rng(seed)
+    paths = []
+    for t in pd.DatetimeIndex(times):
+        day_dir = directory / f"hrrr.{t:%Y%m%d}" / "conus"
+        day_dir.mkdir(parents=True, exist_ok=True)
+        path = day_dir / f"hrrr.t{t:%H}z.wrfsfcf00.grib2"
+
+        lines, offset = [], 0
+        with open(path, "wb") as f:
+            for k, field in enumerate(HRRR_SFC_FIELDS, start=1):
+                size = int(rng.integers(*message_bytes))
+                f.write(rng.bytes(size))
+                lines.append(f"{k}:{offset}:d={t:%Y%m%d%H}:{field}:anl:")
+                offset += size
+        (day_dir / (path.name + ".idx")).write_text("\n".join(lines) + "\n")
+        paths.append(path)
+    return paths
+
+
+# ---- WFIGS ----
+
+def make_fire_bboxes(n, seed=0, max_pad=1.0):
+    """n random (lon_min, lon_max, lat_min, lat_max) fire boxes inside CONUS."""
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(*FIRE_LAT, size=n)
+    lon = rng.uniform(*FIRE_LON, size=n)
+    pad = rng.uniform(0.5, 0.5 + max_pad, size=n)
+    return [(lo - p, lo + p, la - p, la + p) for la, lo, p in zip(lat, lon, pad)]
+
+
+def make_wfigs_features(n, start, end, seed=0):
+    """GeoJSON features shaped like the WFIGS Incident Locations layer."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start)
+    span_ms = max(1, int((pd.Timestamp(end) - start).total_seconds() * 1000))
+    start_ms = int(start.value // 1_000_000)
+
+    features = []
+    for k in range(n):
+        disc = start_ms + int(rng.integers(0, span_ms))
+        dur = int(rng.integers(6, 72)) * 3_600_000
+        out = disc + dur if rng.random() < 0.5 else None
+        contain = disc + dur // 2 if out is None and rng.random() < 0.7 else None
+        features.append({
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [float(rng.uniform(*FIRE_LON)), float(rng.uniform(*FIRE_LAT))],
+            },
+            "properties": {
+                "OBJECTID": k + 1,
+                "UniqueFireIdentifier": f"2025-SYN-{k:06d}",
+                "IncidentName": f"SYNTH {k}",
+                "IncidentSize": float(rng.choice([120.0, 800.0, 5000.0, 40000.0])),
+                "FireDiscoveryDateTime": disc,
+                "FireOutDateTime": out,
+                "ControlDateTime": None,
+                "ContainmentDateTime": contain,
+            },
+        })
+    return features
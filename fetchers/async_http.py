@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+import aiohttp
+
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from pipeline.metrics import METRICS
+from .download import Downloader, HTTPStatusError
+
+
+class AsyncResponse:
+    """Buffered response with the requests.Response attributes the fetchers use."""
+
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(f"HTTP {self.status_code} for {self.url}")
+
+
+class AsyncHTTPClient:
+    """
+    One pooled aiohttp session shared by every async fetcher.
+
+    Concurrency is capped per host (`per_host`, overridable through
+    `host_limits`) so NOAA, AWS and ArcGIS each get their own budget instead
+    of competing for one thread pool. Downloads follow the same .part /
+    Range-resume / verify-then-rename protocol as Downloader.
+    """
+
+    def __init__(self, limit=64, per_host=8, host_limits=None, chunk_size=1 << 20, retries=3, timeout=60):
+        self.limit = limit
+        self.per_host = per_host
+        self.host_limits = dict(host_limits or {})
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+        self._session = None
+        self._sems = {}
+
+    async def __aenter__(self):
+        self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def open(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=0)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _host(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._sems:
+            self._sems[host] = asyncio.Semaphore(self.host_limits.get(host, self.per_host))
+        return self._sems[host]
+
+    async def _retry(self, fn, label):
+        for attempt in range(1, self.retries + 1):
+            try:
+                return await fn()
+            except (aiohttp.ClientError, asyncio.TimeoutError, IOError) as e:
+                if attempt == self.retries:
+                    raise
+                print(f"  -> Request attempt {attempt}/{self.retries} failed for {label}: {e}")
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+    async def get(self, url, headers=None, params=None):
+        """GET with retries; 5xx responses are retried, anything else is returned."""
+        async def once():
+            async with self._host(url):
+                async with self.open().get(url, headers=headers, params=params) as r:
+                    content = await r.read()
+                    if r.status >= 500:
+                        raise IOError(f"HTTP {r.status}")
+                    METRICS.count("http.bytes_downloaded", len(content))
+                    return AsyncResponse(str(r.url), r.status, r.headers.copy(), content)
+        return await self._retry(once, url)
+
+    async def get_json(self, url, params=None):
+        r = await self.get(url, params=params)
+        r.raise_for_status()
+        return r.json()
+
+    async def get_range(self, url, start, end):
+        """Bytes [start, end] (inclusive; end=None reads to EOF)."""
+        rng = f"bytes={start}-" if end is None else f"bytes={start}-{end}"
+        r = await self.get(url, headers={"Range": rng})
+        r.raise_for_status()
+        if r.status_code == 200:
+            # Server ignored the Range header
+            return r.content[start:None if end is None else end + 1]
+        return r.content
+
+    async def _attempt(self, url, part):
+        offset = part.stat().st_size if part.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        async with self._host(url):
+            async with self.open().get(url, headers=headers) as r:
+                if r.status == 416:
+                    return offset, offset
+                if r.status >= 400:
+                    raise HTTPStatusError(r.status, url)
+
+                if r.status == 200 and offset:
+                    offset = 0
+                total = Downloader._total_size(_StatusHeaders(r), offset)
+
+                with open(part, "ab" if offset else "wb") as f:
+                    async for block in r.content.iter_chunked(self.chunk_size):
+                        f.write(block)
+                        METRICS.count("http.bytes_downloaded", len(block))
+
+        return part.stat().st_size, total
+
+    async def fetch(self, url, dest, sha256=None):
+        """Downloads url to dest. Returns dest on success, None on failure."""
+        dest = Path(dest)
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(None, Downloader.reusable, dest):
+            return dest
+
+        part = dest.with_name(dest.name + ".part")
+        for attempt in range(1, self.retries + 1):
+            try:
+                size, total = await self._attempt(url, part)
+                if total is not None and size != total:
+                    raise IOError(f"size mismatch ({size} of {total} bytes)")
+
+                await loop.run_in_executor(None, Downloader.complete, part, dest, sha256)
+                return dest
+            except HTTPStatusError as e:
+                if not e.retryable:
+                    print(f"  -> Download failed for {dest.name}: {e}")
+                    return None
+                print(f"  -> Download attempt {attempt}/{self.retries} failed for {dest.name}: {e}")
+            except Exception as e:
+                print(f"  -> Download attempt {attempt}/{self.retries} failed for {dest.name}: {e}")
+            if attempt < self.retries:
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+        return None
+
+
+class _StatusHeaders:
+    """Adapts an aiohttp response to the (status_code, headers) shape Downloader._total_size reads."""
+
+    def __init__(self, r):
+        self.status_code = r.status
+        self.headers = r.headers
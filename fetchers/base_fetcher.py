@@ -1,6 +1,10 @@
+import asyncio
+
 from abc import ABC, abstractmethod
 from typing import Union, Dict, Any
 
+from pipeline.metrics import METRICS
+
 class BaseFetcher(ABC):
     def __init__(self, source_name: str, config: Dict[str, Any] = None):
         self.source_name = source_name
@@ -14,9 +18,10 @@ class BaseFetcher(ABC):
     def validate_data(self, data: Any) -> bool:
         pass
 
-    def process(self, start_time: str, end_time: str, bbox: tuple = None) -> Any:
+    def process(self, start_time: str, end_time: str, bbox: tuple = None, **kwargs) -> Any:
         print(f"[{self.source_name}] Starting fetch for {start_time}...")
-        data = self.fetch_data(start_time, end_time, bbox)
+        with METRICS.span(f"{self.source_name.lower()}.process"):
+            data = self.fetch_data(start_time, end_time, bbox, **kwargs)
         
         if data is None:
             print(f"[{self.source_name}] No data found for given parameters.")
@@ -26,4 +31,27 @@ class BaseFetcher(ABC):
             return data
         else:
             print(f"[{self.source_name}] Data validation failed.")
-            return None
\ No newline at end of file
+            return None
+
+    # ---- async contract ----
+    # Network stages share one AsyncHTTPClient; CPU-heavy decode stays in executors.
+
+    async def fetch_data_async(self, start_time: str, end_time: str, bbox: tuple = None, client=None) -> Any:
+        """Default: the blocking fetch_data on the loop's executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.fetch_data, start_time, end_time, bbox)
+
+    async def process_async(self, start_time: str, end_time: str, bbox: tuple = None, client=None, **kwargs) -> Any:
+        print(f"[{self.source_name}] Starting async fetch for {start_time}...")
+        with METRICS.span(f"{self.source_name.lower()}.process"):
+            data = await self.fetch_data_async(start_time, end_time, bbox, client=client, **kwargs)
+
+        if data is None:
+            print(f"[{self.source_name}] No data found for given parameters.")
+            return None
+
+        if self.validate_data(data):
+            return data
+        else:
+            print(f"[{self.source_name}] Data validation failed.")
+            return None
@@ -0,0 +1,70 @@
+import hashlib
+import os
+import xarray as xr
+import pandas as pd
+
+from pathlib import Path
+
+from .raw_cache import RawFileCache
+
+
+class DecodedCache:
+    """
+    Decoded CONUS HRRR hours (after merge, step selection and the elevation
+    rename) stored as tiled, lightly compressed NetCDF, keyed by hour and
+    search string. Reruns open an hour lazily and only read the tiles their
+    fires touch instead of downloading and decoding GRIB again.
+
+    Files are budgeted like raw downloads (RawFileCache): least-recently-used
+    hours go first once `max_bytes` is exceeded, pinned hours are kept.
+    """
+
+    def __init__(self, root, max_bytes=None, max_age=None, tile=256, complevel=1):
+        self.root = Path(root)
+        self.files = RawFileCache(self.root, max_bytes=max_bytes, max_age=max_age, metric="decoded_cache")
+        self.tile = tile
+        self.complevel = complevel
+
+    def path(self, t, search):
+        tag = hashlib.blake2b(search.encode(), digest_size=4).hexdigest()
+        return self.root / f"hrrr_{pd.Timestamp(t):%Y%m%d%H}_{tag}.nc"
+
+    def open(self, t, search, chunks=None):
+        """Lazy dataset for (hour, search), or None on a miss."""
+        path = self.path(t, search)
+        if path not in self.files.files(t) or not path.exists():
+            return None
+        try:
+            return xr.open_dataset(path, chunks=chunks or {})
+        except Exception as e:
+            print(f"  -> Decoded cache entry unreadable ({path.name}): {e}")
+            self.files.discard(t)
+            return None
+
+    def store(self, t, search, ds):
+        """Writes one decoded CONUS hour; failures only cost the cache entry."""
+        path = self.path(t, search)
+        part = path.with_name(path.name + ".part")
+        encoding = {}
+        for name, da in ds.variables.items():
+            if {"y", "x"}.issubset(da.dims):
+                chunks = tuple(min(self.tile, n) if d in ("y", "x") else n for d, n in zip(da.dims, da.shape))
+                encoding[name] = {"zlib": True, "complevel": self.complevel, "shuffle": True, "chunksizes": chunks}
+        try:
+            ds.to_netcdf(part, encoding=encoding)
+            os.replace(part, path)
+            self.files.add(t, path)
+        except Exception as e:
+            print(f"  -> Could not cache decoded hour {t}: {e}")
+            part.unlink(missing_ok=True)
+
+    @property
+    def total_bytes(self):
+        return self.files.total_bytes
+
+    def pin(self, t):
+        self.files.pin(t)
+
+    def release(self, t):
+        self.files.unpin(t)
+        self.files.evict()
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import threading
+import time
+import requests
+
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+
+from pipeline.metrics import METRICS
+
+# Client errors worth another attempt; any other 4xx fails the download at once
+RETRYABLE_4XX = {408, 425, 429}
+
+
+class HTTPStatusError(IOError):
+    def __init__(self, status, url):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+    @property
+    def retryable(self):
+        return self.status >= 500 or self.status in RETRYABLE_4XX
+
+
+class Downloader:
+    """
+    Pooled, streaming HTTP downloader.
+
+    Bytes stream into `<dest>.part` and the file is only renamed into place
+    once its size (and checksum, when one is known) checks out, so a crash
+    never leaves a truncated file that looks complete. Interrupted transfers
+    resume from the partial file with an HTTP Range request.
+
+    Every completed file gets its SHA-256 recorded next to it
+    (`<dest>.sha256`); a file found on disk later is checked against it
+    before being reused.
+    """
+
+    def __init__(self, pool_size=8, chunk_size=1 << 20, retries=3, timeout=60):
+        self.pool_size = pool_size
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        # requests.Session is not thread-safe; each worker thread keeps its own keep-alive pool
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+        return session
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    @staticmethod
+    def _total_size(r, offset):
+        """Full object size from Content-Range (206) or Content-Length (200)."""
+        content_range = r.headers.get("Content-Range")
+        if content_range and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            return int(total) if total.isdigit() else None
+        length = r.headers.get("Content-Length")
+        if length is None:
+            return None
+        return int(length) + (offset if r.status_code == 206 else 0)
+
+    @staticmethod
+    def _sha256(path):
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    @staticmethod
+    def digest_path(dest):
+        dest = Path(dest)
+        return dest.with_name(dest.name + ".sha256")
+
+    @classmethod
+    def verify(cls, dest):
+        """False when dest no longer matches its recorded digest (True if none was recorded)."""
+        try:
+            recorded = cls.digest_path(dest).read_text().split()[0]
+        except (OSError, IndexError):
+            return True
+        return cls._sha256(dest) == recorded
+
+    @classmethod
+    def complete(cls, part, dest, sha256=None):
+        """Checks a fully downloaded .part, records its digest and renames it to dest."""
+        digest = cls._sha256(part)
+        if sha256 and digest != sha256:
+            part.unlink()
+            raise IOError("checksum mismatch")
+
+        record = cls.digest_path(dest)
+        tmp = record.with_name(record.name + ".part")
+        tmp.write_text(f"{digest}  {dest.name}\n")
+        os.replace(tmp, record)
+        os.replace(part, dest)
+        return digest
+
+    @classmethod
+    def reusable(cls, dest):
+        """True if dest exists and matches its recorded digest; corrupt files are removed."""
+        if not dest.exists():
+            return False
+        if cls.verify(dest):
+            return True
+        print(f"  -> {dest.name} does not match its recorded checksum; downloading again")
+        METRICS.count("http.checksum_mismatches")
+        dest.unlink(missing_ok=True)
+        return False
+
+    def _attempt(self, url, part):
+        offset = part.stat().st_size if part.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self.get(url, headers=headers, stream=True) as r:
+            if r.status_code == 416:
+                # Partial file already holds every byte
+                return offset, offset
+            if r.status_code >= 400:
+                raise HTTPStatusError(r.status_code, url)
+
+            if r.status_code == 200 and offset:
+                # Server ignored the Range header: start over
+                offset = 0
+            total = self._total_size(r, offset)
+
+            with open(part, "ab" if offset else "wb") as f:
+                for block in r.iter_content(chunk_size=self.chunk_size):
+                    if block:
+                        f.write(block)
+                        METRICS.count("http.bytes_downloaded", len(block))
+
+        return part.stat().st_size, total
+
+    def fetch(self, url, dest, sha256=None):
+        """Downloads url to dest. Returns dest on success, None on failure."""
+        dest = Path(dest)
+        if self.reusable(dest):
+            return dest
+
+        part = dest.with_name(dest.name + ".part")
+        for attempt in range(1, self.retries + 1):
+            try:
+                size, total = self._attempt(url, part)
+                if total is not None and size != total:
+                    raise IOError(f"size mismatch ({size} of {total} bytes)")
+
+                self.complete(part, dest, sha256)
+                return dest
+            except HTTPStatusError as e:
+                if not e.retryable:
+                    print(f"  -> Download failed for {dest.name}: {e}")
+                    return None
+                print(f"  -> Download attempt {attempt}/{self.retries} failed for {dest.name}: {e}")
+            except Exception as e:
+                print(f"  -> Download attempt {attempt}/{self.retries} failed for {dest.name}: {e}")
+            if attempt < self.retries:
+                time.sleep(min(2 ** attempt, 30))
+
+        return None
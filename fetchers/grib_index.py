@@ -0,0 +1,135 @@
+import os
+import re
+import threading
+import pandas as pd
+
+from collections import OrderedDict
+from pathlib import Path
+
+from pipeline.metrics import METRICS
+
+
+def parse_idx(text):
+    """wgrib2 .idx -> [(start_byte, end_byte or None, ':VAR:level:fxx:')] in file order."""
+    rows = []
+    for line in text.splitlines():
+        parts = line.split(":")
+        if len(parts) < 6:
+            continue
+        rows.append((int(parts[1]), ":" + ":".join(parts[3:])))
+
+    # Sub-messages (e.g. '5.1', '5.2') share a start byte; a message ends where the next starts
+    starts = sorted({start for start, _ in rows})
+    ends = dict(zip(starts, [s - 1 for s in starts[1:]] + [None]))
+    return [(start, ends[start], key) for start, key in rows]
+
+
+def plan_ranges(idx, search, max_gap=1 << 20):
+    """
+    Byte-range requests for the messages matching a Herbie-style regex search.
+
+    Returns [(start, end, pieces)]: each request covers one or more wanted
+    messages (`pieces`, as (start, end) pairs). Messages closer than `max_gap`
+    bytes are merged into one request and the bytes between them are dropped
+    again by extract(); adjacent messages always merge (max_gap=-1 disables
+    merging entirely).
+    """
+    pattern = re.compile(search)
+    wanted = sorted({(start, end) for start, end, key in idx if pattern.search(key)}, key=lambda r: r[0])
+
+    requests = []
+    for start, end in wanted:
+        if requests:
+            r_start, r_end, pieces = requests[-1]
+            if r_end is not None and start - r_end - 1 <= max_gap:
+                requests[-1] = (r_start, end, pieces + [(start, end)])
+                continue
+        requests.append((start, end, [(start, end)]))
+    return requests
+
+
+def extract(request, buffer):
+    """The wanted messages of one plan_ranges request, cut out of its response body."""
+    r_start, _, pieces = request
+    return b"".join(buffer[s - r_start:(None if e is None else e - r_start + 1)] for s, e in pieces)
+
+
+def gap_bytes(requests):
+    """Bytes fetched only to bridge two wanted messages."""
+    return sum(
+        s - prev_e - 1
+        for _, _, pieces in requests
+        for (_, prev_e), (s, _) in zip(pieces, pieces[1:])
+    )
+
+
+class IdxCache:
+    """
+    GRIB .idx files keyed by (model, product, cycle, fxx). Published index
+    files never change, so entries never expire: parsed indexes stay in a
+    small in-memory LRU and the raw text is kept on disk for later runs.
+    """
+
+    def __init__(self, root, max_memory=256):
+        self.root = Path(root)
+        self.max_memory = max_memory
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+
+    def __reduce__(self):
+        # Process-local, like RawFileCache: workers get paths, never the cache
+        raise TypeError(f"{type(self).__name__} cannot be sent to another process; pass its root directory instead")
+
+    def path(self, key):
+        model, product, cycle, fxx = key
+        return self.root / model / product / f"{pd.Timestamp(cycle):%Y%m%d%H}f{int(fxx):02d}.idx"
+
+    def get(self, key):
+        """Parsed index or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                METRICS.count("idx_cache.hits")
+                return self._memory[key]
+
+        path = self.path(key)
+        if not path.exists():
+            METRICS.count("idx_cache.misses")
+            return None
+        METRICS.count("idx_cache.hits")
+        return self._remember(key, parse_idx(path.read_text()))
+
+    def put(self, key, text):
+        """Stores a downloaded index and returns it parsed."""
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(text)
+        os.replace(tmp, path)
+        return self._remember(key, parse_idx(text))
+
+    def _remember(self, key, idx):
+        with self._lock:
+            self._memory[key] = idx
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory:
+                self._memory.popitem(last=False)
+        return idx
+
+    def fetch(self, key, url, http_get):
+        """Cached index, or downloads `url` with a requests-style http_get."""
+        idx = self.get(key)
+        if idx is None:
+            r = http_get(url)
+            r.raise_for_status()
+            idx = self.put(key, r.text)
+        return idx
+
+    async def fetch_async(self, key, url, client):
+        """fetch() over the shared AsyncHTTPClient."""
+        idx = self.get(key)
+        if idx is None:
+            r = await client.get(url)
+            r.raise_for_status()
+            idx = self.put(key, r.text)
+        return idx
@@ -2,12 +2,20 @@ import pandas as pd
 import xarray as xr
 import numpy as np
 import warnings
+import asyncio
+import hashlib
 import os
 
 from pathlib import Path
-from herbie import Herbie
+from types import SimpleNamespace
 
 from .base_fetcher import BaseFetcher
+from .decoded_cache import DecodedCache
+from .download import Downloader
+from .grib_index import IdxCache, plan_ranges, extract, gap_bytes
+from .raw_cache import RawFileCache
+from processors.grid_index import index_for, cut, cut_envelope, within
+from pipeline.metrics import METRICS
 
 # ---- xarray config ----
 xr.set_options(use_new_combine_kwarg_defaults=True)
@@ -27,90 +35,451 @@ class HRRRFetcher(BaseFetcher):
         ":HGT:surface:",
     ]
 
-    def __init__(self, model="hrrr", product="sfc", save_dir=None):
+    # Search term -> variable name(s) it decodes to (after the elevation rename).
+    # Terms missing here are learned by decoding them once (variable_names).
+    VAR_NAMES = {
+        ":TMP:2 m": ("t2m",),
+        ":DPT:2 m": ("d2m",),
+        ":UGRD:10 m": ("u10",),
+        ":VGRD:10 m": ("v10",),
+        ":PBLH:": ("blh",),
+        ":PRES:surface:": ("sp",),
+        ":HGT:surface:": ("elevation",),
+    }
+
+    # cfgrib keys Herbie.xarray reads on top of the defaults (decoded attrs must match it)
+    READ_KEYS = [
+        "parameterName", "parameterUnits", "stepRange", "uvRelativeToGrid", "shapeOfTheEarth",
+        "orientationOfTheGridInDegrees", "southPoleOnProjectionPlane",
+        "LaDInDegrees", "LoVInDegrees", "Latin1InDegrees", "Latin2InDegrees",
+    ]
+
+    # Learned once per process and shared by every instance
+    _LEARNED_NAMES = {}
+
+    def __init__(self, model="hrrr", product="sfc", save_dir=None, index_dir=None, chunks=None, cache_bytes=0, cache_age=None, idx_dir=None, max_gap=1 << 20, decoded_dir=None, decoded_bytes=0, priority=None):
         super().__init__(source_name="HRRR")
         self.model = model
         self.product = product
+        # Herbie source order ("aws", ["google", "aws"], ...); None keeps the model template's order
+        self.priority = priority
         self.save_dir = Path(save_dir) if save_dir else DATA_ROOT / "hrrr"
         self.save_dir.mkdir(parents=True, exist_ok=True)
+        self.index_dir = Path(index_dir) if index_dir else DATA_ROOT / "grid_index"
+        # {"y": n, "x": n}: decode lazily into dask tiles instead of loading CONUS
+        self.chunks = chunks
+        # cache_bytes=0 keeps nothing once an hour is released; None never evicts by size
+        self.cache = RawFileCache(self.save_dir, max_bytes=cache_bytes, max_age=cache_age)
+        # .idx files are immutable once published: fetched once, reused by every search
+        self.idx_cache = IdxCache(Path(idx_dir) if idx_dir else self.save_dir.parent / "hrrr_idx")
+        # Messages closer than this many bytes share one range request
+        self.max_gap = max_gap
+        self.http = Downloader()
+        # Decoded CONUS hours as tiled NetCDF: opt-in, off unless a directory and a nonzero budget are given
+        self.decoded = None
+        if decoded_dir is not None and decoded_bytes != 0:
+            tile = max(self.chunks.values()) if self.chunks else 256
+            self.decoded = DecodedCache(decoded_dir, max_bytes=decoded_bytes, max_age=cache_age, tile=tile)
 
-    @staticmethod
-    def _spatial_subset(ds, lon_min, lon_max, lat_min, lat_max):
-        if ds.longitude.max() > 180:
+    def _resolve(self, ds, lon_min, lon_max, lat_min, lat_max):
+        # Grid never changes: bbox -> (y, x) window is resolved once and cached.
+        # Envelope cuts resolve against the CONUS index and are offset by the cut.
+        index, envelope = index_for(ds, "latitude", "longitude", cache_dir=self.index_dir)
+        if index.lon_max > 180:
             lon_min %= 360
             lon_max %= 360
 
-        mask = (
-            (ds.longitude >= lon_min) & (ds.longitude <= lon_max) & 
-            (ds.latitude >= lat_min) & (ds.latitude <= lat_max)
-        ).compute()
+        return index, envelope, index.slices(lon_min, lon_max, lat_min, lat_max)
+
+    def window(self, ds, lon_min, lon_max, lat_min, lat_max):
+        """(y0, y1, x0, x1) of a bbox on ds's grid, or None when it misses."""
+        _, envelope, window = self._resolve(ds, lon_min, lon_max, lat_min, lat_max)
+        return within(window, envelope)
 
-        y, x = np.where(mask.values)
-        if len(y) == 0:
+    def _spatial_subset(self, ds, lon_min, lon_max, lat_min, lat_max):
+        window = self.window(ds, lon_min, lon_max, lat_min, lat_max)
+        if window is None:
             raise ValueError("BBox does not intersect HRRR grid.")
 
-        return ds.isel(y=slice(y.min(), y.max() + 1), x=slice(x.min(), x.max() + 1))
+        return cut(ds, window, y_dim="y", x_dim="x")
 
-    def fetch_data(self, start_time, end_time, bbox=None, variable=None):
-        times = pd.date_range(start_time, end_time, freq="1h")
-        combined = None
+    def _envelope_subset(self, ds, lon_min, lon_max, lat_min, lat_max):
+        """_spatial_subset for the hour's envelope; the cut stays tied to the CONUS index."""
+        index, envelope, window = self._resolve(ds, lon_min, lon_max, lat_min, lat_max)
+        subset = None if window is None else cut_envelope(ds, index, window, envelope, y_dim="y", x_dim="x")
+        if subset is None:
+            raise ValueError("BBox does not intersect HRRR grid.")
+
+        return subset
+
+    def variable_names(self, probe_time=None):
+        """
+        {search term: variable names} for DEFAULT_VARS. Terms without a
+        VAR_NAMES entry are decoded once at `probe_time` (one GRIB message)
+        to learn their names; without a probe time they are left out.
+        """
+        names = {}
+        for term in self.DEFAULT_VARS:
+            found = self.VAR_NAMES.get(term) or self._LEARNED_NAMES.get(term)
+            if found is None and probe_time is not None:
+                ds = self._fetch_hour(pd.Timestamp(probe_time), search=term)
+                if ds is not None:
+                    found = self._LEARNED_NAMES[term] = tuple(ds.data_vars)
+                    ds.close()
+            if found:
+                names[term] = tuple(found)
+        return names
+
+    def search_for(self, missing):
+        """
+        Search string for just the terms producing a `missing` variable. Terms
+        with unknown names are always kept. None when every term is needed.
+        """
+        names = self.variable_names()
+        terms = [term for term in self.DEFAULT_VARS if term not in names or set(names[term]) & set(missing)]
+        if len(terms) == len(self.DEFAULT_VARS):
+            return None
+        # Nothing from HRRR is missing: one field still provides the target grid
+        return "|".join(terms or self.DEFAULT_VARS[:1])
+
+    # ---- byte-range download ----
+
+    def _template(self, t):
+        """Herbie's model template rendered for hour t, without Herbie's per-source requests."""
+        from herbie import models
+
+        tpl = SimpleNamespace(model=self.model, product=self.product, date=pd.Timestamp(t), fxx=0, get_remoteFileName="")
+        getattr(models, self.model).template(tpl)
+        return tpl
+
+    def _sources(self, t):
+        """
+        [(grib_url, idx_url)] of the template's sources in Herbie's priority
+        order. Sources Herbie can't read by byte range here (signed Azure
+        URLs, local files, expired NOMADS, non-wgrib2 indexes) are left out.
+        """
+        tpl = self._template(t)
+        if getattr(tpl, "EXPECT_IDX_FILE", "remote") != "remote" or getattr(tpl, "IDX_STYLE", "wgrib2") != "wgrib2":
+            return []
+
+        priority = [self.priority] if isinstance(self.priority, str) else self.priority
+        names = [p.lower() for p in priority] if priority else list(tpl.SOURCES)
+        suffix = getattr(tpl, "IDX_SUFFIX", [".grib2.idx"])
+        suffix = suffix if isinstance(suffix, str) else suffix[0]
+        expired = pd.Timestamp.now(tz="UTC").tz_localize(None) - pd.Timedelta(days=14)
+
+        sources = []
+        for name in names:
+            if name not in tpl.SOURCES or name.startswith("local") or "azure" in name:
+                continue
+            if name == "nomads" and pd.Timestamp(t) < expired:
+                continue
+            url = tpl.SOURCES[name]
+            stem = url.rsplit(".", 1)[0] if Path(url).suffix in {".grb", ".grib", ".grb2", ".grib2"} else url
+            sources.append((url, stem + suffix))
+        return sources
+
+    def _idx_key(self, t):
+        # Analysis files only: cycle = valid time, fxx = 0
+        return (self.model, self.product, pd.Timestamp(t), 0)
+
+    def _subset_path(self, t, search):
+        # Same layout as Herbie (model/YYYYMMDD/), tagged with the search so variable sets don't collide
+        tag = hashlib.blake2b(search.encode(), digest_size=4).hexdigest()
+        return self.save_dir / self.model / f"{t:%Y%m%d}" / f"subset_{tag}__hrrr.t{t:%H}z.wrf{self.product}f00.grib2"
+
+    def _plan(self, idx, search):
+        requests = plan_ranges(idx, search, max_gap=self.max_gap)
+        if not requests:
+            raise ValueError(f"No GRIB messages match {search!r}")
+        METRICS.count("hrrr.range_requests", len(requests))
+        METRICS.count("hrrr.messages", sum(len(pieces) for _, _, pieces in requests))
+        METRICS.count("hrrr.gap_bytes", gap_bytes(requests))
+        return requests
 
-        for t in times:
-            H = Herbie(t, model=self.model, product=self.product, save_dir=str(self.save_dir))
-            search = "|".join(self.DEFAULT_VARS) if variable is None else variable
-            
+    def _get_range(self, url, start, end):
+        rng = f"bytes={start}-" if end is None else f"bytes={start}-{end}"
+        r = self.http.get(url, headers={"Range": rng})
+        r.raise_for_status()
+        if r.status_code == 200:
+            # Server ignored the Range header
+            return r.content[start:None if end is None else end + 1]
+        return r.content
+
+    def _write_subset(self, local, blocks):
+        """Wanted messages, in file order, into one GRIB (renamed into place once complete)."""
+        local.parent.mkdir(parents=True, exist_ok=True)
+        part = local.with_name(local.name + ".part")
+        with open(part, "wb") as f:
+            for block in blocks:
+                f.write(block)
+        os.replace(part, local)
+        METRICS.count("hrrr.bytes_downloaded", local.stat().st_size)
+
+    def _download_subset(self, t, search, local):
+        """
+        Cached .idx -> coalesced byte ranges -> subset GRIB at `local`, from
+        the first source whose .idx is reachable. Returns the GRIB URL.
+        """
+        sources = self._sources(t)
+        if not sources:
+            raise ValueError(f"No byte-range source for model {self.model!r}")
+
+        for url, idx_url in sources:
             try:
-                ds_list = H.xarray(search=search)
+                idx = self.idx_cache.fetch(self._idx_key(t), idx_url, self.http.get)
+                break
             except Exception as e:
-                print(f"  -> Fetch failed: {e}")
-                continue
+                error = e
+        else:
+            raise error
+        requests = self._plan(idx, search)
 
-            if not isinstance(ds_list, list): ds_list = [ds_list]
+        with METRICS.span("hrrr.download"):
+            blocks = [extract(req, self._get_range(url, req[0], req[1])) for req in requests]
+        self._write_subset(local, blocks)
+        return url
 
+    def _download_herbie(self, t, search):
+        """Fallback for archives without a reachable .idx: Herbie picks the source. Returns (path, GRIB URL)."""
+        # Herbie pulls in its own source/index stack; load it on first use only
+        from herbie import Herbie
+
+        H = Herbie(t, model=self.model, product=self.product, priority=self.priority, save_dir=str(self.save_dir))
+        with METRICS.span("hrrr.download"):
+            H.download(search=search)
+        local = Path(H.get_localFilePath(search=search))
+        if local.exists():
+            METRICS.count("hrrr.bytes_downloaded", local.stat().st_size)
+        return local, H.grib
+
+    def _decode(self, path, t, search, url=None):
+        """
+        GRIB -> datasets with the same variables, coords and attrs as
+        Herbie.xarray (CF grid mapping included), so hours decoded here
+        line up with stores written through Herbie.
+        """
+        from herbie.crs import get_cf_crs
+        import cfgrib
+
+        # Throwaway index: the subset file is only decoded once per fetch
+        backend_kwargs = {"indexpath": "", "read_keys": self.READ_KEYS, "errors": "raise"}
+        ds_list = cfgrib.open_datasets(str(path), backend_kwargs=backend_kwargs, decode_timedelta=True)
+        if not self.chunks:
+            ds_list = [d.load() for d in ds_list]
+
+        tpl = self._template(t)
+        if url is None:
+            sources = self._sources(t)
+            url = sources[0][0] if sources else None
+        for ds in ds_list:
+            ds.attrs["model"] = str(self.model)
+        cf_params = get_cf_crs(ds_list[0])
+        for ds in ds_list:
+            ds.attrs["product"] = str(self.product)
+            ds.attrs["description"] = tpl.DESCRIPTION
+            ds.attrs["remote_grib"] = str(url)
+            ds.attrs["local_grib"] = str(path)
+            ds.attrs["search"] = str(search)
+            ds.coords["gribfile_projection"] = None
+            ds.coords["gribfile_projection"].attrs = {**cf_params, "long_name": f"{self.model.upper()} model grid projection"}
+            for var in list(ds):
+                ds[var].attrs["grid_mapping"] = "gribfile_projection"
+        return ds_list
+
+    def _fetch_hour(self, t, bbox=None, search=None):
+        """Downloads, decodes and tidies a single HRRR hour. None on failure."""
+        t = pd.Timestamp(t)
+        search = "|".join(self.DEFAULT_VARS) if search is None else search
+        local = self._subset_path(t, search)
+
+        cached = self._open_decoded(t, search)
+        if cached is not None:
+            return self._finish(cached, bbox, lazy=True)
+
+        try:
+            with self.cache.pinned(t):
+                url = None
+                if local not in self.cache.files(t) or not local.exists():
+                    try:
+                        url = self._download_subset(t, search, local)
+                    except Exception as e:
+                        print(f"  -> Byte-range fetch failed ({e}); falling back to Herbie")
+                        local, url = self._download_herbie(t, search)
+                self.cache.add(t, local)
+
+                with METRICS.span("hrrr.decode"):
+                    # The GRIB stays on disk for the raw cache; eviction removes it later
+                    ds_list = self._decode(local, t, search, url)
+        except Exception as e:
+            print(f"  -> Fetch failed: {e}")
+            return None
+
+        return self._conus_and_finish(t, search, ds_list, bbox)
+
+    def _conus_and_finish(self, t, search, ds_list, bbox=None):
+        ds = self._conus(ds_list)
+        if ds is None:
+            return None
+        if self.decoded is None:
+            return self._finish(ds, bbox)
+
+        with METRICS.span("hrrr.decoded_write"):
+            self.decoded.store(t, search, ds)
+        if self.chunks:
+            # Lazy mode: read tiles back from the cache file instead of decoding GRIB a second time
+            cached = self.decoded.open(t, search, chunks=self.chunks)
+            if cached is not None:
+                return self._finish(cached, bbox)
+        return self._finish(ds, bbox)
+
+    def _conus(self, ds_list):
+        """Decoded GRIB datasets -> one CONUS hour: merged, step selected, elevation renamed."""
+        try:
+            ds = xr.merge(ds_list, compat="override")
+        except Exception as e:
+            print(f"  -> Merge failed: {e}")
+            return None
+
+        if "step" in ds.dims: ds = ds.isel(step=0)
+
+        if "orog" in ds: ds = ds.rename({"orog": "elevation"})
+        elif "hgt" in ds: ds = ds.rename({"hgt": "elevation"})
+        return ds
+
+    def _finish(self, ds, bbox=None, lazy=False):
+        """CONUS hour -> what fetch_data hands out: envelope subset, chunked, time-expanded."""
+        if bbox:
             try:
-                ds = xr.merge(ds_list, compat="override")
+                with METRICS.span("hrrr.envelope_subset"):
+                    ds = self._envelope_subset(ds, *bbox)
+            except ValueError:
+                print("  -> BBox empty, skipping.")
+                return None
+
+        if self.chunks:
+            ds = ds.chunk({d: n for d, n in self.chunks.items() if d in ds.dims})
+        elif lazy:
+            # Decoded-cache hit: only the tiles under the envelope are read
+            with METRICS.span("hrrr.decoded_read"):
+                ds = ds.load()
+
+        if "time" in ds.coords: ds = ds.expand_dims("time")
+        return ds
+
+    # ---- decoded cache ----
+
+    def _open_decoded(self, t, search):
+        """Decoded-cache lookup; a narrower search is also served from the full-set entry."""
+        if self.decoded is None:
+            return None
+        ds = self.decoded.open(t, search, chunks=self.chunks)
+
+        full = "|".join(self.DEFAULT_VARS)
+        if ds is None and search != full:
+            names = self.variable_names()
+            terms = search.split("|")
+            if all(term in names for term in terms):
+                ds = self.decoded.open(t, full, chunks=self.chunks)
+                if ds is not None:
+                    keep = [v for term in terms for v in names[term] if v in ds]
+                    ds = ds[keep] if keep else None
+        return ds
+
+    # ---- async ----
+
+    async def _download_subset_async(self, client, t, search, local):
+        sources = self._sources(t)
+        if not sources:
+            raise ValueError(f"No byte-range source for model {self.model!r}")
+
+        for url, idx_url in sources:
+            try:
+                idx = await self.idx_cache.fetch_async(self._idx_key(t), idx_url, client)
+                break
             except Exception as e:
-                print(f"  -> Merge failed: {e}")
-                continue
+                error = e
+        else:
+            raise error
+        requests = self._plan(idx, search)
+
+        with METRICS.span("hrrr.download"):
+            bodies = await asyncio.gather(*(client.get_range(url, start, end) for start, end, _ in requests))
+        self._write_subset(local, [extract(req, body) for req, body in zip(requests, bodies)])
+        return url
+
+    async def _fetch_hour_async(self, client, t, bbox=None, search=None):
+        """_fetch_hour over the .idx and byte-range requests; decode runs in an executor."""
+        t = pd.Timestamp(t)
+        search = "|".join(self.DEFAULT_VARS) if search is None else search
+        local = self._subset_path(t, search)
+        loop = asyncio.get_running_loop()
+
+        cached = await loop.run_in_executor(None, self._open_decoded, t, search)
+        if cached is not None:
+            return await loop.run_in_executor(None, self._finish, cached, bbox, True)
+
+        try:
+            with self.cache.pinned(t):
+                url = None
+                if local not in self.cache.files(t) or not local.exists():
+                    try:
+                        url = await self._download_subset_async(client, t, search, local)
+                    except Exception as e:
+                        print(f"  -> Byte-range fetch failed ({e}); falling back to Herbie")
+                        local, url = await loop.run_in_executor(None, self._download_herbie, t, search)
+                self.cache.add(t, local)
+
+                with METRICS.span("hrrr.decode"):
+                    ds_list = await loop.run_in_executor(None, self._decode, local, t, search, url)
+        except Exception as e:
+            print(f"  -> Fetch failed: {e}")
+            return None
 
-            if "step" in ds.dims: ds = ds.isel(step=0)
+        return await loop.run_in_executor(None, self._conus_and_finish, t, search, ds_list, bbox)
 
-            if bbox:
-                try:
-                    ds = self._spatial_subset(ds, *bbox)
-                except ValueError:
-                    print("  -> BBox empty, skipping.")
-                    continue
+    async def fetch_data_async(self, start_time, end_time, bbox=None, variable=None, client=None):
+        """fetch_data with every hour's index and byte ranges requested concurrently."""
+        if client is None:
+            from .async_http import AsyncHTTPClient
+            async with AsyncHTTPClient() as client:
+                return await self.fetch_data_async(start_time, end_time, bbox, variable, client=client)
+
+        times = pd.date_range(start_time, end_time, freq="1h")
+        hours = await asyncio.gather(*(self._fetch_hour_async(client, t, bbox, variable) for t in times))
+        hours = [ds for ds in hours if ds is not None]
 
-            if "orog" in ds: ds = ds.rename({"orog": "elevation"})
-            elif "hgt" in ds: ds = ds.rename({"hgt": "elevation"})
+        if not hours: return None
+        if len(hours) == 1: return hours[0]
+        return xr.concat(hours, dim="time")
 
-            if "time" in ds.coords: ds = ds.expand_dims("time")
+    def iter_data(self, start_time, end_time, bbox=None, variable=None):
+        """Streaming mode: yields one hourly dataset at a time."""
+        for t in pd.date_range(start_time, end_time, freq="1h"):
+            ds = self._fetch_hour(t, bbox=bbox, search=variable)
+            if ds is not None:
+                yield ds
 
-            if combined is None: combined = ds
-            else: combined = xr.concat([combined, ds], dim="time")
+    def fetch_data(self, start_time, end_time, bbox=None, variable=None):
+        """Batched mode: collects every hour and concatenates once (linear in hours)."""
+        hours = list(self.iter_data(start_time, end_time, bbox=bbox, variable=variable))
 
-        return combined
+        if not hours: return None
+        if len(hours) == 1: return hours[0]
+        return xr.concat(hours, dim="time")
 
     def validate_data(self, data: xr.Dataset) -> bool:
         if len(data.data_vars) == 0:
             return False
         return True
     
+    def pin_timestamp(self, timestamp):
+        """Keeps an hour's GRIB (and decoded file) out of eviction until cleanup_timestamp."""
+        self.cache.pin(timestamp)
+        if self.decoded is not None: self.decoded.pin(timestamp)
+
     def cleanup_timestamp(self, timestamp):
-        """Deletes raw HRRR files for a specific timestamp WITHOUT network calls."""
-        try:
-            # Extract the date and hour signature Herbie uses (e.g., '20250107' and 't13z')
-            ts = pd.to_datetime(timestamp)
-            date_str = ts.strftime('%Y%m%d')
-            hour_str = f"t{ts.strftime('%H')}z"
-            
-            # Recursively find and delete any matching files in the save directory
-            for p in self.save_dir.rglob(f"*{date_str}*{hour_str}*"):
-                if p.is_file():
-                    try:
-                        p.unlink()
-                    except Exception:
-                        pass
-        except Exception:
-            pass
\ No newline at end of file
+        """Releases an hour: its GRIB becomes evictable under the raw cache budget (no tree walk)."""
+        self.cache.unpin(timestamp)
+        self.cache.evict()
+        if self.decoded is not None: self.decoded.release(timestamp)
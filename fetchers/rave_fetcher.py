@@ -1,15 +1,18 @@
-import requests
 import xarray as xr
 import pandas as pd
 import warnings
+import asyncio
 import concurrent.futures
 import os
+import threading
 
-from bs4 import BeautifulSoup
 from pathlib import Path
-from urllib.parse import urljoin
 
 from .base_fetcher import BaseFetcher 
+from .download import Downloader
+from .rave_index import RaveListingIndex
+from .raw_cache import RawFileCache
+from processors.grid_index import get_index, cut
 
 # ---- xarray + warnings config ----
 xr.set_options(use_new_combine_kwarg_defaults=True)
@@ -21,75 +24,51 @@ DATA_ROOT = PROJECT_ROOT / "data"
 class RAVEFetcher(BaseFetcher): 
     BASE_URL = "https://www.ospo.noaa.gov/pub/Blended/RAVE/RAVE-HrlyEmiss-3km/"
 
-    def __init__(self, save_dir=None):
+    def __init__(self, save_dir=None, index_dir=None, download_workers=8, listing_path=None, chunks=None, cache_bytes=0, cache_age=None,
+                 base_url=None, listing_ttl=None):
         super().__init__(source_name="RAVE") 
         self.save_dir = Path(save_dir) if save_dir else DATA_ROOT / "rave"
         self.save_dir.mkdir(parents=True, exist_ok=True)
-        self.file_map = {} 
+        self.index_dir = Path(index_dir) if index_dir else DATA_ROOT / "grid_index"
+        self.download_workers = download_workers
+        # {"grid_yt": n, "grid_xt": n}; default {} keeps the file's own chunking
+        self.chunks = chunks
+        self.downloader = Downloader(pool_size=download_workers)
+        listing_path = Path(listing_path) if listing_path else self.save_dir.parent / "rave_listing.json"
+        self.base_url = base_url or self.BASE_URL
+        listing_kwargs = {"closed_ttl": listing_ttl} if listing_ttl is not None else {}
+        self.listing = RaveListingIndex(listing_path, self.downloader.get, self.base_url, **listing_kwargs)
+        self._relist_lock = threading.Lock()
+        # cache_bytes=0 keeps nothing once an hour is released; None never evicts by size
+        self.cache = RawFileCache(self.save_dir, max_bytes=cache_bytes, max_age=cache_age)
+        self.url_map = {}
 
-    def _list_directory(self, url):
-        try:
-            r = requests.get(url)
-            r.raise_for_status()
-            soup = BeautifulSoup(r.text, "html.parser")
-
-            return [
-                urljoin(url, a.get("href"))
-                for a in soup.find_all("a")
-                if a.get("href", "").endswith(".nc")
-            ]
-        except Exception as e:
-            print(f"Warning: Could not list directory {url}: {e}")
-            return []
-
-    def _collect_nc_files(self, start_time, end_time):
-        start_time = pd.to_datetime(start_time)
-        end_time = pd.to_datetime(end_time)
+    def _collect_nc_files(self, start_time, end_time, hours=None):
+        hours = set(pd.DatetimeIndex(hours)) if hours is not None else None
 
+        # Closed months come from the persisted index; open ones are revalidated
         files = []
-        months = pd.period_range(start_time, end_time, freq="M")
-
-        for p in months:
-            url = f"{self.BASE_URL}{p.strftime('%Y')}/{p.strftime('%m')}/"
-            print("Checking NOAA RAVE Index:", url)
-
-            links = self._list_directory(url)
-            
-            for link in links:
-                name = link.split("/")[-1]
-                try:
-                    ts_str = name.split("_s")[1][:14]
-                    ts = pd.to_datetime(ts_str, format="%Y%m%d%H%M%S")
-                    
-                    if start_time <= ts <= end_time:
-                        files.append(link)
-                except Exception:
-                    continue
-
-        return sorted(files)
+        for ts_str, link in self.listing.collect(start_time, end_time):
+            ts = pd.to_datetime(ts_str, format="%Y%m%d%H%M%S")
+            # Sparse schedules only need the hours a fire is active
+            if hours is None or ts.round("h") in hours:
+                files.append(link)
+
+        return files
 
     @staticmethod
     def _to_0360(lon):
         return lon % 360
 
-    @classmethod
-    def _spatial_subset(cls, ds, lon_min, lon_max, lat_min, lat_max):
-        lon_min = cls._to_0360(lon_min)
-        lon_max = cls._to_0360(lon_max)
+    def window(self, ds, lon_min, lon_max, lat_min, lat_max):
+        """(y0, y1, x0, x1) of a bbox on ds's grid, or None when it misses."""
+        # Grid never changes: bbox -> (y, x) window is resolved once and cached
+        index = get_index(ds["grid_latt"].values, ds["grid_lont"].values, cache_dir=self.index_dir)
+        return index.slices(self._to_0360(lon_min), self._to_0360(lon_max), lat_min, lat_max)
 
-        lon = ds["grid_lont"]
-        lat = ds["grid_latt"]
-
-        mask = (
-            (lon >= lon_min)
-            & (lon <= lon_max)
-            & (lat >= lat_min)
-            & (lat <= lat_max)
-        ).compute()
-
-        import numpy as np
-        y_idx, x_idx = np.where(mask.values)
-        if len(y_idx) == 0:
+    def _spatial_subset(self, ds, lon_min, lon_max, lat_min, lat_max):
+        window = self.window(ds, lon_min, lon_max, lat_min, lat_max)
+        if window is None:
             print("  -> Empty spatial subset — skipping file")
             return None
 
@@ -97,65 +76,110 @@ class RAVEFetcher(BaseFetcher):
             v for v in ds.data_vars
             if {"grid_yt", "grid_xt"}.issubset(ds[v].dims)
         ]
+        return cut(ds[keep_vars + ["grid_latt", "grid_lont"]], window, y_dim="grid_yt", x_dim="grid_xt")
 
-        subset = ds[keep_vars + ["grid_latt", "grid_lont"]].isel(
-            grid_yt=slice(y_idx.min(), y_idx.max() + 1),
-            grid_xt=slice(x_idx.min(), x_idx.max() + 1)
-        )
-        return subset
+    @staticmethod
+    def _file_hour(name):
+        ts_str = name.split("_s")[1][:14]
+        return pd.to_datetime(ts_str, format="%Y%m%d%H%M%S").round("h")
+
+    def _relisted_url(self, url):
+        """
+        The hour's URL after its month is re-listed, when that gives a new one.
+        A listed file that fails to download may have been republished.
+        """
+        name = url.split("/")[-1]
+        t = self._file_hour(name)
+        for ts_str, link in self.listing.lookup(t - pd.Timedelta(minutes=30), t + pd.Timedelta(minutes=30)):
+            if link != url and self._file_hour(link.split("/")[-1]) == t:
+                self.url_map[t] = link
+                return link
+        return None
+
+    def _relist(self, url):
+        ts = pd.to_datetime(url.split("/")[-1].split("_s")[1][:14], format="%Y%m%d%H%M%S")
+        with self._relist_lock:
+            if not self.listing.invalidate(ts):
+                return None
+            self.listing.refresh(ts.to_period("M"))
+            self.listing.save()
+            return self._relisted_url(url)
+
+    async def _relist_async(self, client, url):
+        ts = pd.to_datetime(url.split("/")[-1].split("_s")[1][:14], format="%Y%m%d%H%M%S")
+        if not self.listing.invalidate(ts):
+            return None
+        await self.listing.refresh_async(ts.to_period("M"), client)
+        self.listing.save()
+        return self._relisted_url(url)
 
     def _download_worker(self, url):
         name = url.split("/")[-1]
         local = self.save_dir / name
-        
-        if not local.exists():
+        t = self._file_hour(name)
+
+        # Files only appear under their final name once complete (see Downloader)
+        if local not in self.cache.files(t) or not local.exists():
             print(f"Downloading {name}...")
-            try:
-                r = requests.get(url)
-                r.raise_for_status()
-                local.write_bytes(r.content)
-            except Exception as e:
-                print(f"Failed to download {name}: {e}")
+            if self.downloader.fetch(url, local) is None:
+                relisted = self._relist(url)
+                if relisted is not None:
+                    return self._download_worker(relisted)
+                print(f"Failed to download {name}")
                 return None
+        self.cache.add(t, local)
         return local
 
-    def prefetch(self, start_time, end_time):
-        files = self._collect_nc_files(start_time, end_time)
+    def prefetch(self, start_time, end_time, hours=None):
+        """
+        Resolves the file URL of every hour. With an unbounded raw cache all
+        missing files are also downloaded up front; with a byte budget each
+        hour is downloaded on demand by fetch_data (the RAVE prefetch lane).
+        """
+        files = self._collect_nc_files(start_time, end_time, hours=hours)
         if not files:
             print("No RAVE files found for this range.")
             return {}
 
-        print(f"Found {len(files)} RAVE files. Starting parallel download...")
-
-        local_paths = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-            results = executor.map(self._download_worker, files)
-            for res in results:
-                if res: local_paths.append(res)
-
-        self.file_map = {}
-        for p in local_paths:
+        self.url_map = {}
+        for url in files:
             try:
-                name = p.name
-                ts_str = name.split("_s")[1][:14]
-                ts = pd.to_datetime(ts_str, format="%Y%m%d%H%M%S").round("h")
-                self.file_map[ts] = p 
+                self.url_map[self._file_hour(url.split("/")[-1])] = url
             except Exception:
                 pass
-        
-        print(f"Successfully cached {len(self.file_map)} RAVE files.")
-        return self.file_map
+
+        if self.cache.max_bytes is None:
+            print(f"Found {len(files)} RAVE files. Starting parallel download...")
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+                cached = sum(1 for res in executor.map(self._download_worker, files) if res)
+            print(f"Successfully cached {cached} RAVE files.")
+        else:
+            print(f"Found {len(files)} RAVE files; downloading per hour within a {self.cache.max_bytes / 1e9:.1f} GB raw cache.")
+
+        return self.url_map
 
     def fetch_data(self, start_time, end_time, bbox=None):
-        t = pd.to_datetime(start_time)
-        
-        if t not in self.file_map:
-            print(f"  -> File for {t} not found in prefetch map.")
-            return None
+        t = pd.to_datetime(start_time).round("h")
+
+        with self.cache.pinned(t):
+            files = self.cache.files(t)
+            if not files:
+                if t not in self.url_map:
+                    print(f"  -> File for {t} not found in prefetch map.")
+                    return None
+                local = self._download_worker(self.url_map[t])
+                files = [local] if local is not None else []
+            if not files:
+                return None
+
+            return self._open(files[0], bbox)
 
-        path = self.file_map[t]
+    def _open(self, path, bbox=None):
         try:
-            ds = xr.open_dataset(path, chunks={})
+            ds = xr.open_dataset(path, chunks=self.chunks or {})
+            # Materialize the grid once so per-fire index lookups stay cheap
+            ds["grid_latt"] = ds["grid_latt"].load()
+            ds["grid_lont"] = ds["grid_lont"].load()
             if bbox:
                 return self._spatial_subset(ds, *bbox)
             return ds
@@ -163,17 +187,87 @@ class RAVEFetcher(BaseFetcher):
             print(f"Error opening RAVE file {path}: {e}")
             return None
 
+    # ---- async ----
+
+    async def _download_async(self, client, url):
+        name = url.split("/")[-1]
+        local = self.save_dir / name
+        t = self._file_hour(name)
+
+        if local not in self.cache.files(t) or not local.exists():
+            print(f"Downloading {name}...")
+            if await client.fetch(url, local) is None:
+                relisted = await self._relist_async(client, url)
+                if relisted is not None:
+                    return await self._download_async(client, relisted)
+                print(f"Failed to download {name}")
+                return None
+        self.cache.add(t, local)
+        return local
+
+    async def prefetch_async(self, start_time, end_time, hours=None, client=None):
+        """prefetch() with the listing and downloads on the shared async client."""
+        if client is None:
+            from .async_http import AsyncHTTPClient
+            async with AsyncHTTPClient(per_host=self.download_workers) as client:
+                return await self.prefetch_async(start_time, end_time, hours=hours, client=client)
+
+        hours = set(pd.DatetimeIndex(hours)) if hours is not None else None
+        files = []
+        for ts_str, link in await self.listing.collect_async(start_time, end_time, client):
+            ts = pd.to_datetime(ts_str, format="%Y%m%d%H%M%S")
+            if hours is None or ts.round("h") in hours:
+                files.append(link)
+        if not files:
+            print("No RAVE files found for this range.")
+            return {}
+
+        self.url_map = {}
+        for url in files:
+            try:
+                self.url_map[self._file_hour(url.split("/")[-1])] = url
+            except Exception:
+                pass
+
+        if self.cache.max_bytes is None:
+            print(f"Found {len(files)} RAVE files. Starting async download...")
+            results = await asyncio.gather(*(self._download_async(client, url) for url in files))
+            print(f"Successfully cached {sum(1 for res in results if res)} RAVE files.")
+        else:
+            print(f"Found {len(files)} RAVE files; downloading per hour within a {self.cache.max_bytes / 1e9:.1f} GB raw cache.")
+
+        return self.url_map
+
+    async def fetch_data_async(self, start_time, end_time, bbox=None, client=None):
+        if client is None:
+            from .async_http import AsyncHTTPClient
+            async with AsyncHTTPClient(per_host=self.download_workers) as client:
+                return await self.fetch_data_async(start_time, end_time, bbox, client=client)
+
+        t = pd.to_datetime(start_time).round("h")
+        with self.cache.pinned(t):
+            files = self.cache.files(t)
+            if not files:
+                if t not in self.url_map:
+                    print(f"  -> File for {t} not found in prefetch map.")
+                    return None
+                local = await self._download_async(client, self.url_map[t])
+                files = [local] if local is not None else []
+            if not files:
+                return None
+
+            # NetCDF decode and subsetting are CPU-bound
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._open, files[0], bbox)
+
     def validate_data(self, data: xr.Dataset) -> bool:
         return "FRP_MEAN" in data.data_vars or "rave_frp" in data.data_vars
         
+    def pin_timestamp(self, timestamp):
+        """Keeps an hour's raw file out of eviction until cleanup_timestamp."""
+        self.cache.pin(timestamp)
+
     def cleanup_timestamp(self, timestamp):
-        """Deletes the raw RAVE .nc file for a specific timestamp."""
-        t = pd.to_datetime(timestamp).round("h")
-        if t in self.file_map:
-            local_path = self.file_map[t]
-            if local_path.exists():
-                try:
-                    os.remove(local_path)
-                    del self.file_map[t]
-                except Exception:
-                    pass
\ No newline at end of file
+        """Releases an hour: its file becomes evictable under the raw cache budget."""
+        self.cache.unpin(timestamp)
+        self.cache.evict()
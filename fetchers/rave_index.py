@@ -0,0 +1,213 @@
+import bisect
+import json
+import os
+import pandas as pd
+
+from pathlib import Path
+from urllib.parse import urljoin
+
+TS_FORMAT = "%Y%m%d%H%M%S"
+
+# Files for a month can still land a little after it ends
+CLOSE_GRACE = pd.Timedelta(days=2)
+
+# Closed months are still revalidated (one conditional request) this often
+CLOSED_TTL = pd.Timedelta(days=30)
+
+
+def _utcnow():
+    return pd.Timestamp.now(tz="UTC").tz_localize(None)
+
+
+def parse_listing(html, url, base_url=None):
+    """
+    Returns sorted [(timestamp_str, path), ...] for the .nc links of a listing.
+    Paths are relative to base_url when they live under it, else absolute.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    entries = []
+    for a in soup.find_all("a"):
+        href = a.get("href", "")
+        if not href.endswith(".nc"):
+            continue
+        link = urljoin(url, href)
+        name = link.split("/")[-1]
+        try:
+            ts_str = name.split("_s")[1][:14]
+            pd.to_datetime(ts_str, format=TS_FORMAT)
+        except Exception:
+            continue
+        if base_url and link.startswith(base_url):
+            link = link[len(base_url):]
+        entries.append((ts_str, link))
+    return sorted(entries)
+
+
+class RaveListingIndex:
+    """
+    Persisted timestamp -> file index of the RAVE month directories.
+
+    Closed months (listed after they ended) are served from disk without any
+    request until `closed_ttl` has passed; open months are revalidated with
+    If-None-Match / If-Modified-Since so an unchanged listing costs a single
+    304. Files are stored relative to `base_url` and the index is discarded
+    when the base URL changes. invalidate() forces a full re-list of a month,
+    e.g. after one of its listed files is gone.
+    """
+
+    def __init__(self, path, http_get, base_url, closed_ttl=CLOSED_TTL):
+        self.path = Path(path)
+        self.http_get = http_get
+        self.base_url = base_url
+        self.closed_ttl = closed_ttl
+        self.months = {}
+        self._keys = {}
+        self._invalidated = set()
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        # Listed under another base URL (or before paths were relative): start over
+        if data.get("base_url") == self.base_url:
+            self.months = data.get("months", {})
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"base_url": self.base_url, "months": self.months}, f)
+        os.replace(tmp, self.path)
+
+    def invalidate(self, timestamp):
+        """
+        Forgets the validators of `timestamp`'s month so the next refresh
+        re-lists it in full. Returns False if it was already invalidated by
+        this index, so a month with many missing files is re-listed once.
+        """
+        key = pd.to_datetime(timestamp).strftime("%Y/%m")
+        if key in self._invalidated:
+            return False
+        self._invalidated.add(key)
+        entry = self.months.get(key)
+        if entry:
+            entry.update(etag=None, last_modified=None, closed=False)
+        return True
+
+    def _month_url(self, period):
+        return f"{self.base_url}{period.strftime('%Y')}/{period.strftime('%m')}/"
+
+    def _request(self, period, now=None):
+        """(url, conditional headers) for a month, or None if it is closed and recently checked."""
+        entry = self.months.get(period.strftime("%Y/%m"))
+        if entry and entry.get("closed"):
+            now = _utcnow() if now is None else now
+            checked = entry.get("checked")
+            if checked and now - pd.Timestamp(checked) < self.closed_ttl:
+                return None
+
+        headers = {}
+        if entry:
+            if entry.get("etag"): headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"): headers["If-Modified-Since"] = entry["last_modified"]
+        return self._month_url(period), headers
+
+    def _apply(self, period, url, r, now=None):
+        """Folds a listing response (200 or 304) into the index. Returns True if it changed."""
+        key = period.strftime("%Y/%m")
+        entry = self.months.get(key)
+        now = _utcnow() if now is None else now
+
+        if r.status_code == 304:
+            changed = False
+            entry["closed"] = now > period.end_time + CLOSE_GRACE
+            entry["checked"] = now.isoformat()
+        else:
+            r.raise_for_status()
+            changed = True
+            entry = {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "closed": now > period.end_time + CLOSE_GRACE,
+                "checked": now.isoformat(),
+                "files": parse_listing(r.text, url, self.base_url),
+            }
+
+        self.months[key] = entry
+        self._keys.pop(key, None)
+        return changed
+
+    def refresh(self, period, now=None):
+        """Makes sure the listing for `period` is current. Returns True if it changed."""
+        request = self._request(period, now)
+        if request is None:
+            return False
+
+        url, headers = request
+        print("Checking NOAA RAVE Index:", url)
+        try:
+            return self._apply(period, url, self.http_get(url, headers=headers), now)
+        except Exception as e:
+            print(f"Warning: Could not list directory {url}: {e}")
+            return False
+
+    async def refresh_async(self, period, client, now=None):
+        """refresh() over the shared AsyncHTTPClient."""
+        request = self._request(period, now)
+        if request is None:
+            return False
+
+        url, headers = request
+        print("Checking NOAA RAVE Index:", url)
+        try:
+            return self._apply(period, url, await client.get(url, headers=headers), now)
+        except Exception as e:
+            print(f"Warning: Could not list directory {url}: {e}")
+            return False
+
+    def _month_keys(self, key):
+        """Sorted timestamp keys of a month, built once per listing."""
+        if key not in self._keys:
+            self._keys[key] = [ts for ts, _ in self.months.get(key, {}).get("files", [])]
+        return self._keys[key]
+
+    def lookup(self, start_time, end_time):
+        """Sorted (timestamp_str, url) with start_time <= timestamp <= end_time (bisect per month)."""
+        start_time = pd.to_datetime(start_time)
+        end_time = pd.to_datetime(end_time)
+        lo_key = start_time.strftime(TS_FORMAT)
+        hi_key = end_time.strftime(TS_FORMAT)
+
+        found = []
+        for p in pd.period_range(start_time, end_time, freq="M"):
+            key = p.strftime("%Y/%m")
+            keys = self._month_keys(key)
+            files = self.months.get(key, {}).get("files", [])
+            lo = bisect.bisect_left(keys, lo_key)
+            hi = bisect.bisect_right(keys, hi_key)
+            found.extend((files[i][0], urljoin(self.base_url, files[i][1])) for i in range(lo, hi))
+        return found
+
+    def collect(self, start_time, end_time):
+        """Refreshes the months overlapping the range, persists, and looks it up."""
+        months = pd.period_range(pd.to_datetime(start_time), pd.to_datetime(end_time), freq="M")
+        for p in months:
+            self.refresh(p)
+        self.save()
+        return self.lookup(start_time, end_time)
+
+    async def collect_async(self, start_time, end_time, client):
+        """collect() with every open month revalidated concurrently."""
+        import asyncio
+
+        months = pd.period_range(pd.to_datetime(start_time), pd.to_datetime(end_time), freq="M")
+        await asyncio.gather(*(self.refresh_async(p, client) for p in months))
+        self.save()
+        return self.lookup(start_time, end_time)
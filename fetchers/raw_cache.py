@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+import pandas as pd
+
+from contextlib import contextmanager
+from pathlib import Path
+
+from pipeline.metrics import METRICS
+from .download import Downloader
+
+INDEX_NAME = ".raw_cache_index.json"
+
+
+def _key(timestamp):
+    return pd.to_datetime(timestamp).round("h").isoformat()
+
+
+class RawFileCache:
+    """
+    Byte-budgeted cache of raw downloads (GRIB / NetCDF) keyed by hour.
+
+    The hour -> files index lives in memory and is persisted next to the
+    files, so lookups and eviction never walk the directory tree. Hours are
+    evicted least-recently-used first once the cache exceeds `max_bytes`, or
+    when unused for longer than `max_age`. Pinned hours (still queued for
+    processing) are never evicted.
+    """
+
+    def __init__(self, root, max_bytes=None, max_age=None, metric="raw_cache"):
+        self.root = Path(root)
+        self.metric = metric
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / INDEX_NAME
+        self.max_bytes = max_bytes
+        self.max_age = pd.Timedelta(max_age).total_seconds() if max_age is not None else None
+        self._lock = threading.RLock()
+        self._pins = {}
+        self._entries = self._load()
+
+    def __reduce__(self):
+        # Process-local (locks, pins, a live index): workers get paths, never the cache
+        raise TypeError(f"{type(self).__name__} cannot be sent to another process; pass its root directory instead")
+
+    def _load(self):
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, "r") as f:
+                raw = json.load(f)
+        except Exception:
+            return {}
+
+        # Drop files removed behind our back (one stat per indexed file, no tree walk)
+        entries = {}
+        for key, entry in raw.items():
+            files = [(rel, size) for rel, size in entry["files"] if (self.root / rel).exists()]
+            if files:
+                entries[key] = dict(entry, files=files)
+        return entries
+
+    def _save(self):
+        tmp = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.index_path)
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return sum(size for e in self._entries.values() for _, size in e["files"])
+
+    def add(self, timestamp, path):
+        """Registers a downloaded file under its hour and enforces the budget."""
+        path = Path(path)
+        rel = str(path.resolve().relative_to(self.root.resolve()))
+        size = path.stat().st_size
+        now = time.time()
+        with self._lock:
+            entry = self._entries.setdefault(_key(timestamp), {"files": [], "added": now, "last_used": now})
+            entry["files"] = [f for f in entry["files"] if f[0] != rel] + [[rel, size]]
+            entry["last_used"] = now
+            self.evict()
+
+    def files(self, timestamp):
+        """Cached files for an hour (marks it as recently used). Empty on a miss."""
+        with self._lock:
+            entry = self._entries.get(_key(timestamp))
+            if entry is None:
+                METRICS.count(f"{self.metric}.misses")
+                return []
+            entry["last_used"] = time.time()
+            METRICS.count(f"{self.metric}.hits")
+            return [self.root / rel for rel, _ in entry["files"]]
+
+    def pin(self, timestamp):
+        with self._lock:
+            key = _key(timestamp)
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, timestamp):
+        with self._lock:
+            key = _key(timestamp)
+            n = self._pins.get(key, 0) - 1
+            if n > 0:
+                self._pins[key] = n
+            else:
+                self._pins.pop(key, None)
+
+    @contextmanager
+    def pinned(self, timestamp):
+        self.pin(timestamp)
+        try:
+            yield
+        finally:
+            self.unpin(timestamp)
+
+    def _remove(self, key):
+        for rel, _ in self._entries.pop(key)["files"]:
+            path = self.root / rel
+            # Downloads carry a recorded digest that goes with them
+            for f in (path, Downloader.digest_path(path)):
+                f.unlink(missing_ok=True)
+        METRICS.count(f"{self.metric}.evictions")
+
+    def discard(self, timestamp):
+        """Deletes an hour's files now, pinned or not."""
+        with self._lock:
+            key = _key(timestamp)
+            if key in self._entries:
+                self._remove(key)
+                self._save()
+
+    def evict(self):
+        """Drops expired hours, then LRU hours until under budget. Pinned hours are kept."""
+        with self._lock:
+            now = time.time()
+            candidates = sorted(
+                (k for k in self._entries if k not in self._pins),
+                key=lambda k: self._entries[k]["last_used"],
+            )
+
+            if self.max_age is not None:
+                for key in [k for k in candidates if now - self._entries[k]["last_used"] > self.max_age]:
+                    self._remove(key)
+                    candidates.remove(key)
+
+            if self.max_bytes is not None:
+                total = self.total_bytes
+                for key in candidates:
+                    if total <= self.max_bytes:
+                        break
+                    total -= sum(size for _, size in self._entries[key]["files"])
+                    self._remove(key)
+
+            self._save()
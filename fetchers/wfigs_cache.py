@@ -0,0 +1,102 @@
+import json
+import sqlite3
+import threading
+import pandas as pd
+
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def _ms(ts):
+    return int(pd.Timestamp(ts).value // 1_000_000)
+
+
+class IncidentCache:
+    """
+    SQLite cache of WFIGS incident features plus the discovery-date windows
+    already queried. Recently discovered fires keep changing (size,
+    containment), so a window is only trusted up to `refresh_days` before the
+    moment it was fetched; anything newer is queried again.
+    """
+
+    def __init__(self, path, refresh_days=30):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.refresh = pd.Timedelta(days=refresh_days)
+        self._lock = threading.Lock()
+
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS incidents ("
+                "id TEXT PRIMARY KEY, discovery_ms INTEGER, size REAL, feature TEXT)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS idx_discovery ON incidents (discovery_ms)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS coverage ("
+                "start_ms INTEGER, end_ms INTEGER, min_acres REAL, fetched_ms INTEGER)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def missing(self, start, end, min_acres=0):
+        """Sub-windows of [start, end] that still need an API query."""
+        lo, hi = _ms(start), _ms(end)
+
+        with self._lock, self._connect() as db:
+            rows = db.execute(
+                "SELECT start_ms, end_ms, fetched_ms FROM coverage WHERE min_acres <= ? AND end_ms >= ? AND start_ms <= ?",
+                (min_acres or 0, lo, hi),
+            ).fetchall()
+
+        trusted = sorted(
+            (s, min(e, f - int(self.refresh.total_seconds() * 1000)))
+            for s, e, f in rows
+        )
+
+        gaps, cursor = [], lo
+        for s, e in trusted:
+            if e < cursor:
+                continue
+            if s > cursor:
+                gaps.append((cursor, min(s, hi)))
+            cursor = max(cursor, e)
+            if cursor >= hi:
+                break
+        if cursor < hi:
+            gaps.append((cursor, hi))
+
+        return [(pd.to_datetime(a, unit="ms"), pd.to_datetime(b, unit="ms")) for a, b in gaps if b > a]
+
+    def store(self, features, start, end, min_acres=0, now=None):
+        now = pd.Timestamp.now(tz="UTC").tz_localize(None) if now is None else now
+        rows = []
+        for feat in features:
+            props = feat.get("properties", {})
+            fid = props.get("OBJECTID") or props.get("UniqueFireIdentifier")
+            if fid is None:
+                continue
+            rows.append((str(fid), props.get("FireDiscoveryDateTime"), props.get("IncidentSize"), json.dumps(feat)))
+
+        with self._lock, self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO incidents VALUES (?, ?, ?, ?)", rows)
+            db.execute(
+                "INSERT INTO coverage VALUES (?, ?, ?, ?)",
+                (_ms(start), _ms(end), min_acres or 0, _ms(now)),
+            )
+
+    def select(self, start, end, min_acres=0):
+        query = "SELECT feature FROM incidents WHERE discovery_ms >= ? AND discovery_ms <= ?"
+        params = [_ms(start), _ms(end)]
+        if min_acres:
+            query += " AND size >= ?"
+            params.append(min_acres)
+
+        with self._lock, self._connect() as db:
+            return [json.loads(row[0]) for row in db.execute(query, params)]
@@ -1,26 +1,41 @@
 import geopandas as gpd
 import pandas as pd
-import requests
-from urllib.parse import urlencode
+import asyncio
+import concurrent.futures
 from .base_fetcher import BaseFetcher
+from .download import Downloader
+from .wfigs_cache import IncidentCache
 
 class WFIGSFetcher(BaseFetcher):
     URL = "https://services3.arcgis.com/T4QMspbfLg3qTGWY/arcgis/rest/services/WFIGS_Incident_Locations/FeatureServer/0/query"
 
-    def __init__(self):
+    # Only what generate_fire_tasks (and the cache key) needs
+    OUT_FIELDS = [
+        "OBJECTID",
+        "UniqueFireIdentifier",
+        "IncidentName",
+        "IncidentSize",
+        "FireDiscoveryDateTime",
+        "FireOutDateTime",
+        "ControlDateTime",
+        "ContainmentDateTime",
+    ]
+
+    def __init__(self, cache_path=None, page_size=2000, workers=4, refresh_days=30):
         super().__init__(source_name="WFIGS")
+        self.page_size = page_size
+        self.workers = workers
+        self.http = Downloader(pool_size=workers)
+        self.cache = IncidentCache(cache_path, refresh_days=refresh_days) if cache_path else None
 
     def _parse_date(self, val):
         if not val or pd.isna(val): 
             return None
         return pd.to_datetime(val, unit='ms') if isinstance(val, (int, float)) else pd.to_datetime(val)
 
-    def fetch_data(self, start_time: str, end_time: str, bbox: tuple = None, min_acres: int = 100):
-        search_start = pd.to_datetime(start_time) - pd.Timedelta(days=2)
-        search_end = pd.to_datetime(end_time) + pd.Timedelta(days=2)
-
-        start_str = search_start.strftime('%Y-%m-%d %H:%M:%S')
-        end_str = search_end.strftime('%Y-%m-%d %H:%M:%S')
+    def _where(self, start, end, min_acres):
+        start_str = pd.to_datetime(start).strftime('%Y-%m-%d %H:%M:%S')
+        end_str = pd.to_datetime(end).strftime('%Y-%m-%d %H:%M:%S')
 
         where_clause = (
             f"FireDiscoveryDateTime >= '{start_str}' "
@@ -31,31 +46,159 @@ class WFIGSFetcher(BaseFetcher):
         # Acre filter
         if min_acres: 
             where_clause += f" AND IncidentSize >= {min_acres}"
+        return where_clause
+
+    def _query(self, params):
+        response = self.http.get(self.URL, params=params)
+        response.raise_for_status()
+        data = response.json()
+        if "error" in data:
+            raise RuntimeError(f"ArcGIS API Error: {data['error']}")
+        return data
+
+    def _fetch_page(self, where, offset, count):
+        data = self._query({
+            "where": where,
+            "outFields": ",".join(self.OUT_FIELDS),
+            "orderByFields": "OBJECTID",
+            "resultOffset": offset,
+            "resultRecordCount": count,
+            "f": "geojson",
+            "outSR": "4326",
+        })
+        features = data.get("features", [])
+        exceeded = data.get("exceededTransferLimit") or data.get("properties", {}).get("exceededTransferLimit")
+        return features, bool(exceeded)
+
+    def _fetch_window(self, start, end, min_acres):
+        """Every feature in a discovery window: count, then concurrent pages."""
+        where = self._where(start, end, min_acres)
+        total = self._query({"where": where, "returnCountOnly": "true", "f": "json"}).get("count", 0)
+        if not total:
+            return []
+
+        offsets = list(range(0, total, self.page_size))
+        print(f"  -> Querying WFIGS API ({total} incidents, {len(offsets)} page(s))...")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pages = list(executor.map(lambda o: self._fetch_page(where, o, self.page_size), offsets))
+
+        features = []
+        for offset, (page, exceeded) in zip(offsets, pages):
+            features.extend(page)
+            # Server capped the page below page_size: fill the hole sequentially
+            got = len(page)
+            want = min(self.page_size, total - offset)
+            while exceeded and got < want:
+                more, exceeded = self._fetch_page(where, offset + got, want - got)
+                if not more: break
+                features.extend(more)
+                got += len(more)
+            if got < want:
+                print(f"  -> Warning: WFIGS page at offset {offset} returned {got}/{want} incidents.")
+
+        return features
 
-        params = {
-            "where": where_clause,
-            "outFields": "*", 
+    # ---- async ----
+
+    async def _query_async(self, client, params):
+        data = await client.get_json(self.URL, params=params)
+        if "error" in data:
+            raise RuntimeError(f"ArcGIS API Error: {data['error']}")
+        return data
+
+    async def _fetch_page_async(self, client, where, offset, count):
+        data = await self._query_async(client, {
+            "where": where,
+            "outFields": ",".join(self.OUT_FIELDS),
+            "orderByFields": "OBJECTID",
+            "resultOffset": offset,
+            "resultRecordCount": count,
             "f": "geojson",
-            "outSR": "4326" 
-        }
+            "outSR": "4326",
+        })
+        features = data.get("features", [])
+        exceeded = data.get("exceededTransferLimit") or data.get("properties", {}).get("exceededTransferLimit")
+        return features, bool(exceeded)
+
+    async def _fetch_window_async(self, client, start, end, min_acres):
+        """_fetch_window with the pages gathered on the shared client."""
+        where = self._where(start, end, min_acres)
+        total = (await self._query_async(client, {"where": where, "returnCountOnly": "true", "f": "json"})).get("count", 0)
+        if not total:
+            return []
+
+        offsets = list(range(0, total, self.page_size))
+        print(f"  -> Querying WFIGS API ({total} incidents, {len(offsets)} page(s))...")
+        pages = await asyncio.gather(*(self._fetch_page_async(client, where, o, self.page_size) for o in offsets))
 
-        query_url = f"{self.URL}?{urlencode(params)}"
-        print(f"  -> Querying WFIGS API...")
+        features = []
+        for offset, (page, exceeded) in zip(offsets, pages):
+            features.extend(page)
+            got = len(page)
+            want = min(self.page_size, total - offset)
+            while exceeded and got < want:
+                more, exceeded = await self._fetch_page_async(client, where, offset + got, want - got)
+                if not more: break
+                features.extend(more)
+                got += len(more)
+            if got < want:
+                print(f"  -> Warning: WFIGS page at offset {offset} returned {got}/{want} incidents.")
+
+        return features
+
+    async def fetch_data_async(self, start_time: str, end_time: str, bbox: tuple = None, min_acres: int = 100, client=None):
+        if client is None:
+            from .async_http import AsyncHTTPClient
+            async with AsyncHTTPClient(per_host=self.workers) as client:
+                return await self.fetch_data_async(start_time, end_time, bbox, min_acres, client=client)
+
+        search_start = pd.to_datetime(start_time) - pd.Timedelta(days=2)
+        search_end = pd.to_datetime(end_time) + pd.Timedelta(days=2)
 
         try:
-            response = requests.get(query_url)
-            response.raise_for_status()
-            data = response.json()
+            if self.cache is None:
+                features = await self._fetch_window_async(client, search_start, search_end, min_acres)
+            else:
+                for gap_start, gap_end in self.cache.missing(search_start, search_end, min_acres):
+                    found = await self._fetch_window_async(client, gap_start, gap_end, min_acres)
+                    self.cache.store(found, gap_start, gap_end, min_acres)
+                features = self.cache.select(search_start, search_end, min_acres)
 
-            if "error" in data:
-                print(f"  -> ArcGIS API Error: {data['error']}")
+            if not features:
                 return None
-            if not data.get("features"):
+
+            # Building the frame parses every geometry: keep it off the event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._to_frame, features)
+
+        except Exception as e:
+            print(f"  -> WFIGS Fetch Error: {e}")
+            return None
+
+    @staticmethod
+    def _to_frame(features):
+        gdf = gpd.GeoDataFrame.from_features(features)
+        gdf.set_crs(epsg=4326, inplace=True)
+        return gdf
+
+    def fetch_data(self, start_time: str, end_time: str, bbox: tuple = None, min_acres: int = 100):
+        search_start = pd.to_datetime(start_time) - pd.Timedelta(days=2)
+        search_end = pd.to_datetime(end_time) + pd.Timedelta(days=2)
+
+        try:
+            if self.cache is None:
+                features = self._fetch_window(search_start, search_end, min_acres)
+            else:
+                # Only the uncovered (or too recent to trust) part of the window hits the API
+                for gap_start, gap_end in self.cache.missing(search_start, search_end, min_acres):
+                    self.cache.store(self._fetch_window(gap_start, gap_end, min_acres), gap_start, gap_end, min_acres)
+                features = self.cache.select(search_start, search_end, min_acres)
+
+            if not features:
                 return None
 
-            gdf = gpd.GeoDataFrame.from_features(data["features"])
-            gdf.set_crs(epsg=4326, inplace=True) 
-            return gdf
+            return self._to_frame(features)
             
         except Exception as e:
             print(f"  -> WFIGS Fetch Error: {e}")
@@ -64,41 +207,78 @@ class WFIGSFetcher(BaseFetcher):
     def validate_data(self, data: gpd.GeoDataFrame) -> bool:
         return data is not None and not data.empty and "geometry" in data.columns
 
-    def generate_fire_tasks(self, gdf: gpd.GeoDataFrame, base_pad: float = 0.5):
+    def _parse_date_column(self, gdf, column):
+        """Vectorized _parse_date: epoch-ms numbers in bulk, anything else per value."""
+        if column not in gdf.columns:
+            return pd.Series(pd.NaT, index=gdf.index, dtype="datetime64[ns]")
+
+        col = gdf[column]
+        if pd.api.types.is_numeric_dtype(col):
+            valid = col.notna() & (col != 0)
+            return pd.to_datetime(col.where(valid), unit="ms")
+        return pd.to_datetime(col.map(self._parse_date))
+
+    def generate_task_table(self, gdf: gpd.GeoDataFrame, base_pad: float = 0.5) -> pd.DataFrame:
+        """
+        Columnar task table: one row per fire with bbox bounds, discovery
+        start and the first available end date (out > control > containment).
+        """
+        gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+
+        # Missing sizes stay NaN here (tasks_from_table turns them into an int 0)
+        acres = gdf["IncidentSize"] if "IncidentSize" in gdf.columns else pd.Series(0, index=gdf.index)
+
+        # --- Spatial Padding ---
+        dynamic_pad = base_pad + ((acres.fillna(0) / 10000.0) * 0.1).clip(upper=1.0)
+        bounds = gdf.bounds
+
+        # --- End Date Prio ---
+        end = pd.Series(pd.NaT, index=gdf.index, dtype="datetime64[ns]")
+        end_type = pd.Series(None, index=gdf.index, dtype=object)
+        for column in ("FireOutDateTime", "ControlDateTime", "ContainmentDateTime"):
+            parsed = self._parse_date_column(gdf, column)
+            fill = end.isna() & parsed.notna()
+            end = end.where(~fill, parsed)
+            end_type = end_type.where(~fill, column)
+
+        fire_id = (
+            gdf["UniqueFireIdentifier"] if "UniqueFireIdentifier" in gdf.columns
+            else pd.Series([f"fire_{idx}" for idx in gdf.index], index=gdf.index)
+        )
+        name = gdf["IncidentName"] if "IncidentName" in gdf.columns else pd.Series("Unknown", index=gdf.index)
+
+        return pd.DataFrame({
+            "fire_id": fire_id,
+            "name": name,
+            "start": self._parse_date_column(gdf, "FireDiscoveryDateTime"),
+            "end": end,
+            "end_date_type": end_type,
+            "acres": acres,
+            "lon_min": bounds["minx"] - dynamic_pad,
+            "lon_max": bounds["maxx"] + dynamic_pad,
+            "lat_min": bounds["miny"] - dynamic_pad,
+            "lat_max": bounds["maxy"] + dynamic_pad,
+        }, index=gdf.index)
+
+    @staticmethod
+    def tasks_from_table(table: pd.DataFrame):
+        """
+        Task dicts as consumed by run_pipeline, identical to the per-row
+        generator: missing dates and end types -> None, missing acres -> 0,
+        bounds -> bbox tuple.
+        """
         tasks = []
-        for idx, row in gdf.iterrows():
-            if row.geometry is None or row.geometry.is_empty: continue
-                
-            acres = row.get("IncidentSize", 0)
-            if pd.isna(acres):
-                acres = 0
-                
-            # --- Spatial Padding ---
-            extra_pad = min((acres / 10000.0) * 0.1, 1.0)
-            dynamic_pad = base_pad + extra_pad
-            
-            minx, miny, maxx, maxy = row.geometry.bounds
-            bbox_tuple = (minx - dynamic_pad, maxx + dynamic_pad, miny - dynamic_pad, maxy + dynamic_pad)
-            
-            # --- End Date Prio ---
-            end_date = self._parse_date(row.get("FireOutDateTime"))
-            end_date_type = "FireOutDateTime" if end_date is not None else None # ---> NEW
-            
-            if end_date is None:
-                end_date = self._parse_date(row.get("ControlDateTime"))
-                if end_date is not None: end_date_type = "ControlDateTime" # ---> NEW
-                
-            if end_date is None:
-                end_date = self._parse_date(row.get("ContainmentDateTime"))
-                if end_date is not None: end_date_type = "ContainmentDateTime" # ---> NEW
-            
+        for rec in table.to_dict("records"):
             tasks.append({
-                "fire_id": row.get("UniqueFireIdentifier", f"fire_{idx}"),
-                "name": row.get("IncidentName", "Unknown"),
-                "start": self._parse_date(row.get("FireDiscoveryDateTime")),
-                "end": end_date,
-                "end_date_type": end_date_type, # ---> NEW
-                "acres": acres,
-                "bbox": bbox_tuple
+                "fire_id": rec["fire_id"],
+                "name": rec["name"],
+                "start": None if pd.isna(rec["start"]) else rec["start"],
+                "end": None if pd.isna(rec["end"]) else rec["end"],
+                "end_date_type": None if pd.isna(rec["end_date_type"]) else rec["end_date_type"],
+                "acres": 0 if pd.isna(rec["acres"]) else rec["acres"],
+                "bbox": (rec["lon_min"], rec["lon_max"], rec["lat_min"], rec["lat_max"]),
             })
-        return tasks
\ No newline at end of file
+        return tasks
+
+    def generate_fire_tasks(self, gdf: gpd.GeoDataFrame, base_pad: float = 0.5):
+        return self.tasks_from_table(self.generate_task_table(gdf, base_pad=base_pad))
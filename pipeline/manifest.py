@@ -0,0 +1,255 @@
+import concurrent.futures
+import json
+import os
+import pandas as pd
+import zarr
+
+from pathlib import Path
+
+MANIFEST_SUFFIX = ".manifest.json"
+# Older stores kept the manifest inside the zarr root; it is read once and moved out
+LEGACY_MANIFEST_NAME = "labfetch_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def _to_ranges(times):
+    """Compresses hourly timestamps into [[start_iso, n_hours], ...] runs."""
+    times = pd.DatetimeIndex(times).sort_values().unique()
+    ranges = []
+    for ts in times:
+        if ranges:
+            start, n = ranges[-1]
+            if pd.Timestamp(start) + pd.Timedelta(hours=n) == ts:
+                ranges[-1][1] += 1
+                continue
+        ranges.append([ts.isoformat(), 1])
+    return ranges
+
+
+def _from_ranges(ranges):
+    parts = [pd.date_range(start, periods=n, freq="1h") for start, n in ranges]
+    if not parts:
+        return pd.DatetimeIndex([])
+    return parts[0].append(parts[1:]) if len(parts) > 1 else parts[0]
+
+
+def empty_state():
+    return {"times": pd.DatetimeIndex([]), "vars": set(), "var_times": {}}
+
+
+def merge_state(state, times, variables, backfill=False):
+    """
+    Folds written hours/variables into a state dict. `var_times` tracks the
+    variables that only cover part of the group's hours (added to existing
+    hours by a backfill, or first appended after older hours); a variable
+    leaves it once it covers every hour.
+    """
+    times = pd.DatetimeIndex(times)
+    variables = set(variables)
+    partial = state.setdefault("var_times", {})
+
+    if not backfill:
+        for v in variables - state["vars"]:
+            if len(state["times"]):
+                partial[v] = pd.DatetimeIndex([])
+        state["times"] = state["times"].union(times)
+
+    for v in variables:
+        if v in partial or (backfill and v not in state["vars"]):
+            partial[v] = partial.get(v, pd.DatetimeIndex([])).union(times)
+            if state["times"].difference(partial[v]).empty:
+                del partial[v]
+
+    state["vars"] |= variables
+    return state
+
+
+def missing_vars(state, t, required):
+    """The variables of `required` a group lacks at hour t (all of them if the hour is new)."""
+    if state is None or t not in state["times"]:
+        return set(required)
+    partial = state.get("var_times", {})
+    return {v for v in required if v not in state["vars"] or (v in partial and t not in partial[v])}
+
+
+def _entry_state(entry):
+    return {
+        "times": _from_ranges(entry["times"]),
+        "vars": set(entry["vars"]),
+        "var_times": {v: _from_ranges(r) for v, r in entry.get("var_times", {}).items()},
+    }
+
+
+def _state_entry(state):
+    entry = {"times": _to_ranges(state["times"]), "vars": sorted(state["vars"])}
+    if state.get("var_times"):
+        entry["var_times"] = {v: _to_ranges(t) for v, t in sorted(state["var_times"].items())}
+    return entry
+
+
+def manifest_path(zarr_path):
+    """master.zarr -> master.zarr.manifest.json, a sidecar zarr tooling never lists."""
+    zarr_path = Path(zarr_path)
+    return zarr_path.with_name(zarr_path.name + MANIFEST_SUFFIX)
+
+
+class StoreManifest:
+    """
+    Per-group time/variable index kept in a sidecar file next to the store.
+    It is saved once per flush, after the batch is in the store. A writer
+    marks the manifest `open` for as long as it runs (one extra save per
+    run), so a crashed run is noticed on the next load and every group's
+    stored time axis is checked against its entry (see load_fire_state).
+    """
+
+    def __init__(self, zarr_path):
+        self.path = manifest_path(zarr_path)
+        self.legacy_path = Path(zarr_path) / LEGACY_MANIFEST_NAME
+        self.groups = {}
+        self.open = False
+
+    def load(self):
+        """Reads the manifest in one go. Returns False if missing or unreadable."""
+        path = self.path if self.path.exists() else self.legacy_path
+        if not path.exists():
+            return False
+        try:
+            with open(path, "r") as f:
+                raw = json.load(f)
+        except Exception:
+            return False
+        if raw.get("version") != MANIFEST_VERSION:
+            return False
+        self.groups = raw.get("groups", {})
+        # Legacy manifests flagged writes per group (`pending`) instead
+        self.open = raw.get("open", False)
+        return True
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "open": self.open, "groups": self.groups}, f)
+        os.replace(tmp, self.path)
+        if self.legacy_path.exists():
+            self.legacy_path.unlink()
+
+    def state(self, fid):
+        entry = self.groups.get(fid)
+        if entry is None or entry.get("pending"):
+            return None
+        return _entry_state(entry)
+
+    def begin(self):
+        """Flags the store as being written until end(); a no-op if already flagged."""
+        if not self.open:
+            self.open = True
+            self.save()
+
+    def end(self):
+        if self.open:
+            self.open = False
+            self.save()
+
+    def record(self, fid, times, variables, replace=False, backfill=False):
+        """Marks hours/variables as written. `backfill`: variables added to hours already stored."""
+        entry = self.groups.get(fid)
+        state = empty_state() if replace or entry is None else _entry_state(entry)
+        self.groups[fid] = _state_entry(merge_state(state, times, variables, backfill=backfill))
+        self.save()
+
+    def record_alias(self, fid, target):
+        self.groups[fid] = {"times": [], "vars": [], "alias": target}
+        self.save()
+
+    def aliases(self):
+        """{member fire_id: cluster fire_id} of the attrs-only alias groups."""
+        return {fid: entry["alias"] for fid, entry in self.groups.items() if entry.get("alias")}
+
+
+def scan_group(zarr_path, fid):
+    """Slow path: opens a group to read its time axis and variables (or its alias target)."""
+    import xarray as xr
+
+    target = zarr.open_group(str(zarr_path), mode="r")[fid].attrs.get("CLUSTER_REF")
+    if target:
+        return dict(empty_state(), alias=target)
+
+    ds = xr.open_zarr(zarr_path, group=fid, consolidated=False)
+    try:
+        return {"times": pd.DatetimeIndex(ds.time.values), "vars": set(ds.data_vars.keys())}
+    finally:
+        ds.close()
+
+
+def _time_axis_matches(store, fid, state):
+    """Cheap metadata check after a crash: the stored time axis has as many hours as the entry."""
+    try:
+        group = store[fid]
+        if "time" not in group:
+            return not len(state["times"]) and group.attrs.get("CLUSTER_REF") is not None
+        return group["time"].shape[0] == len(state["times"])
+    except Exception:
+        return False
+
+
+def load_fire_state(zarr_path, logger, workers=8, read_only=False):
+    """
+    Returns (existing_groups, fire_state, manifest). Trusts the manifest for
+    every group it lists (after a crashed run, only where the stored time
+    axis still matches) and rescans the rest in parallel, writing the
+    repaired manifest back unless `read_only` (a store another process may
+    be writing).
+    """
+    manifest = StoreManifest(zarr_path)
+    if not Path(zarr_path).exists():
+        return [], {}, manifest
+
+    store = zarr.open_group(str(zarr_path), mode="r")
+    existing_groups = list(store.group_keys())
+    has_manifest = manifest.load()
+    crashed = has_manifest and manifest.open
+
+    fire_state = {}
+    stale = []
+    for fid in existing_groups:
+        state = manifest.state(fid)
+        if state is not None and crashed and not _time_axis_matches(store, fid, state):
+            state = None
+        if state is None:
+            stale.append(fid)
+        else:
+            fire_state[fid] = state
+
+    # Groups deleted from the store should not linger in the manifest
+    for fid in set(manifest.groups) - set(existing_groups):
+        del manifest.groups[fid]
+
+    if stale:
+        reason = "missing" if not has_manifest else "stale"
+        logger.info(f"Manifest {reason} for {len(stale)} group(s); scanning with {workers} workers...")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(scan_group, zarr_path, fid): fid for fid in stale}
+            for future in concurrent.futures.as_completed(futures):
+                fid = futures[future]
+                try:
+                    state = future.result()
+                    target = state.pop("alias", None)
+                    fire_state[fid] = state
+                    manifest.groups[fid] = _state_entry(state)
+                    if target: manifest.groups[fid]["alias"] = target
+                except Exception as e:
+                    logger.warning(f"Could not read state for {fid}: {e}")
+                    fire_state[fid] = empty_state()
+
+    if read_only:
+        return existing_groups, fire_state, manifest
+
+    if crashed:
+        logger.info("Previous write to the store did not finish; checked every group against the manifest.")
+        manifest.open = False
+    if stale or crashed or not has_manifest or not manifest.path.exists():
+        manifest.save()
+
+    return existing_groups, fire_state, manifest
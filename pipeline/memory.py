@@ -0,0 +1,100 @@
+import math
+import os
+import re
+import resource
+
+import numpy as np
+
+from .metrics import METRICS
+
+_UNITS = {"": 1 << 20, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+# Approximate grid spacing in degrees (3 km)
+HRRR_CELL_DEG = 0.027
+RAVE_CELL_DEG = 0.03
+
+
+def parse_size(text):
+    """'8G', '512MB', '1.5 GiB' -> bytes. A bare number is read as MB."""
+    m = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)(I?B)?\s*", str(text).upper())
+    if not m:
+        raise ValueError(f"Unrecognised memory size: {text!r}")
+    return int(float(m.group(1)) * _UNITS[m.group(2)])
+
+
+def current_rss():
+    """Resident set size of this process in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def tile_chunk(tasks, cell_deg, lo=64, hi=1024):
+    """
+    Square chunk edge (in grid cells) matched to the fire tiles: the median
+    bbox extent, so a typical fire touches a handful of chunks.
+    """
+    if not tasks:
+        return hi
+    extents = [max(b[1] - b[0], b[3] - b[2]) for b in (t["bbox"] for t in tasks)]
+    return int(min(hi, max(lo, math.ceil(np.median(extents) / cell_deg))))
+
+
+def input_chunks(tasks, policy):
+    """
+    (HRRR, RAVE) dask chunks for lazily opened inputs. The HRRR edge is
+    tile_chunk() rounded up to whole `policy.spatial_chunk` tiles so input
+    chunks line up with the zarr encoding; RAVE chunks cover the same ground.
+    """
+    step = max(1, policy.spatial_chunk)
+    n_hrrr = math.ceil(tile_chunk(tasks, HRRR_CELL_DEG) / step) * step
+    n_rave = math.ceil(n_hrrr * HRRR_CELL_DEG / RAVE_CELL_DEG)
+    return {"y": n_hrrr, "x": n_hrrr}, {"grid_yt": n_rave, "grid_xt": n_rave}
+
+
+def resident_bytes(ds):
+    """
+    Bytes of ds actually held in memory. ds.nbytes reports the full virtual
+    size, so lazy variables (dask, or still backed by the GRIB/NetCDF file)
+    are left out.
+    """
+    return sum(var.nbytes for var in ds.variables.values() if var._in_memory)
+
+
+class MemoryBudget:
+    """
+    Keeps the prefetch queue under a byte budget. Each consumed hour reports
+    the bytes it holds in memory; the depth allowed for the next submissions
+    is whatever fits in the budget minus the current RSS, never below one
+    hour. Fully lazy hours hold next to nothing until processed, so they are
+    only throttled once RSS reaches the budget.
+    """
+
+    def __init__(self, limit_bytes, smoothing=0.5):
+        self.limit = int(limit_bytes)
+        self.smoothing = smoothing
+        self.hour_bytes = None
+
+    def observe(self, *datasets):
+        datasets = [ds for ds in datasets if ds is not None]
+        if not datasets:
+            return
+        nbytes = sum(resident_bytes(ds) for ds in datasets)
+        if self.hour_bytes is None:
+            self.hour_bytes = nbytes
+        else:
+            self.hour_bytes = self.smoothing * nbytes + (1 - self.smoothing) * self.hour_bytes
+
+    def depth(self, max_depth):
+        """Hours that may be in flight right now, between 1 and max_depth."""
+        if self.hour_bytes is None:
+            return 1
+        headroom = self.limit - current_rss()
+        if self.hour_bytes < 1:
+            allowed = max_depth if headroom > 0 else 1
+        else:
+            allowed = max(1, min(max_depth, int(headroom // self.hour_bytes)))
+        METRICS.count("memory.depth_throttled", int(allowed < max_depth))
+        return allowed
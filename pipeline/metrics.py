@@ -0,0 +1,106 @@
+import csv
+import functools
+import json
+import resource
+import threading
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Metrics:
+    """
+    Process-wide stage timings and counters.
+
+    Spans aggregate count/total/max seconds per stage name; counters are
+    plain sums (bytes downloaded, cells regridded, chunks written, ...).
+    Worker processes return `snapshot()` to the parent, which `merge()`s it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.spans = {}
+            self.counters = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            s = self.spans.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            s["count"] += 1
+            s["total_s"] += seconds
+            s["max_s"] = max(s["max_s"], seconds)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def span(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def timed(self, name):
+        """Decorator form of span()."""
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    @staticmethod
+    def peak_rss_mb():
+        """Peak RSS of this process and of finished/waited children (Linux reports KB)."""
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        return {"self": round(own, 1), "children": round(children, 1)}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "spans": {k: dict(v) for k, v in self.spans.items()},
+                "counters": dict(self.counters),
+            }
+
+    def merge(self, snapshot):
+        with self._lock:
+            for name, s in snapshot.get("spans", {}).items():
+                mine = self.spans.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+                mine["count"] += s["count"]
+                mine["total_s"] += s["total_s"]
+                mine["max_s"] = max(mine["max_s"], s["max_s"])
+            for name, v in snapshot.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + v
+
+    def write(self, path):
+        """Writes a JSON report, or a flat CSV when the path ends in .csv."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = self.snapshot()
+        report["peak_rss_mb"] = self.peak_rss_mb()
+
+        if path.suffix == ".csv":
+            with open(path, "w", newline="") as f:
+                w = csv.writer(f)
+                w.writerow(["kind", "name", "count", "total_s", "max_s", "value"])
+                for name, s in sorted(report["spans"].items()):
+                    w.writerow(["span", name, s["count"], f"{s['total_s']:.6f}", f"{s['max_s']:.6f}", ""])
+                for name, v in sorted(report["counters"].items()):
+                    w.writerow(["counter", name, "", "", "", v])
+                for name, v in report["peak_rss_mb"].items():
+                    w.writerow(["peak_rss_mb", name, "", "", "", v])
+        else:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+        return path
+
+
+METRICS = Metrics()
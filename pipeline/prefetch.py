@@ -0,0 +1,120 @@
+import concurrent.futures
+import logging
+
+from collections import deque
+
+logger = logging.getLogger("LabFetch")
+
+
+def _safe_process(fetcher, timestamp, bbox=None, **kwargs):
+    """Lane worker: a failed download yields None instead of killing the queue."""
+    try:
+        return fetcher.process(timestamp, timestamp, bbox=bbox, **kwargs)
+    except Exception as e:
+        logger.warning(f"[{fetcher.source_name}] Prefetch failed for {timestamp}: {e}")
+        return None
+
+
+class PrefetchScheduler:
+    """
+    Keeps up to `depth` hours in flight (ahead of the hour being processed)
+    on separate HRRR and RAVE download lanes and hands them back strictly in
+    time order.
+
+    The queue is bounded: hour t+depth is only submitted once hour t has been
+    handed out. Queued hours are pinned in each fetcher's raw cache; consumed
+    hours are closed and released via `cleanup_timestamp` (which lets the cache
+    evict them) before the next one is yielded.
+
+    `hrrr_bbox_for(t)` may return the envelope of the fires that need hour t;
+    HRRR is then cut to it right after decoding instead of kept as CONUS.
+
+    `hrrr_search_for(t)` may narrow the GRIB messages fetched for hour t
+    (variable backfills), and `rave_needed(t)` returning False skips the RAVE
+    download for hours whose fires already store rave_frp.
+
+    With a `budget` (pipeline.memory.MemoryBudget) `depth` becomes a ceiling:
+    each consumed hour is measured and fewer hours are kept in flight when
+    the process is close to its memory limit.
+    """
+
+    def __init__(self, hrrr_fetcher, rave_fetcher, times, depth=2, hrrr_workers=2, rave_workers=2, hrrr_bbox_for=None, budget=None, hrrr_search_for=None, rave_needed=None):
+        self.hrrr_fetcher = hrrr_fetcher
+        self.rave_fetcher = rave_fetcher
+        self.times = list(times)
+        self.depth = max(1, int(depth))
+        self.hrrr_bbox_for = hrrr_bbox_for
+        self.hrrr_search_for = hrrr_search_for
+        self.rave_needed = rave_needed
+        self.budget = budget
+
+        self._hrrr_lane = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, hrrr_workers), thread_name_prefix="hrrr")
+        self._rave_lane = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, rave_workers), thread_name_prefix="rave")
+        self._queue = deque()
+        self._next = 0
+
+    def _submit_next(self):
+        if self._next >= len(self.times):
+            return False
+        t = self.times[self._next]
+        self._next += 1
+        hrrr_bbox = self.hrrr_bbox_for(t) if self.hrrr_bbox_for else None
+        search = self.hrrr_search_for(t) if self.hrrr_search_for else None
+        with_rave = self.rave_needed(t) if self.rave_needed else True
+
+        self.hrrr_fetcher.pin_timestamp(t)
+        f_hrrr = self._hrrr_lane.submit(_safe_process, self.hrrr_fetcher, t, hrrr_bbox, variable=search)
+        f_rave = None
+        if with_rave:
+            self.rave_fetcher.pin_timestamp(t)
+            f_rave = self._rave_lane.submit(_safe_process, self.rave_fetcher, t)
+        self._queue.append((t, f_hrrr, f_rave))
+        return True
+
+    def _fill(self):
+        depth = self.budget.depth(self.depth) if self.budget else self.depth
+        while len(self._queue) < depth and self._submit_next():
+            pass
+
+    def release(self, t, hrrr_ds=None, rave_ds=None):
+        """Closes an hour's datasets and unpins its raw files."""
+        if hrrr_ds is not None: hrrr_ds.close()
+        if rave_ds is not None: rave_ds.close()
+        self.hrrr_fetcher.cleanup_timestamp(t)
+        self.rave_fetcher.cleanup_timestamp(t)
+
+    def __iter__(self):
+        """Yields (timestamp, hrrr_conus, rave_conus) in order."""
+        self._fill()
+        while self._queue:
+            t, f_hrrr, f_rave = self._queue.popleft()
+            hrrr_ds = f_hrrr.result()
+            rave_ds = f_rave.result() if f_rave is not None else None
+            if self.budget: self.budget.observe(hrrr_ds, rave_ds)
+
+            # Slot freed: top the queue back up before handing the hour out
+            self._fill()
+            try:
+                yield t, hrrr_ds, rave_ds
+            finally:
+                self.release(t, hrrr_ds, rave_ds)
+
+    def shutdown(self):
+        for _, f_hrrr, f_rave in self._queue:
+            f_hrrr.cancel()
+            if f_rave is not None: f_rave.cancel()
+        self._hrrr_lane.shutdown(wait=True)
+        self._rave_lane.shutdown(wait=True)
+
+        # Anything that finished downloading but was never consumed
+        for t, f_hrrr, f_rave in self._queue:
+            hrrr_ds = None if f_hrrr.cancelled() else f_hrrr.result()
+            rave_ds = None if f_rave is None or f_rave.cancelled() else f_rave.result()
+            self.release(t, hrrr_ds, rave_ds)
+        self._queue.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
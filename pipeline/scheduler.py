@@ -0,0 +1,63 @@
+import heapq
+import pandas as pd
+
+from .manifest import missing_vars
+
+
+class ActiveFireSchedule:
+    """
+    Interval index over the padded [start - time_pad, end + time_pad] window
+    of every task. Hours are swept in order, so building the per-hour active
+    sets costs O((tasks + hours) log tasks) rather than tasks x hours.
+
+    Tasks without a usable window (unknown start/end) are active at every hour.
+    """
+
+    def __init__(self, tasks, time_pad_hours=0):
+        self.tasks = list(tasks)
+        pad = pd.Timedelta(hours=time_pad_hours)
+
+        self._always = []
+        self._windows = []
+        for i, task in enumerate(self.tasks):
+            start = pd.to_datetime(task.get("start")) - pad
+            end = pd.to_datetime(task.get("end")) + pad
+            if pd.isna(start) or pd.isna(end):
+                self._always.append(i)
+            else:
+                self._windows.append((start, end, i))
+        self._windows.sort()
+
+    def iter_active(self, times):
+        """Yields (t, [tasks active at t]) for sorted `times`, tasks in original order."""
+        heap = []  # (end, index) of windows that have started
+        nxt = 0
+        for t in pd.DatetimeIndex(times):
+            while nxt < len(self._windows) and self._windows[nxt][0] <= t:
+                start, end, i = self._windows[nxt]
+                heapq.heappush(heap, (end, i))
+                nxt += 1
+            while heap and heap[0][0] < t:
+                heapq.heappop(heap)
+
+            active = sorted(self._always + [i for _, i in heap])
+            yield t, [self.tasks[i] for i in active]
+
+    def plan(self, times, fire_state, required=None):
+        """
+        Maps each hour that still has work to the fires active at it. Hours
+        where every active fire is already stored (or no fire burns) are dropped.
+        With `required` variables, stored hours missing any of them are kept too.
+        """
+        plan = {}
+        for t, active in self.iter_active(times):
+            for task in active:
+                state = fire_state.get(task["fire_id"])
+                if required is None:
+                    todo = state is None or t not in state["times"]
+                else:
+                    todo = bool(missing_vars(state, t, required))
+                if todo:
+                    plan[t] = active
+                    break
+        return plan
@@ -0,0 +1,312 @@
+import json
+import os
+import re
+import shutil
+import socket
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+import xarray as xr
+import zarr
+
+from pathlib import Path
+
+from .manifest import _to_ranges, _from_ranges, load_fire_state, empty_state
+from .metrics import METRICS
+from .writer import BufferedZarrWriter
+
+SHARD_RE = re.compile(r"\.shard(\d+)-of-(\d+)\.zarr$")
+
+
+def parse_shard(spec):
+    """'3/8' -> (3, 8); shards are 0-based."""
+    index, count = (int(x) for x in str(spec).split("/"))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard {spec!r} must look like i/N with 0 <= i < N")
+    return index, count
+
+
+def shard_store_name(zarr_name, index, count):
+    """master_wildfire_db.zarr -> master_wildfire_db.shard003-of-008.zarr"""
+    stem = zarr_name[:-5] if zarr_name.endswith(".zarr") else zarr_name
+    return f"{stem}.shard{index:03d}-of-{count:03d}.zarr"
+
+
+def find_shard_stores(root, zarr_name):
+    stem = zarr_name[:-5] if zarr_name.endswith(".zarr") else zarr_name
+    return sorted(p for p in Path(root).glob(f"{stem}.shard*-of-*.zarr") if SHARD_RE.search(p.name))
+
+
+def _fire_shard(fid, count):
+    # crc32 is stable across processes and machines (unlike hash())
+    return zlib.crc32(str(fid).encode()) % count
+
+
+def select_shard(hour_plan, index, count, by="fire"):
+    """
+    Restricts an hour plan to one shard. `fire` keeps the fires hashing to
+    this shard; `time` splits the hours into contiguous blocks carrying
+    roughly equal numbers of (fire, hour) units.
+    """
+    if count == 1:
+        return dict(hour_plan)
+
+    if by == "fire":
+        plan = {}
+        for t, tasks in hour_plan.items():
+            mine = [task for task in tasks if _fire_shard(task["fire_id"], count) == index]
+            if mine:
+                plan[t] = mine
+        return plan
+
+    times = sorted(hour_plan)
+    units = np.cumsum([len(hour_plan[t]) for t in times])
+    if not len(units):
+        return {}
+    block = np.minimum((units - 1) * count // units[-1], count - 1)
+    return {t: hour_plan[t] for t, b in zip(times, block) if b == index}
+
+
+def drop_stored(hour_plan, fire_state):
+    """Drops (fire, hour) units another store (the master) already holds."""
+    plan = {}
+    for t, tasks in hour_plan.items():
+        todo = [task for task in tasks if t not in fire_state.get(task["fire_id"], empty_state())["times"]]
+        if todo:
+            plan[t] = todo
+    return plan
+
+
+class WorkLedger:
+    """
+    File-based record of claimed/done/failed (fire, hour) units for one shard,
+    kept in a directory every worker can reach. Events are appended as JSON
+    lines; ownership is a lease file refreshed by a background heartbeat
+    while the lease is held (independent of how long an hour takes), so the
+    shard of a crashed worker can be resumed once its lease goes stale.
+    """
+
+    def __init__(self, ledger_dir, index, count, stale_after=1800, heartbeat_every=None):
+        self.dir = Path(ledger_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        name = f"shard{index:03d}-of-{count:03d}"
+        self.log_path = self.dir / f"{name}.jsonl"
+        self.lease_path = self.dir / f"{name}.lease"
+        self.stale_after = stale_after
+        self.heartbeat_every = heartbeat_every or max(1, stale_after / 6)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._beat = None
+
+    # ---- lease ----
+
+    def acquire(self):
+        """Takes the shard lease and starts heart-beating it. False if another live worker holds it."""
+        try:
+            fd = os.open(self.lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            with os.fdopen(fd, "w") as f:
+                f.write(self.owner)
+        except FileExistsError:
+            if time.time() - self.lease_path.stat().st_mtime < self.stale_after:
+                return False
+
+            # Stale lease: the previous owner stopped heart-beating
+            tmp = self.lease_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(self.owner)
+            os.replace(tmp, self.lease_path)
+
+        self._stop.clear()
+        self._beat = threading.Thread(target=self._heartbeat_loop, name="ledger-heartbeat", daemon=True)
+        self._beat.start()
+        return True
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_every):
+            self.heartbeat()
+
+    def heartbeat(self):
+        try:
+            os.utime(self.lease_path)
+        except OSError:
+            pass
+
+    def release(self):
+        self._stop.set()
+        if self._beat is not None:
+            self._beat.join()
+            self._beat = None
+        try:
+            if self.lease_path.read_text() == self.owner:
+                self.lease_path.unlink()
+        except OSError:
+            pass
+
+    # ---- events ----
+
+    def _append(self, state, fids, times, error=None):
+        event = {
+            "state": state,
+            "fires": sorted(str(f) for f in fids),
+            "hours": _to_ranges(times),
+            "worker": self.owner,
+            "ts": time.time(),
+        }
+        if error is not None:
+            event["error"] = str(error)
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(event) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def claim(self, t, fids):
+        self._append("claimed", fids, [t])
+        self.heartbeat()
+
+    def done(self, fid, times):
+        self._append("done", [fid], times)
+
+    def failed(self, fid, t, error):
+        self._append("failed", [fid], [t], error=error)
+
+    @staticmethod
+    def read(path):
+        """{(fire_id, hour): last state} for one ledger file."""
+        states = {}
+        path = Path(path)
+        if not path.exists():
+            return states
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash
+                for t in _from_ranges(event["hours"]):
+                    for fid in event["fires"]:
+                        states[(fid, t)] = event["state"]
+        return states
+
+    def pending(self, hour_plan):
+        """Drops units this shard already finished; failed and orphaned claims are retried."""
+        states = self.read(self.log_path)
+        plan = {}
+        for t, tasks in hour_plan.items():
+            todo = [task for task in tasks if states.get((str(task["fire_id"]), t)) != "done"]
+            if todo:
+                plan[t] = todo
+        return plan
+
+    @classmethod
+    def summarize(cls, ledger_dir):
+        """Counts of units by final state across every shard ledger."""
+        counts = {}
+        for path in sorted(Path(ledger_dir).glob("shard*.jsonl")):
+            for state in cls.read(path).values():
+                counts[state] = counts.get(state, 0) + 1
+        return counts
+
+
+# ---- merge ----
+
+def _time_windows(ds, size):
+    n = ds.sizes.get("time", 1)
+    for i in range(0, n, size):
+        yield ds.isel(time=slice(i, i + size))
+
+
+def _interleave(zarr_path, fid, new, writer):
+    """
+    Rebuilds a master group around shard hours that fall between its stored
+    hours. Both sides are read lazily and written in time order, one
+    time-chunk window at a time, into a side group that then replaces the
+    original, so neither the stored group nor the shard hours are ever
+    loaded whole.
+    """
+    root = Path(zarr_path)
+    side = f"{fid}.merging"
+    shutil.rmtree(root / side, ignore_errors=True)
+
+    current = xr.open_zarr(zarr_path, group=fid, consolidated=False)
+    try:
+        rebuilt = xr.concat([current, new], dim="time", join="outer").sortby("time")
+        for name in rebuilt.variables:
+            rebuilt[name].encoding = {}
+        writer.reset(side)
+        for window in _time_windows(rebuilt, writer.policy.time_chunk):
+            writer.append(side, window)
+            writer.flush(side)
+    finally:
+        current.close()
+
+    # Swap directories; until the entry moves over, a crash is caught by the open manifest
+    writer.manifest.begin()
+    replaced = root / f"{fid}.replaced"
+    os.replace(root / fid, replaced)
+    os.replace(root / side, root / fid)
+    shutil.rmtree(replaced)
+    writer.reset(side)
+    writer.manifest.groups[fid] = writer.manifest.groups.pop(side)
+    writer.manifest.save()
+
+
+def merge_shards(zarr_path, shard_paths, policy, logger):
+    """
+    Folds every shard store into the master store, skipping hours the master
+    already holds, then consolidates the master metadata. Groups are written
+    in time-chunk windows so a long season never sits in memory at once
+    (including groups rebuilt to interleave shard hours, see _interleave).
+    """
+    existing, fire_state, manifest = load_fire_state(zarr_path, logger)
+    writer = BufferedZarrWriter(zarr_path, existing_groups=existing, policy=policy, manifest=manifest)
+
+    pieces, aliases = {}, {}
+    for path in shard_paths:
+        groups, _, shard_manifest = load_fire_state(path, logger)
+        for fid in groups:
+            alias = shard_manifest.groups.get(fid, {}).get("alias")
+            if alias:
+                aliases[fid] = alias
+            else:
+                pieces.setdefault(fid, []).append(path)
+
+    logger.info(f"Merging {len(pieces)} group(s) from {len(shard_paths)} shard(s) into {zarr_path}")
+    for fid, paths in sorted(pieces.items()):
+        parts = []
+        try:
+            with METRICS.span("merge.group"):
+                parts = [xr.open_zarr(p, group=fid, consolidated=False) for p in paths]
+                batch = parts[0] if len(parts) == 1 else xr.concat(parts, dim="time", join="outer")
+                batch = batch.sortby("time")
+                _, first = np.unique(batch.time.values, return_index=True)
+                batch = batch.isel(time=np.sort(first))
+
+                stored = fire_state.get(fid, empty_state())["times"]
+                new = batch.isel(time=np.flatnonzero(~pd.DatetimeIndex(batch.time.values).isin(stored)))
+                if new.sizes.get("time", 0) == 0:
+                    continue
+                for name in new.variables:
+                    new[name].encoding = {}
+
+                if len(stored) and pd.Timestamp(new.time.values[0]) <= stored.max():
+                    # Shard hours fall before hours already in master: rebuild the group in order
+                    logger.info(f"[{fid}] Rewriting group to interleave {new.sizes['time']} shard hour(s)")
+                    _interleave(zarr_path, fid, new, writer)
+                    continue
+
+                for window in _time_windows(new, policy.time_chunk):
+                    writer.append(fid, window)
+                    writer.flush(fid)
+        except Exception as e:
+            logger.error(f"[{fid}] Merge failed: {e}")
+        finally:
+            for part in parts:
+                part.close()
+
+    for member, cluster_id in aliases.items():
+        writer.write_alias(member, cluster_id)
+
+    writer.close()
+    zarr.consolidate_metadata(str(zarr_path))
+    return len(pieces), len(aliases)
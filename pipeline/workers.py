@@ -0,0 +1,219 @@
+import concurrent.futures
+import json
+import shutil
+import tempfile
+import numpy as np
+import xarray as xr
+
+from pathlib import Path
+
+from processors.grid import regrid_rave_to_hrrr
+from processors.grid_index import cut
+from .metrics import METRICS
+
+SHM_ROOT = Path("/dev/shm")
+
+# RAVE fields a fire-hour reads (also all that is shared with pool workers)
+RAVE_VARS = ["FRP_MEAN", "grid_latt", "grid_lont"]
+
+
+def fire_windows(task, hrrr_conus, rave_conus, hrrr_fetcher, rave_fetcher, with_rave=True):
+    """
+    (hrrr_window, rave_window) of a fire's bbox. Resolved in the calling
+    process, where the grid indexes live, so pool workers only receive plain
+    index windows. rave_window is None when RAVE is skipped or misses the bbox.
+    """
+    with METRICS.span("fire.window"):
+        hrrr_window = hrrr_fetcher.window(hrrr_conus, *task["bbox"])
+        if hrrr_window is None:
+            raise ValueError("BBox does not intersect HRRR grid.")
+
+        rave_window = None
+        if with_rave and rave_conus is not None:
+            try:
+                rave_window = rave_fetcher.window(rave_conus, *task["bbox"])
+            except Exception:
+                pass
+    return hrrr_window, rave_window
+
+
+def build_fire_hour(task, hrrr_conus, rave_conus, windows, weights_dir, with_rave=True):
+    """
+    Clip, regrid and merge one fire for one hour, given its fire_windows().
+    with_rave=False (rave_frp already stored) skips RAVE entirely.
+    """
+    hrrr_window, rave_window = windows
+    with METRICS.span("fire.subset"):
+        hrrr_clip = cut(hrrr_conus, hrrr_window, y_dim="y", x_dim="x")
+
+        rave_clip = None
+        if with_rave and rave_window is not None:
+            rave_clip = cut(rave_conus[RAVE_VARS], rave_window, y_dim="grid_yt", x_dim="grid_xt")
+
+    hrrr_clip = hrrr_clip.rename({"latitude": "lat", "longitude": "lon"})
+
+    if not with_rave:
+        merged = hrrr_clip
+    elif rave_clip is not None:
+        rave_clip = rave_clip.rename({"grid_latt": "lat", "grid_lont": "lon"})
+
+        rave_subset = xr.Dataset({"rave_frp": rave_clip["FRP_MEAN"].fillna(0.0)})
+        rave_subset = rave_subset.assign_coords({"lat": rave_clip.lat, "lon": rave_clip.lon})
+
+        with METRICS.span("fire.regrid"):
+            rave_rg = regrid_rave_to_hrrr(rave_subset, hrrr_clip, weights_dir)
+        METRICS.count("regrid.cells", int(rave_rg["rave_frp"].size))
+
+        with METRICS.span("fire.merge"):
+            merged = xr.merge([hrrr_clip, rave_rg], compat="override")
+    else:
+        # Same layout and dtype as a regridded hour, so appends match the stored variable
+        if "time" not in hrrr_clip.dims: hrrr_clip = hrrr_clip.expand_dims("time")
+        empty_frp = xr.DataArray(
+            np.full((1, hrrr_clip.sizes["y"], hrrr_clip.sizes["x"]), np.nan, dtype=np.float32),
+            coords={"time": hrrr_clip.time, "y": hrrr_clip.y, "x": hrrr_clip.x}, dims=["time", "y", "x"],
+        )
+        merged = hrrr_clip.assign(rave_frp=empty_frp)
+        merged.attrs["RAVE_STATUS"] = "ERROR_OR_MISSING_DATA"
+
+    # Tag Temporal Status and WFIGS status directly into the Zarr metadata
+    merged.attrs["TEMPORAL_CLIP_STATUS"] = task["temporal_clip_status"]
+
+    if task.get("end_date_type"):
+        merged.attrs["END_DATE_TYPE"] = task["end_date_type"]
+
+    if task.get("ongoing_capped"):
+        merged.attrs["ONGOING_STATUS"] = "ARTIFICIALLY_CAPPED"
+
+    if task.get("missing_wfigs"):
+        merged.attrs["WFIGS_STATUS"] = "NO_FIRE_IN_BBOX"
+
+    if task.get("cluster_members"):
+        merged.attrs["CLUSTER_MEMBERS"] = ",".join(task["cluster_members"])
+
+    if "time" not in merged.dims: merged = merged.expand_dims("time")
+    return merged
+
+
+# ---- memory-mapped CONUS hand-off ----
+
+def _jsonable(v):
+    if isinstance(v, np.ndarray): return v.tolist()
+    if isinstance(v, np.generic): return v.item()
+    if isinstance(v, (str, int, float, bool, list, dict)) or v is None: return v
+    return str(v)
+
+
+def share_dataset(ds, variables=None, root=None):
+    """
+    Spills a CONUS dataset to one .npy file per array (on /dev/shm when
+    available) so workers can memory-map it instead of unpickling a copy.
+    """
+    if root is None:
+        root = SHM_ROOT if SHM_ROOT.is_dir() else None
+    path = Path(tempfile.mkdtemp(prefix="labfetch_", dir=root))
+
+    if variables is not None:
+        ds = ds[[v for v in variables if v in ds.data_vars]]
+
+    meta = {"attrs": {k: _jsonable(v) for k, v in ds.attrs.items()}, "data_vars": {}, "coords": {}}
+    for kind, items in (("data_vars", ds.data_vars.items()), ("coords", ds.coords.items())):
+        for i, (name, da) in enumerate(items):
+            entry = {"dims": list(da.dims), "attrs": {k: _jsonable(v) for k, v in da.attrs.items()}}
+            if da.dtype == object and da.ndim == 0:
+                # Placeholder scalars such as the CF grid-mapping coord (None) can't go through .npy
+                entry["value"] = _jsonable(da.values.item())
+            else:
+                entry["file"] = f"{kind}_{i}.npy"
+                entry["mmap"] = da.ndim > 0
+                np.save(path / entry["file"], np.asarray(da.values), allow_pickle=False)
+            meta[kind][name] = entry
+
+    with open(path / "meta.json", "w") as f:
+        json.dump(meta, f)
+    return path
+
+
+def open_shared(path):
+    """Rebuilds a dataset written by share_dataset on top of read-only memmaps."""
+    path = Path(path)
+    with open(path / "meta.json", "r") as f:
+        meta = json.load(f)
+
+    def _load(entry):
+        if "file" not in entry:
+            value = np.empty((), dtype=object)
+            value[()] = entry["value"]
+            return xr.Variable(entry["dims"], value, attrs=entry["attrs"])
+        mmap_mode = "r" if entry["mmap"] else None
+        data = np.load(path / entry["file"], mmap_mode=mmap_mode, allow_pickle=False)
+        return xr.Variable(entry["dims"], data, attrs=entry["attrs"])
+
+    coords = {name: _load(e) for name, e in meta["coords"].items()}
+    data_vars = {name: _load(e) for name, e in meta["data_vars"].items()}
+    return xr.Dataset(data_vars, coords=coords, attrs=meta["attrs"])
+
+
+def _pool_build_fire_hour(task, hrrr_path, rave_path, windows, weights_dir, with_rave=True):
+    METRICS.reset()
+    hrrr_conus = open_shared(hrrr_path)
+    rave_conus = open_shared(rave_path) if rave_path else None
+
+    merged = build_fire_hour(task, hrrr_conus, rave_conus, windows, weights_dir, with_rave)
+    # Only the (small) clip and this task's timings travel back to the writer
+    return (merged.load() if merged is not None else None), METRICS.snapshot()
+
+
+def iter_fire_hours(tasks, hrrr_conus, rave_conus, hrrr_fetcher, rave_fetcher, weights_dir, pool=None, rave_for=None):
+    """
+    Yields (task, merged, error) in task order. With a process pool the CONUS
+    arrays are shared through memory-mapped files and fires run in parallel;
+    the caller stays the single zarr writer. Fetchers (sessions, locks, raw
+    caches) never leave this process: workers get each fire's index windows.
+
+    `rave_for` limits RAVE regridding to these fire IDs (None = every fire).
+    """
+    with_rave = lambda task: rave_for is None or task["fire_id"] in rave_for
+
+    def windows(task):
+        return fire_windows(task, hrrr_conus, rave_conus, hrrr_fetcher, rave_fetcher, with_rave(task))
+
+    if pool is None:
+        for task in tasks:
+            try:
+                yield task, build_fire_hour(task, hrrr_conus, rave_conus, windows(task), weights_dir, with_rave(task)), None
+            except Exception as e:
+                yield task, None, e
+        return
+
+    with METRICS.span("fire.share"):
+        hrrr_path = share_dataset(hrrr_conus)
+        rave_path = None
+        if rave_conus is not None:
+            rave_path = share_dataset(rave_conus, variables=RAVE_VARS)
+
+    futures = []
+    try:
+        for task in tasks:
+            try:
+                futures.append(pool.submit(_pool_build_fire_hour, task, hrrr_path, rave_path, windows(task), weights_dir, with_rave(task)))
+            except Exception as e:
+                futures.append(e)
+
+        for task, future in zip(tasks, futures):
+            if isinstance(future, Exception):
+                yield task, None, future
+                continue
+            try:
+                merged, snapshot = future.result()
+                METRICS.merge(snapshot)
+                yield task, merged, None
+            except Exception as e:
+                yield task, None, e
+    finally:
+        futures = [f for f in futures if isinstance(f, concurrent.futures.Future)]
+        for future in futures:
+            future.cancel()
+        concurrent.futures.wait(futures)
+        shutil.rmtree(hrrr_path, ignore_errors=True)
+        if rave_path: shutil.rmtree(rave_path, ignore_errors=True)
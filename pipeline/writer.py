@@ -0,0 +1,218 @@
+import math
+import numpy as np
+import xarray as xr
+import zarr
+
+from collections import defaultdict
+
+from .metrics import METRICS
+
+
+def _compressor_encoding(name, level):
+    """Compressor encoding for whichever zarr major version is installed."""
+    zarr_v3 = int(zarr.__version__.split(".")[0]) >= 3
+    key = "compressors" if zarr_v3 else "compressor"
+
+    if not name or name == "none":
+        return {key: None}
+    if zarr_v3:
+        from zarr.codecs import BloscCodec
+        return {key: [BloscCodec(cname=name, clevel=level, shuffle="bitshuffle")]}
+
+    from numcodecs import Blosc
+    return {key: Blosc(cname=name, clevel=level, shuffle=Blosc.BITSHUFFLE)}
+
+
+# Fixed time units for new groups: inferred units follow the first batch ("days since"
+# for a single hour), and every later append is then encoded in those units
+TIME_ENCODING = {"units": "seconds since 1970-01-01", "dtype": "int64"}
+
+
+class ChunkPolicy:
+    """Time/y/x chunk sizes and compressor applied when a group is first created."""
+
+    def __init__(self, time_chunk=24, spatial_chunk=128, compressor="zstd", compression_level=3):
+        self.time_chunk = time_chunk
+        self.spatial_chunk = spatial_chunk
+        self.compressor = compressor
+        self.compression_level = compression_level
+
+    @classmethod
+    def from_config(cls, conf):
+        conf = conf or {}
+        return cls(
+            time_chunk=conf.get("time_chunk", 24),
+            spatial_chunk=conf.get("spatial_chunk", 128),
+            compressor=conf.get("compressor", "zstd"),
+            compression_level=conf.get("compression_level", 3),
+        )
+
+    def n_chunks(self, ds):
+        """Chunks touched when ds is written under this policy (for metrics)."""
+        total = 0
+        for name, chunks in ((n, e["chunks"]) for n, e in self.encoding(ds).items()):
+            total += math.prod(math.ceil(size / c) for size, c in zip(ds[name].shape, chunks))
+        return total
+
+    def chunks(self, ds):
+        """Dask chunks lined up with encoding(ds), so a lazy write never splits a zarr chunk."""
+        return {dim: self.time_chunk if dim == "time" else self.spatial_chunk for dim in ds.dims}
+
+    def encoding(self, ds):
+        enc = {}
+        for name, da in ds.data_vars.items():
+            chunks = tuple(
+                self.time_chunk if dim == "time" else max(1, min(size, self.spatial_chunk))
+                for dim, size in zip(da.dims, da.shape)
+            )
+            enc[name] = {"chunks": chunks, **_compressor_encoding(self.compressor, self.compression_level)}
+        return enc
+
+
+class BufferedZarrWriter:
+    """
+    Collects up to `flush_hours` hourly snapshots per fire and writes them
+    with a single append, so each to_zarr call fills whole time chunks
+    instead of resizing every array once per hour.
+
+    Variables added to hours already in the store (write_variables) are
+    buffered the same way. A new variable is first created along the group's
+    whole time axis (metadata only), then filled by region writes.
+
+    Alias groups (attrs only, see write_alias) count as uninitialized: a fire
+    that is no longer clustered replaces its alias with real data.
+    """
+
+    def __init__(self, zarr_path, existing_groups=(), flush_hours=24, policy=None, manifest=None, on_write=None):
+        self.zarr_path = zarr_path
+        self.flush_hours = max(1, int(flush_hours))
+        self.policy = policy or ChunkPolicy()
+        self.manifest = manifest
+        # on_write(fid, times): called once hours are durably in the store (e.g. a work ledger)
+        self.on_write = on_write
+        self._initialized = set(existing_groups) - set(manifest.aliases() if manifest else ())
+        self._buffers = defaultdict(list)
+        self._backfill = defaultdict(list)
+
+    def append(self, fid, ds):
+        """Queues one hour for a time append; flushes once the buffer is full."""
+        self._buffers[fid].append(ds.load())
+        if len(self._buffers[fid]) >= self.flush_hours:
+            self.flush(fid)
+
+    def write_variables(self, fid, ds):
+        """Queues new variables for one hour already in the store (no time append)."""
+        # Lazy (budget mode) clips are materialized so dask chunks never straddle zarr chunks
+        self._backfill[fid].append(ds.load())
+        if len(self._backfill[fid]) >= self.flush_hours:
+            self.flush(fid)
+
+    def reset(self, fid):
+        """The next flush recreates the group (mode="w") instead of appending to it."""
+        self._initialized.discard(fid)
+
+    def write_alias(self, fid, target):
+        """Attrs-only group pointing a clustered fire at the group holding its data (or re-pointing it)."""
+        if fid in self._initialized:
+            return
+        group = zarr.open_group(str(self.zarr_path), mode="a").require_group(fid)
+        group.attrs["CLUSTER_REF"] = target
+        if self.manifest: self.manifest.record_alias(fid, target)
+
+    def flush(self, fid=None):
+        fids = list(dict.fromkeys([*self._buffers, *self._backfill])) if fid is None else [fid]
+        for f in fids:
+            self._flush_appends(f)
+            self._flush_backfill(f)
+
+    def _flush_appends(self, f):
+        hours = self._buffers.pop(f, [])
+        if not hours:
+            return
+
+        batch = hours[0] if len(hours) == 1 else xr.concat(hours, dim="time")
+        new_group = f not in self._initialized
+        if self.manifest: self.manifest.begin()
+
+        with METRICS.span("zarr.write"):
+            if not new_group:
+                batch.to_zarr(self.zarr_path, group=f, mode="a", append_dim="time", consolidated=False)
+            else:
+                encoding = self.policy.encoding(batch)
+                if "time" in batch.coords: encoding["time"] = dict(TIME_ENCODING)
+                batch.to_zarr(self.zarr_path, group=f, mode="w", encoding=encoding, consolidated=False)
+                self._initialized.add(f)
+        METRICS.count("zarr.appends")
+        METRICS.count("zarr.hours_written", batch.sizes.get("time", 1))
+        METRICS.count("zarr.chunks_written", self.policy.n_chunks(batch))
+
+        if self.manifest:
+            self.manifest.record(f, batch.time.values, batch.data_vars, replace=new_group)
+        if self.on_write: self.on_write(f, batch.time.values)
+        batch.close()
+
+    def _flush_backfill(self, f):
+        hours = self._backfill.pop(f, [])
+        if not hours:
+            return
+
+        batch = hours[0] if len(hours) == 1 else xr.concat(hours, dim="time")
+        batch = batch.sortby("time")
+        if self.manifest: self.manifest.begin()
+
+        with METRICS.span("zarr.backfill"):
+            stored = xr.open_zarr(self.zarr_path, group=f, consolidated=False)
+            try:
+                store_times = stored.indexes["time"]
+                new_vars = [v for v in batch.data_vars if v not in stored.data_vars]
+                shared = [c for c in batch.coords if c in stored.variables]
+            finally:
+                stored.close()
+
+            if new_vars:
+                # Metadata only: unwritten hours read back as the fill value (NaN).
+                # Reindexed lazily, then rechunked to the zarr chunks it is written with
+                template = batch[new_vars].chunk().reindex(time=store_times)
+                template = template.chunk(self.policy.chunks(template)).drop_vars(shared)
+                template.to_zarr(
+                    self.zarr_path, group=f, mode="a", compute=False,
+                    encoding=self.policy.encoding(template), consolidated=False
+                )
+
+            # One region write per run of consecutive stored hours
+            pos = store_times.get_indexer(batch.indexes["time"])
+            batch = batch.isel(time=np.flatnonzero(pos >= 0))
+            pos = pos[pos >= 0]
+            fixed = [v for v in batch.variables if "time" not in batch[v].dims]
+            breaks = np.flatnonzero(np.diff(pos) != 1) + 1
+            for run in np.split(np.arange(len(pos)), breaks):
+                if not len(run):
+                    continue
+                part = batch.isel(time=run).drop_vars(fixed)
+                part.to_zarr(
+                    self.zarr_path, group=f, consolidated=False,
+                    region={"time": slice(int(pos[run[0]]), int(pos[run[-1]]) + 1)},
+                )
+        METRICS.count("zarr.backfill_hours", batch.sizes.get("time", 0))
+
+        if self.manifest:
+            self.manifest.record(f, batch.time.values, batch.data_vars, backfill=True)
+        if self.on_write: self.on_write(f, batch.time.values)
+        batch.close()
+
+    def close(self):
+        """
+        Flushes every remaining buffer. One failing fire does not block the
+        rest; the first failure is re-raised once all of them were tried.
+        The manifest is only marked closed when every flush succeeded.
+        """
+        errors = []
+        for fid in list(dict.fromkeys([*self._buffers, *self._backfill])):
+            try:
+                self.flush(fid)
+            except Exception as e:
+                print(f"  -> Final flush failed for {fid}: {e}")
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        if self.manifest: self.manifest.end()
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from shapely import STRtree
+from shapely.geometry import box
+
+
+def bbox_polygon(bbox):
+    """(lon_min, lon_max, lat_min, lat_max) -> shapely box."""
+    return box(bbox[0], bbox[2], bbox[1], bbox[3])
+
+
+class IncidentIndex:
+    """STRtree over incident geometries for many bbox queries in one pass."""
+
+    def __init__(self, gdf):
+        self.gdf = gdf
+        self.tree = STRtree(gdf.geometry.values)
+
+    def query(self, bboxes):
+        """Returns one sub-GeoDataFrame of intersecting incidents per query bbox."""
+        polys = [bbox_polygon(b) for b in bboxes]
+        query_idx, tree_idx = self.tree.query(polys, predicate="intersects")
+        return [
+            self.gdf.iloc[np.sort(tree_idx[query_idx == i])]
+            for i in range(len(polys))
+        ]
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _cluster_id(ids, known, taken):
+    """
+    A cluster keeps the id its members already point at in the store (the
+    first one, if they point at several) so its group survives membership
+    changes; new clusters are named after their smallest member id.
+    """
+    for cluster_id in sorted({known[fid] for fid in ids if fid in known}):
+        if cluster_id not in taken:
+            return cluster_id
+
+    base = cluster_id = f"CLUSTER_{ids[0]}"
+    n = 1
+    while cluster_id in taken or cluster_id in known.values():
+        n += 1
+        cluster_id = f"{base}_{n}"
+    return cluster_id
+
+
+def cluster_tasks(tasks, min_overlap=0.8, known=None):
+    """
+    Merges tasks whose bboxes overlap by at least `min_overlap` (intersection
+    over the smaller box) into shared cluster tasks, so the same HRRR region
+    is clipped, regridded and written once. Returns (tasks, aliases) where
+    aliases maps each merged member fire_id to its cluster fire_id.
+
+    `known` maps member fire_ids to the cluster ids they already alias in
+    the store; clusters reuse those ids instead of deriving new ones.
+    """
+    known = known or {}
+    if len(tasks) < 2 or not min_overlap:
+        return list(tasks), {}
+
+    polys = [bbox_polygon(t["bbox"]) for t in tasks]
+    tree = STRtree(polys)
+    parent = list(range(len(tasks)))
+
+    left, right = tree.query(polys, predicate="intersects")
+    for a, b in zip(left, right):
+        if a >= b:
+            continue
+        smaller = min(polys[a].area, polys[b].area)
+        if smaller > 0 and polys[a].intersection(polys[b]).area / smaller >= min_overlap:
+            parent[_find(parent, a)] = _find(parent, b)
+
+    groups = {}
+    for i in range(len(tasks)):
+        groups.setdefault(_find(parent, i), []).append(i)
+
+    merged, aliases, taken = [], {}, set()
+    for members in sorted(groups.values()):
+        if len(members) == 1:
+            merged.append(tasks[members[0]])
+            continue
+
+        member_tasks = [tasks[i] for i in members]
+        ids = sorted(str(t["fire_id"]) for t in member_tasks)
+        cluster_id = _cluster_id(ids, known, taken)
+        taken.add(cluster_id)
+        starts = [pd.to_datetime(t["start"]) for t in member_tasks if pd.notnull(t.get("start"))]
+        ends = [pd.to_datetime(t["end"]) for t in member_tasks if pd.notnull(t.get("end"))]
+        bboxes = [t["bbox"] for t in member_tasks]
+
+        merged.append({
+            "fire_id": cluster_id,
+            "name": "Cluster: " + ", ".join(str(t["name"]) for t in member_tasks),
+            "start": min(starts) if starts else None,
+            "end": max(ends) if ends else None,
+            "end_date_type": "Cluster",
+            "acres": sum(t.get("acres", 0) or 0 for t in member_tasks),
+            "bbox": (
+                min(b[0] for b in bboxes), max(b[1] for b in bboxes),
+                min(b[2] for b in bboxes), max(b[3] for b in bboxes),
+            ),
+            "temporal_clip_status": (
+                "FULLY_CONTAINED"
+                if all(t.get("temporal_clip_status") == "FULLY_CONTAINED" for t in member_tasks)
+                else "CLIPPED"
+            ),
+            "ongoing_capped": any(t.get("ongoing_capped") for t in member_tasks),
+            "cluster_members": ids,
+        })
+        for fid in ids:
+            aliases[fid] = cluster_id
+
+    return merged, aliases
@@ -1,9 +1,14 @@
-import xesmf as xe
+import numpy as np
+import hashlib
 import os
+import threading
 import warnings
+from collections import OrderedDict
 from pathlib import Path
 from contextlib import contextmanager
 
+from .sparse_regrid import SparseRegridder
+
 @contextmanager
 def silence_c_errors():
     """Redirects OS-level C stderr to /dev/null to completely silence HDF5 panics."""
@@ -19,31 +24,76 @@ def silence_c_errors():
         os.close(devnull)
         os.close(old_stderr)
 
-def regrid_rave_to_hrrr(rave_ds, hrrr_ds, weights_path):
+def grid_hash(ds, lat="lat", lon="lon"):
+    """Content hash of a dataset's lat/lon grid, used to address weights files."""
+    h = hashlib.sha1()
+    for name in (lat, lon):
+        arr = np.ascontiguousarray(ds[name].values, dtype="float64")
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()[:16]
+
+class RegridderCache:
+    """
+    LRU cache of SparseRegridder objects. Weights are persisted in a
+    content-addressed store ({src_hash}_{dst_hash}.nc); ESMF is only invoked
+    when a grid pair has never been seen before.
+    """
+
+    def __init__(self, weights_dir, maxsize=64):
+        self.weights_dir = Path(weights_dir)
+        self.weights_dir.mkdir(parents=True, exist_ok=True)
+        self.maxsize = maxsize
+        self._regridders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _build_weights(self, src_ds, dst_ds, weights_path):
+        # ESMF is slow to import and only needed for never-seen grid pairs
+        import xesmf as xe
+
+        # Mute Python warnings (F_CONTIGUOUS) and OS-Level C-Library errors (HDF5-DIAG)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            with silence_c_errors():
+                regridder = xe.Regridder(src_ds, dst_ds, "bilinear")
+                tmp = weights_path.with_suffix(f".{os.getpid()}.tmp")
+                regridder.to_netcdf(str(tmp))
+                os.replace(tmp, weights_path)
+
+    def get(self, src_ds, dst_ds):
+        key = (grid_hash(src_ds), grid_hash(dst_ds))
+
+        with self._lock:
+            if key in self._regridders:
+                self._regridders.move_to_end(key)
+                return self._regridders[key]
+
+        weights_path = self.weights_dir / f"{key[0]}_{key[1]}.nc"
+        if not weights_path.exists():
+            self._build_weights(src_ds, dst_ds, weights_path)
+
+        regridder = SparseRegridder.from_file(weights_path, src_ds, dst_ds)
+
+        with self._lock:
+            self._regridders[key] = regridder
+            while len(self._regridders) > self.maxsize:
+                self._regridders.popitem(last=False)
+        return regridder
+
+_CACHES = {}
+
+def get_regridder_cache(weights_dir, maxsize=64):
+    """One cache per weights store and process, kept for the whole run."""
+    key = str(Path(weights_dir).resolve())
+    if key not in _CACHES:
+        _CACHES[key] = RegridderCache(weights_dir, maxsize=maxsize)
+    return _CACHES[key]
+
+def regrid_rave_to_hrrr(rave_ds, hrrr_ds, weights_dir, cache_size=64):
     """
     Regrids RAVE satellite data to the HRRR curvilinear grid.
-    Dynamically generates or reuses weights.
+    Regridders are reused from memory, weights from the content-addressed store,
+    and applying them is a plain sparse matrix product (no ESMF call).
     """
-    weights_exist = Path(weights_path).exists()
-    
-    # Mute Python warnings (F_CONTIGUOUS)
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", UserWarning)
-        
-        # Mute OS-Level C-Library errors (HDF5-DIAG)
-        with silence_c_errors():
-            regridder = xe.Regridder(
-                rave_ds, 
-                hrrr_ds, 
-                "bilinear",
-                filename=str(weights_path),
-                reuse_weights=weights_exist
-            )
-            
-        # Perform the regridding (safely outside the mute block just in case)
-        rave_rg = regridder(rave_ds)
-    
-    # Memory Cleanup
-    del regridder
-    
-    return rave_rg
\ No newline at end of file
+    regridder = get_regridder_cache(weights_dir, maxsize=cache_size).get(rave_ds, hrrr_ds)
+    return regridder(rave_ds, hrrr_ds)
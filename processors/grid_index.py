@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+from pathlib import Path
+
+# ---- in-memory registry, one index per grid fingerprint ----
+_INDEXES = {}
+_LOCK = threading.Lock()
+
+
+def grid_fingerprint(lat, lon, samples=64):
+    """
+    Stable hash of a 2D lat/lon grid. Uses the shape plus a strided sample
+    so it stays cheap enough to call once per fire per hour.
+    """
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    sy = max(1, lat.shape[0] // samples)
+    sx = max(1, lat.shape[-1] // samples)
+
+    h = hashlib.sha1()
+    h.update(str(lat.shape).encode())
+    for arr in (lat, lon):
+        h.update(np.ascontiguousarray(arr[::sy, ::sx], dtype="float64").tobytes())
+        h.update(np.ascontiguousarray(arr[-1, -1], dtype="float64").tobytes())
+    return h.hexdigest()[:16]
+
+
+def _bbox_key(lon_min, lon_max, lat_min, lat_max):
+    return ",".join(f"{v:.6f}" for v in (lon_min, lon_max, lat_min, lat_max))
+
+
+class GridIndex:
+    """
+    Resolves a lon/lat bbox to the (y0, y1, x0, x1) index window of a
+    curvilinear grid. Slices are memoized in memory and on disk.
+    """
+
+    def __init__(self, lat, lon, cache_dir=None, fingerprint=None):
+        self.lat = np.asarray(lat)
+        self.lon = np.asarray(lon)
+        self.shape = self.lat.shape
+        self.fingerprint = fingerprint or grid_fingerprint(self.lat, self.lon)
+        self.lon_max = float(np.nanmax(self.lon))
+
+        # Lat-sorted flat view: a bbox query only scans its latitude band
+        self._lon_flat = self.lon.ravel()
+        self._order = np.argsort(self.lat.ravel(), kind="stable")
+        self._lat_sorted = self.lat.ravel()[self._order]
+
+        self.cache_path = None
+        self._slices = {}
+        self._lock = threading.Lock()
+
+        if cache_dir:
+            self.cache_path = Path(cache_dir) / f"{self.fingerprint}.json"
+            self._load()
+
+    def _load(self):
+        if not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path, "r") as f:
+                raw = json.load(f)
+            self._slices = {k: (tuple(v) if v else None) for k, v in raw.items()}
+        except Exception:
+            self._slices = {}
+
+    def _save(self):
+        """Atomic rewrite so parallel runs never see a half-written index."""
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({k: (list(v) if v else None) for k, v in self._slices.items()}, f)
+        os.replace(tmp, self.cache_path)
+
+    def _search(self, lon_min, lon_max, lat_min, lat_max):
+        lo = np.searchsorted(self._lat_sorted, lat_min, side="left")
+        hi = np.searchsorted(self._lat_sorted, lat_max, side="right")
+
+        band = self._order[lo:hi]
+        lon_band = self._lon_flat[band]
+        hits = band[(lon_band >= lon_min) & (lon_band <= lon_max)]
+        if len(hits) == 0:
+            return None
+
+        y, x = np.unravel_index(hits, self.shape)
+        return (int(y.min()), int(y.max()) + 1, int(x.min()), int(x.max()) + 1)
+
+    def slices(self, lon_min, lon_max, lat_min, lat_max):
+        """Returns (y0, y1, x0, x1) or None if the bbox misses the grid."""
+        key = _bbox_key(lon_min, lon_max, lat_min, lat_max)
+        with self._lock:
+            if key in self._slices:
+                return self._slices[key]
+
+            window = self._search(lon_min, lon_max, lat_min, lat_max)
+            self._slices[key] = window
+            if self.cache_path is not None:
+                try:
+                    self._save()
+                except Exception as e:
+                    print(f"  -> Could not persist grid index: {e}")
+            return window
+
+    def isel(self, ds, bbox, y_dim="y", x_dim="x"):
+        """Plain isel subset for bbox; None when it does not intersect."""
+        window = self.slices(*bbox)
+        if window is None:
+            return None
+        return cut(ds, window, y_dim=y_dim, x_dim=x_dim)
+
+
+# Attr on envelope cuts: [parent grid fingerprint, y0, y1, x0, x1] of the cut
+ENVELOPE_ATTR = "GRID_ENVELOPE"
+
+
+def cut(ds, window, y_dim="y", x_dim="x"):
+    """isel of a (y0, y1, x0, x1) window, as returned by GridIndex.slices."""
+    y0, y1, x0, x1 = window
+    sub = ds.isel({y_dim: slice(y0, y1), x_dim: slice(x0, x1)})
+    if ENVELOPE_ATTR in sub.attrs:
+        sub.attrs = {k: v for k, v in sub.attrs.items() if k != ENVELOPE_ATTR}
+    return sub
+
+
+def cut_envelope(ds, index, window, envelope=None, y_dim="y", x_dim="x"):
+    """
+    cut() of a window on `index`'s grid (ds being either that grid or an
+    `envelope` cut of it) that remembers where the piece sits, so bbox lookups
+    on it go through the parent index (see index_for) instead of fingerprinting
+    and indexing a new grid for every envelope. None when nothing overlaps.
+    """
+    rel = within(window, envelope)
+    if rel is None:
+        return None
+    y0, x0 = (envelope[0], envelope[2]) if envelope else (0, 0)
+    sub = cut(ds, rel, y_dim=y_dim, x_dim=x_dim)
+    sub.attrs = {**sub.attrs, ENVELOPE_ATTR: [index.fingerprint, rel[0] + y0, rel[1] + y0, rel[2] + x0, rel[3] + x0]}
+    return sub
+
+
+def index_for(ds, lat, lon, cache_dir=None):
+    """
+    (GridIndex, envelope) for looking up bboxes on ds. For an envelope cut
+    whose parent index is loaded this is the parent index and the cut's
+    (y0, y1, x0, x1) on it; otherwise ds's own shared index and None.
+    """
+    tag = ds.attrs.get(ENVELOPE_ATTR)
+    if tag is not None:
+        with _LOCK:
+            parent = _INDEXES.get(tag[0])
+        if parent is not None:
+            return parent, tuple(int(v) for v in tag[1:])
+    return get_index(ds[lat].values, ds[lon].values, cache_dir=cache_dir), None
+
+
+def within(window, envelope):
+    """A parent-grid window relative to an envelope cut; None if they do not overlap."""
+    if window is None or envelope is None:
+        return window
+    y0, y1 = max(window[0], envelope[0]), min(window[1], envelope[1])
+    x0, x1 = max(window[2], envelope[2]), min(window[3], envelope[3])
+    if y0 >= y1 or x0 >= x1:
+        return None
+    return (y0 - envelope[0], y1 - envelope[0], x0 - envelope[2], x1 - envelope[2])
+
+
+def union_bbox(bboxes):
+    """Envelope (lon_min, lon_max, lat_min, lat_max) of several bboxes, or None."""
+    bboxes = [b for b in bboxes if b is not None]
+    if not bboxes:
+        return None
+    return (
+        min(b[0] for b in bboxes),
+        max(b[1] for b in bboxes),
+        min(b[2] for b in bboxes),
+        max(b[3] for b in bboxes),
+    )
+
+
+def get_index(lat, lon, cache_dir=None):
+    """Returns the shared GridIndex for this grid, building it on first use."""
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    fp = grid_fingerprint(lat, lon)
+
+    with _LOCK:
+        index = _INDEXES.get(fp)
+        if index is None:
+            index = GridIndex(lat, lon, cache_dir=cache_dir, fingerprint=fp)
+            _INDEXES[fp] = index
+    return index
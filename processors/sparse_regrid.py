@@ -0,0 +1,79 @@
+import numpy as np
+import scipy.sparse as sps
+import xarray as xr
+
+class SparseRegridder:
+    """
+    Applies precomputed ESMF weights as a single CSR sparse matrix product.
+    Every variable and extra dim (time, ...) is stacked into one dense
+    block so a whole batch costs one `matrix @ block` call.
+
+    Destination cells without any source weight come out as 0, like
+    xe.Regridder's default; `unmapped_to_nan=True` makes them NaN instead
+    (xESMF's unmapped_to_nan).
+    """
+
+    def __init__(self, matrix, shape_in, shape_out, dims_in, dims_out, unmapped_to_nan=False):
+        self.matrix = matrix.tocsr()
+        self.shape_in = tuple(shape_in)
+        self.shape_out = tuple(shape_out)
+        self.dims_in = tuple(dims_in)
+        self.dims_out = tuple(dims_out)
+        self.unmapped = None
+        if unmapped_to_nan:
+            self.unmapped = np.asarray(self.matrix.sum(axis=1)).ravel() == 0
+
+    @classmethod
+    def from_file(cls, weights_path, src_ds, dst_ds, lat="lat", unmapped_to_nan=False):
+        """Loads an xESMF/ESMF weights file (1-based row/col/S) into CSR."""
+        with xr.open_dataset(weights_path) as w:
+            row = w["row"].values.astype("int64") - 1
+            col = w["col"].values.astype("int64") - 1
+            S = w["S"].values
+
+        shape_in = src_ds[lat].shape
+        shape_out = dst_ds[lat].shape
+        n_in = shape_in[0] * shape_in[1]
+        n_out = shape_out[0] * shape_out[1]
+
+        matrix = sps.csr_matrix((S, (row, col)), shape=(n_out, n_in))
+        return cls(matrix, shape_in, shape_out, src_ds[lat].dims, dst_ds[lat].dims, unmapped_to_nan=unmapped_to_nan)
+
+    def __call__(self, src_ds, dst_ds, lat="lat", lon="lon"):
+        names = [
+            v for v in src_ds.data_vars
+            if src_ds[v].dims[-2:] == self.dims_in
+        ]
+        if not names:
+            return xr.Dataset(coords={lat: dst_ds[lat], lon: dst_ds[lon]})
+
+        # Stack (extra..., y, x) of every variable into one (n_in, k) block
+        columns, layouts = [], []
+        n_in = self.shape_in[0] * self.shape_in[1]
+        for v in names:
+            da = src_ds[v]
+            data = np.asarray(da.values, dtype="float64")
+            extra = data.shape[:-2]
+            flat = data.reshape(-1, n_in)
+            columns.append(flat)
+            layouts.append((v, da, extra, flat.shape[0]))
+
+        out_block = (self.matrix @ np.concatenate(columns, axis=0).T).T
+        if self.unmapped is not None:
+            out_block[:, self.unmapped] = np.nan
+
+        out_vars = {}
+        offset = 0
+        for v, da, extra, n in layouts:
+            out = out_block[offset:offset + n].reshape(*extra, *self.shape_out)
+            offset += n
+            extra_dims = da.dims[:-2]
+            coords = {d: da[d] for d in extra_dims if d in da.coords}
+            out_vars[v] = xr.DataArray(
+                out.astype(np.result_type(da.dtype, np.float32), copy=False),
+                dims=(*extra_dims, *self.dims_out),
+                coords=coords,
+                attrs=da.attrs,
+            )
+
+        return xr.Dataset(out_vars, coords={lat: dst_ds[lat], lon: dst_ds[lon]})
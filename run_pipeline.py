@@ -7,17 +7,16 @@ os.environ["HDF5_PRINT_ERRORS"] = "FALSE"
 
 import argparse
 import pandas as pd
-import numpy as np
-import xarray as xr
-import shutil
 import yaml
 import logging
+import multiprocessing
 import concurrent.futures
+import cProfile
+import pstats
+import io
 import time
-import zarr
 
 from pathlib import Path
-from shapely.geometry import box 
 
 # --- PROJECT SETUP ---
 sys.dont_write_bytecode = True
@@ -25,10 +24,12 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from fetchers.hrrr_fetcher import HRRRFetcher
-from fetchers.rave_fetcher import RAVEFetcher
-from fetchers.wfigs_fetcher import WFIGSFetcher 
-from processors.grid import regrid_rave_to_hrrr
+# Fetchers, regrid and zarr writer modules pull in geopandas, shapely, herbie/cfgrib
+# and xesmf; they are imported inside main() by the stage that first needs them.
+from processors.grid_index import union_bbox
+from pipeline.scheduler import ActiveFireSchedule
+from pipeline.manifest import StoreManifest, load_fire_state, empty_state, merge_state, missing_vars
+from pipeline.metrics import METRICS
 
 def setup_logging(log_path):
     """Industry standard logging configuration."""
@@ -46,14 +47,92 @@ def load_config(config_path="config.yaml"):
     with open(config_path, "r") as f:
         return yaml.safe_load(f)
 
-def fetch_data_task(hrrr_fetcher, rave_fetcher, timestamp):
-    """Worker function to download data in the background."""
-    try:
-        h = hrrr_fetcher.process(timestamp, timestamp, bbox=None)
-        r = rave_fetcher.process(timestamp, timestamp, bbox=None)
-        return h, r
-    except Exception:
-        return None, None
+def process_hour(t, hour_tasks, hrrr_conus, rave_conus, hrrr_fetcher, rave_fetcher, weights_dir, pool, writer, fire_state, logger, ledger=None, rave_for=None):
+    """Clips/regrids every active fire for one hour and hands the results to the writer."""
+    from pipeline.workers import iter_fire_hours
+
+    fire_results = iter_fire_hours(
+        hour_tasks, hrrr_conus, rave_conus,
+        hrrr_fetcher, rave_fetcher, weights_dir, pool=pool, rave_for=rave_for
+    )
+
+    # Single writer: results arrive in task order, so appends stay ordered per group
+    for task, merged, error in fire_results:
+        try:
+            if error is not None: raise error
+            if merged is None:
+                continue
+
+            fid = task["fire_id"]
+            state = fire_state.get(fid, empty_state())
+            hour_exists = t in state["times"]
+
+            current_vars = set(merged.data_vars.keys())
+            new_vars = missing_vars(state, t, current_vars)
+
+            # --- Append Decision Logic ---
+            if hour_exists and not new_vars:
+                # Hour exists and no new columns are being added. Safely skip to avoid duplicates.
+                merged.close()
+                continue
+                
+            if hour_exists and new_vars:
+                # Hour exists, but a new column was detected. Drop old columns and backfill only the new variable(s).
+                logger.info(f"[{fid}] Appending new variable(s) {new_vars} to existing timestamp {t}")
+                writer.write_variables(fid, merged.drop_vars(current_vars - new_vars))
+            else:
+                # Standard Write or Temporal Append (buffered, flushed K hours at a time)
+                writer.append(fid, merged)
+
+            # Update Tracker
+            fire_state[fid] = merge_state(state, [t], new_vars, backfill=hour_exists)
+            
+            merged.close()
+            
+        except Exception as e:
+            logger.error(f"Error on {task['name']} at {t}: {e}")
+            if ledger is not None: ledger.failed(task["fire_id"], t, e)
+
+def log_plan(hour_plan, cluster_aliases, logger):
+    """--dry_run: hours still to fetch per fire, and the fires active in each hour."""
+    fire_hours = {}
+    for t in sorted(hour_plan):
+        for task in hour_plan[t]:
+            fire_hours.setdefault(task["fire_id"], []).append(t)
+
+    logger.info(f"--- PLAN: {len(hour_plan)} hour(s), {len(fire_hours)} fire task(s) ---")
+    for fid, hours in fire_hours.items():
+        logger.info(f"   + {fid}: {len(hours)} hour(s), {hours[0]} to {hours[-1]}")
+    for member, cluster_id in cluster_aliases.items():
+        logger.info(f"   = {member} -> {cluster_id}")
+    for t in sorted(hour_plan):
+        logger.info(f"   {t}: {len(hour_plan[t])} active fire(s)")
+
+def merge_all_shards(root, zarr_name, ledger_dir, conf_zarr, logger):
+    """--merge_shards: folds every shard store under root into the master store."""
+    from pipeline.shard import find_shard_stores, merge_shards, WorkLedger
+    from pipeline.writer import ChunkPolicy
+
+    shard_paths = find_shard_stores(root, zarr_name)
+    if not shard_paths:
+        logger.warning(f"No shard stores for {zarr_name} found in {root}. Exiting.")
+        return
+
+    counts = WorkLedger.summarize(ledger_dir)
+    logger.info(f"Ledger: {counts.get('done', 0)} done, {counts.get('claimed', 0)} claimed, {counts.get('failed', 0)} failed unit(s)")
+    if counts.get("claimed") or counts.get("failed"):
+        logger.warning("Some shards did not finish; their missing hours can be filled by re-running them after the merge.")
+
+    with METRICS.span("merge"):
+        n_groups, n_aliases = merge_shards(root / zarr_name, shard_paths, ChunkPolicy.from_config(conf_zarr), logger)
+    logger.info(f"Merged {n_groups} group(s) and {n_aliases} alias(es) from {len(shard_paths)} shard(s) into {root / zarr_name}")
+
+def write_profile(profiler, path, logger):
+    """Dumps cProfile stats for later inspection and logs the top entries."""
+    profiler.dump_stats(str(path))
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(25)
+    logger.info(f"Profile for first hour written to {path}\n{stream.getvalue()}")
 
 def main():
     config = load_config()
@@ -61,8 +140,8 @@ def main():
     conf_defaults = config['pipeline_defaults']
 
     parser = argparse.ArgumentParser(description="LabFetch Wildfire Data Pipeline")
-    parser.add_argument("--start", required=True)
-    parser.add_argument("--end", required=True)
+    parser.add_argument("--start")
+    parser.add_argument("--end")
     parser.add_argument("--data_root", default=conf_paths['data_root'])
     parser.add_argument("--spatial_pad", type=float, default=conf_defaults['spatial_pad'])
     parser.add_argument("--time_pad", type=int, default=conf_defaults['time_pad'])
@@ -70,8 +149,21 @@ def main():
     parser.add_argument("--fire_id", type=str, default="manual_fetch")
     parser.add_argument("--zarr_store", type=str, default=None, help="Specific Zarr store to append to. If not provided, creates a new one.")
     parser.add_argument("--ongoing_days", type=int, default=conf_defaults.get('ongoing_days', 14), help="Default duration in days to assign to ongoing fires with no end date.")
+    parser.add_argument("--workers", type=int, default=conf_defaults.get('workers', 1), help="Processes used to clip/regrid/merge fires in parallel (1 = serial).")
+    parser.add_argument("--cluster_overlap", type=float, default=conf_defaults.get('cluster_overlap', 0), help="Merge fires whose bboxes overlap by at least this fraction of the smaller box (0 = off).")
+    parser.add_argument("--metrics_file", type=str, default=None, help="Per-stage timing/counter report (.json or .csv). Defaults to <data_root>/metrics.json.")
+    parser.add_argument("--profile", action="store_true", help="Write a cProfile of the first processed hour to <data_root>/profile_hour.prof.")
+    parser.add_argument("--prefetch_depth", type=int, default=conf_defaults.get('prefetch_depth', 2), help="Hours to download ahead of the hour being processed.")
+    parser.add_argument("--max_memory", type=str, default=conf_defaults.get('max_memory'), help="Memory budget such as 6G or 4096M. Opens HRRR/RAVE lazily in fire-sized chunks and lowers the prefetch depth to stay under it.")
+    parser.add_argument("--dry_run", "--plan", dest="dry_run", action="store_true", help="Print the task and hour plan from the manifest and WFIGS, then exit without fetching HRRR/RAVE.")
+    parser.add_argument("--shard", type=str, default=None, help="i/N: process shard i (0-based) of N into its own Zarr shard store.")
+    parser.add_argument("--shard_by", choices=["fire", "time"], default=conf_defaults.get('shard_by', "fire"), help="Partition shards by fire ID hash or by contiguous time blocks.")
+    parser.add_argument("--ledger_dir", type=str, default=None, help="Shared work ledger directory for sharded runs. Defaults to <data_root>/ledger.")
+    parser.add_argument("--merge_shards", action="store_true", help="Merge every shard store under --data_root into the master store and exit.")
     
     args = parser.parse_args()
+    if not args.merge_shards and not (args.start and args.end):
+        parser.error("--start and --end are required (except with --merge_shards)")
 
     # Data Output naming
     start_dt = pd.to_datetime(args.start)
@@ -80,49 +172,55 @@ def main():
     # Default to a master database name instead of time-bound names
     zarr_name = args.zarr_store if args.zarr_store else "master_wildfire_db.zarr"
 
+    # Sharded runs write their own store, raw dirs, log and metrics under a shard tag
+    shard = None
+    if args.shard:
+        from pipeline.shard import parse_shard, shard_store_name, select_shard, drop_stored, WorkLedger
+        shard = parse_shard(args.shard)
+    shard_tag = f".shard{shard[0]:03d}-of-{shard[1]:03d}" if shard else ""
+
     # Path Init
     root = Path(args.data_root)
-    hrrr_dir = root / "raw_hrrr"
-    rave_dir = root / "raw_rave"
-    weights_dir = root / "temp_weights"
-    zarr_path = root / zarr_name
-    log_path = root / "pipeline.log"
+    hrrr_dir = root / "raw_hrrr" / shard_tag.lstrip(".")
+    rave_dir = root / "raw_rave" / shard_tag.lstrip(".")
+    weights_dir = root / conf_paths.get('weights_dir', "regrid_weights")
+    index_dir = root / "grid_index"
+    zarr_path = root / (shard_store_name(zarr_name, *shard) if shard else zarr_name)
+    log_path = root / f"pipeline{shard_tag}.log"
     
-    for d in [root, hrrr_dir, rave_dir, weights_dir]:
+    for d in [root, hrrr_dir, rave_dir, weights_dir, index_dir]:
         d.mkdir(parents=True, exist_ok=True)
 
     logger = setup_logging(log_path)
-    
-    # Check existing zarr groups for appending and their state
-    existing_groups = []
-    fire_state = {}
+    ledger_dir = Path(args.ledger_dir) if args.ledger_dir else root / "ledger"
 
-    if zarr_path.exists():
-        try:
-            zstore = zarr.open(zarr_path, mode='r')
-            existing_groups = list(zstore.group_keys())
-            logger.info(f"Found existing Zarr store with {len(existing_groups)} fires. Reading temporal states to prevent duplicates...")
-            
-            for fid in existing_groups:
-                try:
-                    ds_existing = xr.open_zarr(zarr_path, group=fid, consolidated=False)
-                    fire_state[fid] = {
-                        "times": pd.DatetimeIndex(ds_existing.time.values),
-                        "vars": set(ds_existing.data_vars.keys())
-                    }
-                    ds_existing.close()
-                except Exception as e:
-                    logger.warning(f"Could not read state for {fid}: {e}")
-                    fire_state[fid] = {"times": pd.DatetimeIndex([]), "vars": set()}
-                    
-        except Exception as e:
-            logger.warning(f"Could not read existing Zarr store: {e}")
+    if args.merge_shards:
+        merge_all_shards(root, zarr_name, ledger_dir, config.get('zarr', {}), logger)
+        return
+    
+    # Existing groups and their time/variable state come from the store manifest;
+    # only groups missing from it (or changed by a crashed run) are rescanned.
+    existing_groups, fire_state, manifest = [], {}, None
+    try:
+        with METRICS.span("startup.state_scan"):
+            existing_groups, fire_state, manifest = load_fire_state(zarr_path, logger)
+        if existing_groups:
+            logger.info(f"Found existing Zarr store with {len(existing_groups)} fires.")
+    except Exception as e:
+        logger.warning(f"Could not read existing Zarr store: {e}")
 
-    wfigs_fetcher = WFIGSFetcher()
-    hrrr_fetcher = HRRRFetcher(save_dir=hrrr_dir)
-    rave_fetcher = RAVEFetcher(save_dir=rave_dir)
+    conf_fetchers = config.get('fetchers', {})
 
     # --- STEP 1: Discovery & Validation ---
+    with METRICS.span("startup.import_wfigs"):
+        from fetchers.wfigs_fetcher import WFIGSFetcher
+
+    wfigs_fetcher = WFIGSFetcher(
+        cache_path=root / "wfigs_cache.sqlite",
+        page_size=conf_fetchers.get('wfigs_page_size', 2000),
+        workers=conf_fetchers.get('wfigs_workers', 4),
+        refresh_days=conf_fetchers.get('wfigs_refresh_days', 30),
+    )
     valid_tasks = []
     incomplete_summary = []
 
@@ -132,23 +230,29 @@ def main():
 
     if args.bbox:
         logger.info("Manual BBox Mode: Intersecting with WFIGS...")
-        coords = [float(x.strip()) for x in args.bbox.split(",")]
-        bbox_tuple = (
-            coords[2] - args.spatial_pad,  # lon_min
-            coords[3] + args.spatial_pad,  # lon_max
-            coords[0] - args.spatial_pad,  # lat_min
-            coords[1] + args.spatial_pad   # lat_max
-        )
+        # One or more "lat_min,lat_max,lon_min,lon_max" boxes separated by ';'
+        query_boxes = []
+        for spec in args.bbox.split(";"):
+            if not spec.strip(): continue
+            coords = [float(x.strip()) for x in spec.split(",")]
+            query_boxes.append((
+                coords[2] - args.spatial_pad,  # lon_min
+                coords[3] + args.spatial_pad,  # lon_max
+                coords[0] - args.spatial_pad,  # lat_min
+                coords[1] + args.spatial_pad   # lat_max
+            ))
+        bbox_tuple = union_bbox(query_boxes)
 
-        user_poly = box(bbox_tuple[0], bbox_tuple[2], bbox_tuple[1], bbox_tuple[3])
-        
         if wfigs_gdf is not None and not wfigs_gdf.empty:
-            intersecting_fires = wfigs_gdf[wfigs_gdf.intersects(user_poly)]
-            if not intersecting_fires.empty:
+            from processors.fire_index import IncidentIndex
+            incident_index = IncidentIndex(wfigs_gdf)
+            for k, (box_tuple, intersecting_fires) in enumerate(zip(query_boxes, incident_index.query(query_boxes))):
+                if intersecting_fires.empty: continue
+                suffix = "_custom_cut" if k == 0 else f"_custom_cut{k}"
                 base_tasks = wfigs_fetcher.generate_fire_tasks(intersecting_fires, base_pad=0)
                 for t in base_tasks:
-                    t["bbox"] = bbox_tuple 
-                    t["fire_id"] = f"{t['fire_id']}_custom_cut"
+                    t["bbox"] = box_tuple 
+                    t["fire_id"] = f"{t['fire_id']}{suffix}"
                     t["name"] = f"{t['name']} (Custom BBox)"
                     raw_tasks.append(t)
 
@@ -216,150 +320,217 @@ def main():
         return
         
     fire_tasks = valid_tasks
+
+    # Heavily overlapping fires share one cluster task; members become alias groups
+    cluster_aliases = {}
+    if args.cluster_overlap > 0:
+        from processors.fire_index import cluster_tasks
+        # Clusters keep the ids their members already alias, so earlier groups keep growing
+        known = manifest.aliases() if manifest is not None else {}
+        fire_tasks, cluster_aliases = cluster_tasks(valid_tasks, min_overlap=args.cluster_overlap, known=known)
+        if cluster_aliases:
+            logger.info(f"Merged {len(cluster_aliases)} overlapping fires into {len(set(cluster_aliases.values()))} cluster task(s).")
     
-    # Fire is already in the Zarr store: append, Else: write a new group
-    fire_initialized = {task["fire_id"]: (task["fire_id"] in existing_groups) for task in fire_tasks}
     times = pd.date_range(args.start, args.end, freq="1h")
 
-    # --- Only download new data ---
-    times_to_process = []
-    for t in times:
-        needs_processing = False
-        for task in fire_tasks:
-            fid = task["fire_id"]
-            state = fire_state.get(fid, {"times": pd.DatetimeIndex([]), "vars": set()})
-            if t not in state["times"]:
-                needs_processing = True
-                break
-        
-        if needs_processing:
-            times_to_process.append(t)
-            
-    times = pd.DatetimeIndex(times_to_process)
-    
+    # Raw GRIB/NetCDF persist across runs in byte-budgeted LRU caches
+    conf_cache = config.get('raw_cache', {})
+    gb = lambda v: None if v is None else int(float(v) * 1e9)
+    cache_age = pd.Timedelta(days=conf_cache['max_age_days']) if conf_cache.get('max_age_days') else None
+
+    # Shared by the variable-name probe and the fetcher, so the probe honours the same cache budgets
+    hrrr_settings = dict(
+        model=conf_fetchers.get('hrrr_model', "hrrr"), product=conf_fetchers.get('hrrr_product', "sfc"),
+        priority=conf_fetchers.get('hrrr_priority'),
+        save_dir=hrrr_dir, index_dir=index_dir,
+        cache_bytes=gb(conf_cache.get('hrrr_max_gb', 20)), cache_age=cache_age,
+        # Shards share one .idx cache; entries are immutable and written atomically
+        idx_dir=root / "hrrr_idx",
+        max_gap=int(conf_fetchers.get('hrrr_range_gap_kb', 1024) * 1024),
+        decoded_dir=root / "hrrr_decoded" / shard_tag.lstrip("."),
+        decoded_bytes=gb(conf_cache.get('hrrr_decoded_max_gb', 0)),
+    )
+
+    # --- Variables a stored hour must hold: HRRR fields from DEFAULT_VARS plus rave_frp ---
+    required = None
+    if fire_state:
+        with METRICS.span("startup.import_hrrr"):
+            from fetchers.hrrr_fetcher import HRRRFetcher
+        # Search terms without a known variable name are decoded once to learn it (skipped on --dry_run)
+        probe = HRRRFetcher(**hrrr_settings)
+        hrrr_names = probe.variable_names(probe_time=None if args.dry_run else start_dt)
+        required = {"rave_frp"} | {v for names in hrrr_names.values() for v in names}
+
+    # --- Only download hours where an active fire still needs data ---
+    schedule = ActiveFireSchedule(fire_tasks, time_pad_hours=args.time_pad)
+    hour_plan = schedule.plan(times, fire_state, required=required)
+
+    # --- Sharding: keep this shard's (fire, hour) units that the ledger has not marked done ---
+    ledger = None
+    if shard:
+        ledger = WorkLedger(ledger_dir, *shard)
+        hour_plan = ledger.pending(select_shard(hour_plan, *shard, by=args.shard_by))
+
+        # Hours already merged into the master store are not fetched again by any shard
+        # (variables added to merged hours are backfilled by an unsharded run on the master)
+        master_path = root / zarr_name
+        if master_path.exists():
+            try:
+                with METRICS.span("startup.master_state_scan"):
+                    _, master_state, _ = load_fire_state(master_path, logger, read_only=True)
+                hour_plan = drop_stored(hour_plan, master_state)
+            except Exception as e:
+                logger.warning(f"Could not read master Zarr store: {e}")
+        logger.info(f"Shard {args.shard} (by {args.shard_by}): {sum(len(v) for v in hour_plan.values())} (fire, hour) unit(s) to do")
+
+    times = pd.DatetimeIndex(sorted(hour_plan))
+
     if len(times) == 0:
-        logger.info("All requested hours already exist for all fires. Exiting.")
+        logger.info("All requested hours already exist for all active fires. Exiting.")
         return
 
-    # --- STEP 2: Rave Prefetch ---
-    # rave_fetcher.prefetch(args.start, args.end)
-    logger.info(f"Prefetching RAVE data for missing range: {times[0]} to {times[-1]}")
-    rave_fetcher.prefetch(times[0], times[-1])
+    # Per hour and fire, the variables still missing; hours that only need some are fetched narrowly
+    # and fires with nothing missing are left out of the hour (and of its HRRR envelope)
+    hour_needs = {}
+    if required is not None:
+        for t, tasks in hour_plan.items():
+            needs = {task["fire_id"]: missing_vars(fire_state.get(task["fire_id"]), t, required) for task in tasks}
+            hour_plan[t] = [task for task in tasks if needs[task["fire_id"]]]
+            hour_needs[t] = {fid: missing for fid, missing in needs.items() if missing}
+        n_backfill = sum(1 for needs in hour_needs.values() if all(m != required for m in needs.values()))
+        if n_backfill:
+            logger.info(f"{n_backfill} hour(s) only need new variable(s); fetching just those GRIB messages")
+
+    def missing_at(t):
+        return set().union(*hour_needs[t].values()) if t in hour_needs else None
+
+    def rave_for(t):
+        if t not in hour_needs: return None
+        return {fid for fid, missing in hour_needs[t].items() if "rave_frp" in missing}
+
+    if args.dry_run:
+        log_plan(hour_plan, cluster_aliases, logger)
+        return
 
-    # --- STEP 3: Multithreaded Proccess Loop ---
-    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-    future_fetch = executor.submit(fetch_data_task, hrrr_fetcher, rave_fetcher, times[0])
+    if ledger is not None and not ledger.acquire():
+        logger.error(f"Shard {args.shard} is leased by another live worker ({ledger.lease_path}). Exiting.")
+        return
 
-    for i, t in enumerate(times):
-        logger.info(f"Processing hour {i+1}/{len(times)}: {t}")
-        
-        hrrr_conus, rave_conus = future_fetch.result()
-        
-        if i + 1 < len(times):
-            future_fetch = executor.submit(fetch_data_task, hrrr_fetcher, rave_fetcher, times[i+1])
+    # --- Fetch/regrid/write stack is only loaded once there is work to do ---
+    with METRICS.span("startup.import_pipeline"):
+        from fetchers.hrrr_fetcher import HRRRFetcher
+        from fetchers.rave_fetcher import RAVEFetcher
+        from pipeline.prefetch import PrefetchScheduler
+        from pipeline.writer import BufferedZarrWriter, ChunkPolicy
+
+    conf_zarr = config.get('zarr', {})
+    policy = ChunkPolicy.from_config(conf_zarr)
+
+    # --- Memory budget: lazy, fire-tile-sized chunks and an adaptive prefetch depth ---
+    budget, hrrr_chunks, rave_chunks = None, None, None
+    if args.max_memory:
+        from pipeline.memory import MemoryBudget, parse_size, input_chunks
+        budget = MemoryBudget(parse_size(args.max_memory))
+        hrrr_chunks, rave_chunks = input_chunks(fire_tasks, policy)
+        n_hrrr, n_rave = hrrr_chunks["y"], rave_chunks["grid_yt"]
+        logger.info(f"Memory budget {args.max_memory}: HRRR chunks {n_hrrr}x{n_hrrr}, RAVE chunks {n_rave}x{n_rave}, prefetch depth <= {args.prefetch_depth}")
+
+    hrrr_fetcher = HRRRFetcher(chunks=hrrr_chunks, **hrrr_settings)
+    listing_ttl = conf_fetchers.get('rave_listing_ttl_days')
+    listing_ttl = pd.Timedelta(days=listing_ttl) if listing_ttl is not None else None
+    rave_fetcher = RAVEFetcher(
+        save_dir=rave_dir, index_dir=index_dir,
+        download_workers=conf_fetchers.get('rave_download_workers', 8),
+        chunks=rave_chunks,
+        cache_bytes=gb(conf_cache.get('rave_max_gb', 20)), cache_age=cache_age,
+        base_url=conf_fetchers.get('rave_base_url'),
+        listing_ttl=listing_ttl,
+    )
 
-        if hrrr_conus is None: 
-            continue
+    # --- STEP 2: Rave Prefetch ---
+    # Hours whose fires already store rave_frp skip RAVE entirely
+    rave_needed = lambda t: missing_at(t) is None or "rave_frp" in missing_at(t)
+    rave_times = pd.DatetimeIndex([t for t in times if rave_needed(t)])
+    if len(rave_times):
+        logger.info(f"Prefetching RAVE data for {len(rave_times)} active hours: {rave_times[0]} to {rave_times[-1]}")
+        rave_fetcher.prefetch(rave_times[0], rave_times[-1], hours=rave_times)
 
-        for task in fire_tasks:           
-            try:
-                fid = task["fire_id"]
-                state = fire_state.get(fid, {"times": pd.DatetimeIndex([]), "vars": set()})
-                hour_exists = t in state["times"]
-
-                hrrr_clip = hrrr_fetcher._spatial_subset(hrrr_conus, *task["bbox"])
-                if hrrr_clip is None: 
-                    continue
-
-                rave_clip = None
-                if rave_conus is not None:
-                    try:
-                        rave_clip = rave_fetcher._spatial_subset(rave_conus, *task["bbox"])
-                    except Exception:
-                        pass
-                
-                hrrr_clip = hrrr_clip.rename({"latitude": "lat", "longitude": "lon"})
+    # --- STEP 3: Multithreaded Proccess Loop ---
+    # HRRR and RAVE download on separate lanes, N hours ahead; the scheduler
+    # yields hours in order and sweeps each one from disk once we move on.
+
+    # HRRR is cut to the envelope of the fires active that hour right after decoding
+    hrrr_bbox_for = None
+    if conf_fetchers.get('hrrr_envelope', True):
+        hrrr_bbox_for = lambda t: union_bbox([task["bbox"] for task in hour_plan[t]])
+
+    # Lane sizes not set in config.yaml fall back to the scheduler's own defaults
+    lanes = {k: conf_fetchers[k] for k in ('hrrr_workers', 'rave_workers') if conf_fetchers.get(k)}
+    scheduler = PrefetchScheduler(
+        hrrr_fetcher, rave_fetcher, times,
+        depth=args.prefetch_depth,
+        **lanes,
+        hrrr_bbox_for=hrrr_bbox_for,
+        budget=budget,
+        hrrr_search_for=lambda t: hrrr_fetcher.search_for(missing_at(t)) if t in hour_needs else None,
+        rave_needed=rave_needed,
+    )
 
-                if rave_clip is not None:
-                    weights_file = weights_dir / f"weights_{fid}.nc"
-                    rave_clip = rave_clip.rename({"grid_latt": "lat", "grid_lont": "lon"})
-                    
-                    rave_subset = xr.Dataset({"rave_frp": rave_clip["FRP_MEAN"].fillna(0.0)})
-                    rave_subset = rave_subset.assign_coords({"lat": rave_clip.lat, "lon": rave_clip.lon})
+    # Hours are buffered per fire and appended in batches with an explicit chunk policy
+    writer = BufferedZarrWriter(
+        zarr_path, existing_groups=existing_groups,
+        flush_hours=conf_zarr.get('flush_hours', 24),
+        policy=policy,
+        manifest=manifest or StoreManifest(zarr_path),
+        on_write=ledger.done if ledger is not None else None,
+    )
+    for member, cluster_id in cluster_aliases.items():
+        writer.write_alias(member, cluster_id)
 
-                    rave_rg = regrid_rave_to_hrrr(rave_subset, hrrr_clip, weights_path=weights_file)
-                    merged = xr.merge([hrrr_clip, rave_rg], compat="override")
-                else:
-                    empty_frp = xr.DataArray(np.nan, coords={"y": hrrr_clip.y, "x": hrrr_clip.x}, dims=["y", "x"])
-                    merged = hrrr_clip.assign(rave_frp=empty_frp)
-                    merged.attrs["RAVE_STATUS"] = "ERROR_OR_MISSING_DATA"
+    profiler = cProfile.Profile() if args.profile else None
 
-                # Tag Temporal Status and WFIGS status directly into the Zarr metadata
-                merged.attrs["TEMPORAL_CLIP_STATUS"] = task["temporal_clip_status"]
-                
-                if task.get("end_date_type"):
-                    merged.attrs["END_DATE_TYPE"] = task["end_date_type"]
-                
-                if task.get("ongoing_capped"):
-                    merged.attrs["ONGOING_STATUS"] = "ARTIFICIALLY_CAPPED"
+    # Fires within an hour fan out to a process pool; spawn avoids forking the download threads
+    pool = None
+    if args.workers > 1:
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")
+        )
 
-                if task.get("missing_wfigs"):
-                    merged.attrs["WFIGS_STATUS"] = "NO_FIRE_IN_BBOX"
+    # Buffered hours are flushed and the lease released even on an error or Ctrl-C
+    try:
+        for i, (t, hrrr_conus, rave_conus) in enumerate(scheduler):
+            logger.info(f"Processing hour {i+1}/{len(times)}: {t} ({len(hour_plan[t])} active fires)")
 
-                if "time" not in merged.dims: merged = merged.expand_dims("time")
-                
-                current_vars = set(merged.data_vars.keys())
-                new_vars = current_vars - state["vars"]
-
-                # --- Append Decision Logic ---
-                if hour_exists and not new_vars:
-                    # Hour exists and no new columns are being added. Safely skip to avoid duplicates.
-                    merged.close()
-                    continue
-                    
-                if hour_exists and new_vars:
-                    # Hour exists, but a new column was detected. Drop old columns and append only the new variable.
-                    logger.info(f"[{fid}] Appending new variable(s) {new_vars} to existing timestamp {t}")
-                    vars_to_drop = current_vars.intersection(state["vars"])
-                    merged = merged.drop_vars(vars_to_drop)
-                    
-                    mode = "a"
-                    append_dim = None # Required for variable appending
-                else:
-                    # Standard Write or Temporal Append
-                    mode = "a" if fire_initialized[fid] else "w"
-                    append_dim = "time" if mode == "a" else None
-
-                merged.to_zarr(
-                    zarr_path, 
-                    group=fid, 
-                    mode=mode if mode == "w" else "a", 
-                    append_dim=append_dim, 
-                    consolidated=False
-                )
-                
-                fire_initialized[fid] = True
-                
-                # Update Tracker
-                state["times"] = state["times"].union([t])
-                state["vars"].update(new_vars)
-                fire_state[fid] = state
-                
-                merged.close()
-                
-            except Exception as e:
-                logger.error(f"Error on {task['name']} at {t}: {e}")
+            if ledger is not None: ledger.claim(t, [task["fire_id"] for task in hour_plan[t]])
 
-        hrrr_conus.close()
-        if rave_conus is not None: rave_conus.close()
-        hrrr_fetcher.cleanup_timestamp(t)
-        rave_fetcher.cleanup_timestamp(t)
+            if hrrr_conus is None: 
+                if ledger is not None:
+                    for task in hour_plan[t]: ledger.failed(task["fire_id"], t, "HRRR unavailable")
+                continue
 
-    executor.shutdown()
+            with METRICS.span("hour"):
+                if profiler is not None and i == 0:
+                    # --profile: capture a full call profile of the first processed hour only
+                    profiler.runcall(process_hour, t, hour_plan[t], hrrr_conus, rave_conus, hrrr_fetcher, rave_fetcher, weights_dir, pool, writer, fire_state, logger, ledger, rave_for(t))
+                    write_profile(profiler, root / f"profile_hour{shard_tag}.prof", logger)
+                else:
+                    process_hour(t, hour_plan[t], hrrr_conus, rave_conus, hrrr_fetcher, rave_fetcher, weights_dir, pool, writer, fire_state, logger, ledger, rave_for(t))
+    finally:
+        try:
+            writer.close()
+        finally:
+            scheduler.shutdown()
+            if pool is not None: pool.shutdown(cancel_futures=True)
+            if ledger is not None: ledger.release()
+
+    metrics_path = METRICS.write(args.metrics_file or root / f"metrics{shard_tag}.json")
+    logger.info(f"Stage metrics written to {metrics_path}")
     
-    for d in [hrrr_dir, rave_dir, weights_dir]:
-        if d.exists(): shutil.rmtree(d)
-        
+    # Raw files stay in their budgeted caches and regrid weights are content-addressed;
+    # both are reused by the next run instead of downloaded/built again
+    logger.info(f"Raw cache: HRRR {hrrr_fetcher.cache.total_bytes / 1e9:.2f} GB, RAVE {rave_fetcher.cache.total_bytes / 1e9:.2f} GB")
+    if hrrr_fetcher.decoded is not None:
+        logger.info(f"Decoded HRRR cache: {hrrr_fetcher.decoded.total_bytes / 1e9:.2f} GB")
     logger.info(f"Batch Complete: {zarr_path}")
 
 if __name__ == "__main__":
@@ -0,0 +1,8 @@
+import sys
+
+from pathlib import Path
+
+# Same import root as run_pipeline.py and the benchmarks
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import http.server
+import json
+import threading
+import time
+import pytest
+
+from fetchers import async_http
+from fetchers.async_http import AsyncHTTPClient
+
+PAYLOAD = bytes(range(256)) * 200
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves server.files (Range-capable unless listed in server.no_range).
+    server.status maps a path to statuses answered first, one per request;
+    server.peak records the most requests ever in flight at once.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        srv = self.server
+        with srv.lock:
+            srv.requests.append((self.path, self.headers.get("Range")))
+            srv.in_flight += 1
+            srv.peak = max(srv.peak, srv.in_flight)
+        try:
+            time.sleep(srv.delay)
+            self._respond(srv)
+        finally:
+            with srv.lock:
+                srv.in_flight -= 1
+
+    def _respond(self, srv):
+        path = self.path.split("?")[0]
+        if srv.status.get(path):
+            return self._send(srv.status[path].pop(0))
+        if path == "/query":
+            return self._send(200, json.dumps({"path": self.path}).encode(), {"Content-Type": "application/json"})
+
+        body = srv.files[path]
+        rng = self.headers.get("Range")
+        if not rng or path in srv.no_range:
+            return self._send(200, body)
+        first, _, last = rng[6:].partition("-")
+        start, stop = int(first), int(last) if last else len(body) - 1
+        if start >= len(body):
+            return self._send(416)
+        return self._send(206, body[start:stop + 1], {"Content-Range": f"bytes {start}-{stop}/{len(body)}"})
+
+
+@pytest.fixture
+def server(monkeypatch):
+    async def no_wait(seconds):
+        pass
+    monkeypatch.setattr(async_http.asyncio, "sleep", no_wait)
+
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.files = {"/a.nc": PAYLOAD, "/b.nc": PAYLOAD}
+    srv.status, srv.no_range, srv.requests = {}, set(), []
+    srv.lock, srv.in_flight, srv.peak, srv.delay = threading.Lock(), 0, 0, 0.0
+    threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    srv.url = lambda path, host="127.0.0.1": f"http://{host}:{srv.server_port}{path}"
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def run(coro_fn, **kwargs):
+    async def main():
+        async with AsyncHTTPClient(**kwargs) as client:
+            return await coro_fn(client)
+    return asyncio.run(main())
+
+
+def test_get_returns_client_errors_and_retries_server_errors(server):
+    server.status["/a.nc"] = [503, 502]
+    server.status["/gone.nc"] = [404]
+
+    r = run(lambda c: c.get(server.url("/a.nc")))
+    assert r.status_code == 200 and r.content == PAYLOAD
+    assert int(r.headers["Content-Length"]) == len(PAYLOAD)
+
+    missing = run(lambda c: c.get(server.url("/gone.nc")))
+    assert missing.status_code == 404
+    with pytest.raises(IOError):
+        missing.raise_for_status()
+    assert [p for p, _ in server.requests] == ["/a.nc"] * 3 + ["/gone.nc"]
+
+
+def test_get_gives_up_after_retries(server):
+    server.status["/a.nc"] = [500] * 5
+    with pytest.raises(IOError):
+        run(lambda c: c.get(server.url("/a.nc")), retries=2)
+    assert len(server.requests) == 2
+
+
+def test_get_json_sends_params(server):
+    data = run(lambda c: c.get_json(server.url("/query"), params={"where": "1=1", "f": "json"}))
+    assert data == {"path": "/query?where=1%3D1&f=json"}
+
+
+def test_get_range_with_and_without_server_support(server):
+    server.no_range.add("/b.nc")
+    for path in ("/a.nc", "/b.nc"):
+        assert run(lambda c: c.get_range(server.url(path), 10, 19)) == PAYLOAD[10:20]
+        assert run(lambda c: c.get_range(server.url(path), 51000, None)) == PAYLOAD[51000:]
+    assert server.requests[0] == ("/a.nc", "bytes=10-19")
+
+
+def test_fetch_resumes_part_and_verifies(server, tmp_path):
+    dest = tmp_path / "a.nc"
+    dest.with_name("a.nc.part").write_bytes(PAYLOAD[:1000])
+    assert run(lambda c: c.fetch(server.url("/a.nc"), dest)) == dest
+    assert dest.read_bytes() == PAYLOAD
+    assert server.requests[-1] == ("/a.nc", "bytes=1000-")
+
+    # Checksum mismatch: nothing lands under the final name
+    other = tmp_path / "b.nc"
+    assert run(lambda c: c.fetch(server.url("/b.nc"), other, sha256=hashlib.sha256(b"x").hexdigest())) is None
+    assert not other.exists()
+
+
+def test_fetch_does_not_retry_client_errors(server, tmp_path):
+    server.status["/gone.nc"] = [404]
+    assert run(lambda c: c.fetch(server.url("/gone.nc"), tmp_path / "gone.nc")) is None
+    assert len(server.requests) == 1
+
+
+def test_concurrency_capped_per_host(server):
+    server.delay = 0.05
+
+    async def burst(client, host="127.0.0.1", n=12):
+        return await asyncio.gather(*(client.get(server.url("/a.nc", host)) for _ in range(n)))
+
+    run(burst, per_host=3)
+    assert server.peak == 3
+
+    server.peak = 0
+    run(burst, per_host=3, host_limits={f"127.0.0.1:{server.server_port}": 1})
+    assert server.peak == 1
+
+    # Each host has its own budget
+    server.peak = 0
+    run(lambda c: asyncio.gather(burst(c), burst(c, host="localhost")), per_host=2)
+    assert server.peak == 4
@@ -0,0 +1,113 @@
+import hashlib
+import http.server
+import socket
+import threading
+import pytest
+
+from fetchers import download
+from fetchers.download import Downloader
+from pipeline.metrics import METRICS
+
+PAYLOAD = bytes(range(256)) * 200
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Serves server.files with Range support; server.cut / server.status script failures per path."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        srv = self.server
+        srv.requests.append((self.path, self.headers.get("Range")))
+
+        if self.path in srv.status:
+            self.send_response(srv.status[self.path])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = srv.files[self.path]
+        start = 0
+        rng = self.headers.get("Range")
+        if rng:
+            start = int(rng.split("=")[1].split("-")[0])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+
+        if srv.cut.get(self.path):
+            # Drop the connection half-way through the body
+            srv.cut[self.path] -= 1
+            self.wfile.write(body[start:start + (len(body) - start) // 2])
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self.wfile.write(body[start:])
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(download.time, "sleep", lambda s: None)
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.files = {"/a.nc": PAYLOAD}
+    srv.cut, srv.status, srv.requests = {}, {}, []
+    threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    srv.url = lambda path: f"http://127.0.0.1:{srv.server_port}{path}"
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_interrupted_download_resumes_from_part(server, tmp_path):
+    server.cut["/a.nc"] = 1
+    dest = tmp_path / "a.nc"
+    assert Downloader(chunk_size=1024).fetch(server.url("/a.nc"), dest) == dest
+
+    assert dest.read_bytes() == PAYLOAD
+    assert not (tmp_path / "a.nc.part").exists()
+    (first, r1), (second, r2) = server.requests
+    assert r1 is None
+    # The retry only asks for the bytes the .part file is missing
+    assert r2.startswith("bytes=") and 0 < int(r2[6:-1]) < len(PAYLOAD)
+
+
+def test_digest_is_recorded_and_checked(server, tmp_path):
+    dest = tmp_path / "a.nc"
+    dl = Downloader()
+    dl.fetch(server.url("/a.nc"), dest)
+    recorded = Downloader.digest_path(dest).read_text().split()[0]
+    assert recorded == hashlib.sha256(PAYLOAD).hexdigest()
+
+    # Intact files are reused without a request
+    assert dl.fetch(server.url("/a.nc"), dest) == dest
+    assert len(server.requests) == 1
+
+    # A corrupted file is detected and downloaded again
+    METRICS.reset()
+    dest.write_bytes(b"x" * len(PAYLOAD))
+    assert dl.fetch(server.url("/a.nc"), dest) == dest
+    assert dest.read_bytes() == PAYLOAD
+    assert METRICS.snapshot()["counters"]["http.checksum_mismatches"] == 1
+
+
+def test_checksum_mismatch_is_rejected(server, tmp_path):
+    dest = tmp_path / "a.nc"
+    assert Downloader(retries=2).fetch(server.url("/a.nc"), dest, sha256="0" * 64) is None
+    assert not dest.exists() and not (tmp_path / "a.nc.part").exists()
+    assert Downloader(retries=2).fetch(server.url("/a.nc"), dest, sha256=hashlib.sha256(PAYLOAD).hexdigest()) == dest
+
+
+@pytest.mark.parametrize("status, attempts", [(404, 1), (403, 1), (429, 3), (503, 3)])
+def test_only_retryable_statuses_are_retried(server, tmp_path, status, attempts):
+    server.status["/a.nc"] = status
+    assert Downloader(retries=3).fetch(server.url("/a.nc"), tmp_path / "a.nc") is None
+    assert len(server.requests) == attempts
@@ -0,0 +1,34 @@
+from processors.fire_index import cluster_tasks
+
+
+def task(fid, bbox):
+    return {"fire_id": fid, "name": fid, "start": "2025-07-01", "end": "2025-07-02", "bbox": bbox}
+
+
+BOX = (-120.0, -119.0, 35.0, 36.0)
+NEAR = (-119.95, -118.95, 35.0, 36.0)
+FAR = (-100.0, -99.0, 40.0, 41.0)
+
+
+def test_cluster_named_after_smallest_member():
+    tasks, aliases = cluster_tasks([task("B", BOX), task("C", NEAR), task("Z", FAR)], min_overlap=0.8)
+    assert aliases == {"B": "CLUSTER_B", "C": "CLUSTER_B"}
+    assert sorted(t["fire_id"] for t in tasks) == ["CLUSTER_B", "Z"]
+
+
+def test_cluster_keeps_stored_id_when_membership_changes():
+    # A joins a cluster first written as CLUSTER_B: the group keeps its id
+    known = {"B": "CLUSTER_B", "C": "CLUSTER_B"}
+    tasks, aliases = cluster_tasks([task("A", BOX), task("B", BOX), task("C", NEAR)], min_overlap=0.8, known=known)
+    assert set(aliases.values()) == {"CLUSTER_B"}
+    assert [t["fire_id"] for t in tasks] == ["CLUSTER_B"]
+
+
+def test_split_cluster_gets_a_fresh_id():
+    known = {"B": "CLUSTER_B", "C": "CLUSTER_B", "D": "CLUSTER_B", "E": "CLUSTER_B"}
+    far_near = (-99.95, -98.95, 40.0, 41.0)
+    _, aliases = cluster_tasks(
+        [task("B", BOX), task("C", NEAR), task("D", FAR), task("E", far_near)], min_overlap=0.8, known=known
+    )
+    assert aliases["B"] == aliases["C"] == "CLUSTER_B"
+    assert aliases["D"] == aliases["E"] == "CLUSTER_D"
@@ -0,0 +1,64 @@
+import pickle
+import pytest
+
+from fetchers.grib_index import IdxCache, extract, gap_bytes, parse_idx, plan_ranges
+
+IDX = """\
+1:0:d=2024070100:TMP:2 m above ground:anl:
+2:100:d=2024070100:RH:2 m above ground:anl:
+3:250:d=2024070100:UGRD:10 m above ground:anl:
+3.1:250:d=2024070100:VGRD:10 m above ground:anl:
+4:400:d=2024070100:GUST:surface:anl:
+5:1000:d=2024070100:PRATE:surface:anl:
+"""
+
+
+def test_parse_idx_byte_ranges():
+    idx = parse_idx(IDX)
+    assert [(s, e) for s, e, _ in idx] == [(0, 99), (100, 249), (250, 399), (250, 399), (400, 999), (1000, None)]
+    assert idx[0][2] == ":TMP:2 m above ground:anl:"
+
+
+def test_plan_merges_close_messages():
+    idx = parse_idx(IDX)
+    requests = plan_ranges(idx, ":(TMP|UGRD):", max_gap=200)
+    assert requests == [(0, 399, [(0, 99), (250, 399)])]
+    assert gap_bytes(requests) == 150
+
+
+def test_plan_keeps_far_messages_apart():
+    idx = parse_idx(IDX)
+    assert plan_ranges(idx, ":(TMP|UGRD):", max_gap=100) == [(0, 99, [(0, 99)]), (250, 399, [(250, 399)])]
+
+
+def test_plan_adjacent_and_no_merge():
+    idx = parse_idx(IDX)
+    # Adjacent messages merge even with max_gap=0; -1 disables merging
+    assert plan_ranges(idx, ":(TMP|RH):", max_gap=0) == [(0, 249, [(0, 99), (100, 249)])]
+    assert len(plan_ranges(idx, ":(TMP|RH):", max_gap=-1)) == 2
+
+
+def test_plan_submessages_requested_once():
+    idx = parse_idx(IDX)
+    assert plan_ranges(idx, ":[UV]GRD:") == [(250, 399, [(250, 399)])]
+
+
+def test_plan_open_ended_last_message():
+    idx = parse_idx(IDX)
+    requests = plan_ranges(idx, ":(GUST|PRATE):", max_gap=1 << 20)
+    assert requests == [(400, None, [(400, 999), (1000, None)])]
+    assert plan_ranges(idx, ":(TMP|PRATE):", max_gap=100)[-1] == (1000, None, [(1000, None)])
+
+
+def test_extract_drops_gap_bytes():
+    idx = parse_idx(IDX)
+    body = bytes(range(256)) * 2
+    request = plan_ranges(idx, ":(TMP|UGRD):", max_gap=200)[0]
+    assert extract(request, body[:400]) == body[0:100] + body[250:400]
+    tail = plan_ranges(idx, ":PRATE:")[0]
+    assert extract(tail, b"abc") == b"abc"
+
+
+def test_idx_cache_stays_in_process(tmp_path):
+    with pytest.raises(TypeError, match="root directory"):
+        pickle.dumps(IdxCache(tmp_path))
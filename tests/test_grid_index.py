@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from processors import grid_index
+from processors.grid_index import GridIndex, get_index
+
+
+def curvilinear(ny=40, nx=50):
+    y, x = np.meshgrid(np.arange(ny), np.arange(nx), indexing="ij")
+    # Rotated, sheared grid like a Lambert projection
+    lat = 30 + 0.1 * y + 0.02 * x
+    lon = -120 + 0.1 * x - 0.03 * y
+    return lat, lon
+
+
+def brute_force(lat, lon, bbox):
+    lon_min, lon_max, lat_min, lat_max = bbox
+    ys, xs = np.where((lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max))
+    if len(ys) == 0:
+        return None
+    return (int(ys.min()), int(ys.max()) + 1, int(xs.min()), int(xs.max()) + 1)
+
+
+BBOXES = [
+    (-118.0, -116.5, 31.0, 32.5),
+    (-120.5, -119.5, 29.0, 30.5),   # clipped by the grid edge
+    (-115.3, -115.1, 33.0, 33.2),   # a few cells
+    (-100.0, -99.0, 50.0, 51.0),    # off the grid
+]
+
+
+@pytest.mark.parametrize("bbox", BBOXES)
+def test_slices_match_brute_force(bbox):
+    lat, lon = curvilinear()
+    assert GridIndex(lat, lon).slices(*bbox) == brute_force(lat, lon, bbox)
+
+
+def test_persisted_index_is_reused(tmp_path, monkeypatch):
+    lat, lon = curvilinear()
+    first = GridIndex(lat, lon, cache_dir=tmp_path)
+    windows = [first.slices(*b) for b in BBOXES]
+    assert list(tmp_path.glob("*.json")) == [tmp_path / f"{first.fingerprint}.json"]
+
+    # A later run answers every known bbox from the file, without searching
+    second = GridIndex(lat, lon, cache_dir=tmp_path)
+    monkeypatch.setattr(second, "_search", lambda *a: pytest.fail("searched a cached bbox"))
+    assert [second.slices(*b) for b in BBOXES] == windows
+
+
+def test_one_shared_index_per_fingerprint(tmp_path, monkeypatch):
+    monkeypatch.setattr(grid_index, "_INDEXES", {})
+    lat, lon = curvilinear()
+    other_lat, other_lon = curvilinear(30, 30)
+
+    a = get_index(lat, lon, cache_dir=tmp_path)
+    assert get_index(lat.copy(), lon.copy(), cache_dir=tmp_path) is a
+    assert get_index(other_lat, other_lon, cache_dir=tmp_path) is not a
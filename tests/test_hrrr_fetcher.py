@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+pytest.importorskip("herbie")
+eccodes = pytest.importorskip("eccodes")
+pytest.importorskip("cfgrib")
+
+from benchmarks.servers import file_server
+from fetchers.hrrr_fetcher import HRRRFetcher
+from pipeline.metrics import METRICS
+
+T = pd.Timestamp("2024-07-01 00:00")
+NAME = "hrrr.t00z.wrfsfcf00.grib2"
+SEARCH = ":TMP:2 m|:DPT:2 m|:HGT:surface:"
+
+# (idx key, (category, number, surface type, level)); GUST sits between wanted messages
+MESSAGES = [
+    ("TMP:2 m above ground", (0, 0, 103, 2)),
+    ("DPT:2 m above ground", (0, 6, 103, 2)),
+    ("GUST:surface", (2, 22, 1, 0)),
+    ("HGT:surface", (3, 5, 1, 0)),
+]
+
+
+def grib_message(category, number, surface, level, values):
+    """One GRIB2 message on a small HRRR-like Lambert grid."""
+    h = eccodes.codes_grib_new_from_samples("GRIB2")
+    for key, value in [
+        ("gridDefinitionTemplateNumber", 30), ("shapeOfTheEarth", 6), ("Nx", 8), ("Ny", 6),
+        ("latitudeOfFirstGridPointInDegrees", 21.138), ("longitudeOfFirstGridPointInDegrees", 237.28),
+        ("LaDInDegrees", 38.5), ("LoVInDegrees", 262.5), ("Latin1InDegrees", 38.5), ("Latin2InDegrees", 38.5),
+        ("DxInMetres", 3000), ("DyInMetres", 3000),
+        ("dataDate", int(f"{T:%Y%m%d}")), ("dataTime", T.hour * 100),
+        ("parameterCategory", category), ("parameterNumber", number),
+        ("typeOfFirstFixedSurface", surface), ("scaleFactorOfFirstFixedSurface", 0), ("scaledValueOfFirstFixedSurface", level),
+    ]:
+        eccodes.codes_set(h, key, value)
+    eccodes.codes_set_values(h, np.asarray(values, dtype="float64").ravel())
+    try:
+        return eccodes.codes_get_message(h)
+    finally:
+        eccodes.codes_release(h)
+
+
+def write_archive(directory):
+    """A GRIB2 file and its wgrib2 .idx, laid out like one hour of the archive."""
+    directory.mkdir(parents=True, exist_ok=True)
+    blob, lines = b"", []
+    for i, (key, params) in enumerate(MESSAGES, start=1):
+        lines.append(f"{i}:{len(blob)}:d={T:%Y%m%d%H}:{key}:anl:")
+        blob += grib_message(*params, np.arange(48) + 100 * i)
+    (directory / NAME).write_bytes(blob)
+    (directory / (NAME + ".idx")).write_text("\n".join(lines) + "\n")
+    return directory / NAME
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return write_archive(tmp_path / "archive" / f"hrrr.{T:%Y%m%d}" / "conus")
+
+
+def fetcher(tmp_path, **kwargs):
+    return HRRRFetcher(save_dir=tmp_path / "raw", index_dir=tmp_path / "grid_index", idx_dir=tmp_path / "idx", **kwargs)
+
+
+def test_sources_follow_model_and_priority(tmp_path):
+    [(url, idx), *_] = fetcher(tmp_path)._sources(T)
+    assert url == f"https://noaa-hrrr-bdp-pds.s3.amazonaws.com/hrrr.20240701/conus/{NAME}"
+    assert idx == url + ".idx"
+
+    urls = [u for u, _ in fetcher(tmp_path, priority=["google", "azure", "aws"])._sources(T)]
+    assert urls[0].startswith("https://storage.googleapis.com/") and urls[1].startswith("https://noaa-hrrr-bdp-pds")
+    assert len(urls) == 2
+
+    # Alaska: NOMADS only keeps recent days, so an old hour starts at AWS
+    urls = [u for u, _ in fetcher(tmp_path, model="hrrrak")._sources(T)]
+    assert urls[0].endswith("/alaska/hrrr.t00z.wrfsfcf00.ak.grib2") and "nomads" not in urls[0]
+
+
+def test_coalesced_ranges_match_the_archive(tmp_path, archive, monkeypatch):
+    with file_server(tmp_path / "archive") as srv:
+        url = f"{srv.url}hrrr.{T:%Y%m%d}/conus/{NAME}"
+        # An unreachable source first: the next one in priority order is used
+        monkeypatch.setattr(HRRRFetcher, "_sources", lambda self, t: [(srv.url + "missing.grib2", srv.url + "missing.grib2.idx"), (url, url + ".idx")])
+
+        counts = {}
+        for label, max_gap in (("per_message", -1), ("coalesced", 1 << 20)):
+            METRICS.reset()
+            ds = fetcher(tmp_path / label, max_gap=max_gap)._fetch_hour(T, search=SEARCH)
+            counts[label] = METRICS.counters["hrrr.range_requests"]
+            assert sorted(ds.data_vars) == ["d2m", "elevation", "t2m"]
+            assert ds.attrs["remote_grib"] == url
+
+    assert counts == {"per_message": 3, "coalesced": 1}
+    # The bridged GUST message was dropped again: values are the archive's own
+    assert float(ds.t2m.isel(time=0, y=0, x=0)) == 100
+    assert float(ds.elevation.isel(time=0, y=0, x=0)) == 400
+
+
+def test_falls_back_to_herbie_without_a_reachable_idx(tmp_path, archive, monkeypatch):
+    calls = []
+    def herbie(self, t, search):
+        calls.append((t, search))
+        local = self.save_dir / self.model / f"{t:%Y%m%d}" / NAME
+        write_archive(local.parent)
+        return local, "https://example.test/" + NAME
+
+    monkeypatch.setattr(HRRRFetcher, "_sources", lambda self, t: [("http://127.0.0.1:9/x.grib2", "http://127.0.0.1:9/x.grib2.idx")])
+    monkeypatch.setattr(HRRRFetcher, "_download_herbie", herbie)
+    f = fetcher(tmp_path)
+    f.http.retries = 1
+    ds = f._fetch_hour(T, search=SEARCH)
+    assert calls == [(T, SEARCH)]
+    assert ds.attrs["remote_grib"] == "https://example.test/" + NAME
+
+
+def test_decode_matches_herbie_xarray(tmp_path, archive):
+    from herbie import Herbie
+
+    # Herbie finds the file (and its .idx) in its local layout and never goes online
+    local = tmp_path / "herbie" / "hrrr" / f"{T:%Y%m%d}" / NAME
+    write_archive(local.parent)
+    H = Herbie(T, model="hrrr", product="sfc", save_dir=str(tmp_path / "herbie"), verbose=False)
+    expected = H.xarray(remove_grib=False)
+    expected = expected if isinstance(expected, list) else [expected]
+
+    f = fetcher(tmp_path)
+    decoded = f._decode(local, T, None, H.grib)
+    assert len(decoded) == len(expected)
+    for ours, theirs in zip(decoded, expected):
+        xr.testing.assert_identical(ours, theirs)
+        assert ours.gribfile_projection.attrs == theirs.gribfile_projection.attrs
+
+
+def test_decoded_cache_is_opt_in(tmp_path, archive, monkeypatch):
+    assert fetcher(tmp_path).decoded is None
+    assert fetcher(tmp_path, decoded_dir=tmp_path / "decoded").decoded is None
+
+    with file_server(tmp_path / "archive") as srv:
+        url = f"{srv.url}hrrr.{T:%Y%m%d}/conus/{NAME}"
+        monkeypatch.setattr(HRRRFetcher, "_sources", lambda self, t: [(url, url + ".idx")])
+        first = fetcher(tmp_path / "first", decoded_dir=tmp_path / "decoded", decoded_bytes=None)._fetch_hour(T, search=SEARCH)
+
+    # Served from the decoded file: nothing is downloaded or decoded again
+    monkeypatch.setattr(HRRRFetcher, "_sources", lambda self, t: [])
+    monkeypatch.setattr(HRRRFetcher, "_download_herbie", lambda self, t, search: pytest.fail("downloaded again"))
+    again = fetcher(tmp_path / "again", decoded_dir=tmp_path / "decoded", decoded_bytes=None)._fetch_hour(T, search=SEARCH)
+    xr.testing.assert_equal(again[["t2m", "d2m", "elevation"]], first[["t2m", "d2m", "elevation"]])
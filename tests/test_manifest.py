@@ -0,0 +1,130 @@
+import logging
+import os
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from pipeline.manifest import (
+    LEGACY_MANIFEST_NAME, StoreManifest, empty_state, load_fire_state, manifest_path, merge_state, missing_vars,
+)
+from pipeline.writer import BufferedZarrWriter
+
+
+def hour(t):
+    return xr.Dataset({"t2m": (("time", "y", "x"), np.ones((1, 2, 2), "float32"))}, coords={"time": [t]})
+
+T = pd.date_range("2024-07-01", periods=6, freq="1h")
+
+
+def test_append_extends_times_and_vars():
+    state = merge_state(empty_state(), T[:3], ["t2m", "u10"])
+    state = merge_state(state, T[3:], ["t2m", "u10"])
+    assert (state["times"] == T).all()
+    assert state["vars"] == {"t2m", "u10"} and state["var_times"] == {}
+
+
+def test_backfill_tracks_partial_variable():
+    state = merge_state(empty_state(), T, ["t2m"])
+    state = merge_state(state, T[[1, 2]], ["rave_frp"], backfill=True)
+    assert (state["var_times"]["rave_frp"] == T[[1, 2]]).all()
+
+    assert missing_vars(state, T[1], {"t2m", "rave_frp"}) == set()
+    assert missing_vars(state, T[0], {"t2m", "rave_frp"}) == {"rave_frp"}
+
+    # Covering the rest makes it a full variable again
+    state = merge_state(state, T[[0, 3, 4, 5]], ["rave_frp"], backfill=True)
+    assert "rave_frp" not in state["var_times"]
+    assert missing_vars(state, T[0], {"t2m", "rave_frp"}) == set()
+
+
+def test_variable_first_appended_after_older_hours():
+    state = merge_state(empty_state(), T[:3], ["t2m"])
+    state = merge_state(state, T[3:], ["t2m", "rave_frp"])
+    assert (state["var_times"]["rave_frp"] == T[3:]).all()
+    assert missing_vars(state, T[0], {"rave_frp"}) == {"rave_frp"}
+    assert missing_vars(state, T[4], {"rave_frp"}) == set()
+
+
+def test_missing_vars_for_unknown_hours_and_groups():
+    state = merge_state(empty_state(), T[:2], ["t2m"])
+    assert missing_vars(state, T[5], {"t2m"}) == {"t2m"}
+    assert missing_vars(None, T[0], {"t2m", "u10"}) == {"t2m", "u10"}
+    assert missing_vars(state, T[0], {"t2m", "u10"}) == {"u10"}
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest = StoreManifest(tmp_path / "fires.zarr")
+    manifest.record("F1", T[:4], ["t2m"])
+    manifest.record("F1", T[[0, 2]], ["rave_frp"], backfill=True)
+
+    reloaded = StoreManifest(tmp_path / "fires.zarr")
+    assert reloaded.load()
+    state = reloaded.state("F1")
+    assert (state["times"] == T[:4]).all()
+    assert (state["var_times"]["rave_frp"] == T[[0, 2]]).all()
+
+
+def write_store(path, per_group):
+    writer = BufferedZarrWriter(path, flush_hours=24, manifest=StoreManifest(path))
+    for fid, times in per_group.items():
+        for t in times:
+            writer.append(fid, hour(t))
+    writer.close()
+
+
+def test_manifest_is_a_sidecar(tmp_path):
+    path = tmp_path / "fires.zarr"
+    write_store(path, {"F1": T[:2]})
+    assert manifest_path(path).exists()
+    assert not any(p.name.endswith(".json") and "manifest" in p.name for p in path.iterdir())
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        groups, state, _ = load_fire_state(path, logging.getLogger("test"))
+        xr.open_zarr(path, group="F1", consolidated=False).close()
+    assert groups == ["F1"] and (state["F1"]["times"] == T[:2]).all()
+
+
+def test_one_manifest_save_per_flush(tmp_path, monkeypatch):
+    path = tmp_path / "fires.zarr"
+    manifest = StoreManifest(path)
+    saves = []
+    monkeypatch.setattr(manifest, "save", lambda: saves.append(manifest.open))
+    writer = BufferedZarrWriter(path, flush_hours=2, manifest=manifest)
+    for t in T:
+        writer.append("F1", hour(t))
+    writer.close()
+    # Opened once for the run, one save per flushed batch, closed once
+    assert saves == [True] + [True] * 3 + [False]
+
+
+def test_crashed_run_rescans_groups_that_changed(tmp_path):
+    path = tmp_path / "fires.zarr"
+    write_store(path, {"F1": T[:2], "F2": T[:2]})
+
+    # A run that appended to F2 and died before its manifest save and close
+    manifest = StoreManifest(path)
+    manifest.load()
+    manifest.begin()
+    hour(T[2]).to_zarr(path, group="F2", mode="a", append_dim="time", consolidated=False)
+
+    _, state, reloaded = load_fire_state(path, logging.getLogger("test"))
+    assert (state["F2"]["times"] == T[:3]).all()
+    assert (state["F1"]["times"] == T[:2]).all()
+    persisted = StoreManifest(path)
+    assert persisted.load() and not persisted.open
+    assert (persisted.state("F2")["times"] == T[:3]).all()
+
+
+@pytest.mark.filterwarnings("ignore:Object at labfetch_manifest.json")
+def test_legacy_manifest_moves_out_of_the_store(tmp_path):
+    path = tmp_path / "fires.zarr"
+    write_store(path, {"F1": T[:2]})
+    legacy = path / LEGACY_MANIFEST_NAME
+    os.replace(manifest_path(path), legacy)
+
+    _, state, _ = load_fire_state(path, logging.getLogger("test"))
+    assert (state["F1"]["times"] == T[:2]).all()
+    assert manifest_path(path).exists() and not legacy.exists()
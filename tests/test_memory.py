@@ -0,0 +1,88 @@
+import dask.array as da
+import numpy as np
+import pytest
+import xarray as xr
+
+from pipeline import memory
+from pipeline.memory import MemoryBudget, input_chunks, parse_size, resident_bytes, HRRR_CELL_DEG, RAVE_CELL_DEG
+from pipeline.metrics import METRICS
+from pipeline.writer import ChunkPolicy
+
+MB = 1 << 20
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("8G", 8 << 30), ("512MB", 512 * MB), ("1.5 GiB", int(1.5 * (1 << 30))),
+    ("4096", 4096 * MB), ("64k", 64 << 10), (2, 2 * MB),
+])
+def test_parse_size(text, expected):
+    assert parse_size(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "8X", "G", "1..5G", "-1G"])
+def test_parse_size_rejects(text):
+    with pytest.raises(ValueError):
+        parse_size(text)
+
+
+def hour(mb, lazy=False):
+    n = mb * MB // 8
+    data = da.zeros(n, chunks=n) if lazy else np.zeros(n)
+    return xr.Dataset({"t2m": ("cell", data)})
+
+
+def test_resident_bytes_skips_lazy_variables():
+    assert resident_bytes(hour(2)) == 2 * MB
+    assert resident_bytes(hour(2, lazy=True)) == 0
+
+
+def test_depth_fits_headroom(monkeypatch):
+    rss = {"now": 600 * MB}
+    monkeypatch.setattr(memory, "current_rss", lambda: rss["now"])
+    budget = MemoryBudget(1000 * MB)
+
+    # Nothing observed yet: one hour at a time
+    assert budget.depth(8) == 1
+
+    budget.observe(hour(100), None)
+    assert budget.depth(8) == 4
+    assert budget.depth(2) == 2
+    rss["now"] = 980 * MB
+    assert budget.depth(8) == 1
+    rss["now"] = 1200 * MB
+    assert budget.depth(8) == 1
+
+
+def test_depth_smooths_hour_size(monkeypatch):
+    monkeypatch.setattr(memory, "current_rss", lambda: 0)
+    budget = MemoryBudget(1000 * MB, smoothing=0.5)
+    budget.observe(hour(100))
+    budget.observe(hour(300))
+    assert budget.hour_bytes == 200 * MB
+    assert budget.depth(8) == 5
+
+
+def test_lazy_hours_throttled_only_at_budget(monkeypatch):
+    rss = {"now": 900 * MB}
+    monkeypatch.setattr(memory, "current_rss", lambda: rss["now"])
+    budget = MemoryBudget(1000 * MB)
+    budget.observe(hour(100, lazy=True))
+
+    METRICS.reset()
+    assert budget.depth(6) == 6
+    rss["now"] = 1000 * MB
+    assert budget.depth(6) == 1
+    assert METRICS.counters["memory.depth_throttled"] == 1
+
+
+def test_input_chunks_line_up_with_zarr_tiles():
+    tasks = [{"bbox": (-118, -118 + w, 34, 35)} for w in (2.0, 3.0, 4.0)]
+    hrrr, rave = input_chunks(tasks, ChunkPolicy(spatial_chunk=128))
+
+    # Median fire is 3 deg (112 HRRR cells): one whole 128-cell zarr tile
+    assert hrrr == {"y": 128, "x": 128}
+    assert rave["grid_yt"] == rave["grid_xt"]
+    assert rave["grid_yt"] * RAVE_CELL_DEG == pytest.approx(128 * HRRR_CELL_DEG, abs=RAVE_CELL_DEG)
+
+    hrrr, _ = input_chunks(tasks, ChunkPolicy(spatial_chunk=48))
+    assert hrrr["y"] % 48 == 0 and hrrr["y"] >= 112
@@ -0,0 +1,77 @@
+import json
+import pytest
+import threading
+
+from pipeline import metrics
+from pipeline.metrics import Metrics
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(metrics.time, "perf_counter", clock)
+    return clock
+
+
+def test_nested_spans_each_record_their_own_time(clock):
+    m = Metrics()
+    with m.span("hour"):
+        clock.now += 1
+        for _ in range(3):
+            with m.span("fire"):
+                with m.span("fire.regrid"):
+                    clock.now += 2
+                clock.now += 1
+        clock.now += 1
+
+    spans = m.snapshot()["spans"]
+    assert spans["hour"] == {"count": 1, "total_s": 11.0, "max_s": 11.0}
+    assert spans["fire"] == {"count": 3, "total_s": 9.0, "max_s": 3.0}
+    assert spans["fire.regrid"] == {"count": 3, "total_s": 6.0, "max_s": 2.0}
+
+
+def test_span_closes_on_error(clock):
+    m = Metrics()
+    with pytest.raises(ValueError):
+        with m.span("outer"):
+            with m.span("inner"):
+                clock.now += 1
+                raise ValueError
+    assert m.spans["outer"]["count"] == m.spans["inner"]["count"] == 1
+
+
+def test_timed_and_threads_share_one_aggregate():
+    m = Metrics()
+    work = m.timed("work")(lambda: m.count("items"))
+    threads = [threading.Thread(target=lambda: [work() for _ in range(100)]) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert m.spans["work"]["count"] == m.counters["items"] == 400
+
+
+def test_merge_folds_worker_snapshots(clock, tmp_path):
+    parent, worker = Metrics(), Metrics()
+    with parent.span("fire"):
+        clock.now += 1
+    with worker.span("fire"):
+        clock.now += 4
+    worker.count("regrid.cells", 10)
+
+    parent.merge(worker.snapshot())
+    parent.merge(worker.snapshot())
+    assert parent.spans["fire"] == {"count": 3, "total_s": 9.0, "max_s": 4.0}
+    assert parent.counters["regrid.cells"] == 20
+
+    report = json.loads(parent.write(tmp_path / "metrics.json").read_text())
+    assert report["spans"] == parent.spans and "peak_rss_mb" in report
+    rows = parent.write(tmp_path / "metrics.csv").read_text().splitlines()
+    assert rows[0] == "kind,name,count,total_s,max_s,value"
+    assert "span,fire,3,9.000000,4.000000," in rows
@@ -0,0 +1,85 @@
+import random
+import threading
+import time
+import pandas as pd
+
+from pipeline.prefetch import PrefetchScheduler
+
+TIMES = pd.date_range("2024-07-01", periods=12, freq="1h")
+
+
+class StubFetcher:
+    """Fetcher stand-in: returns the hour after a random delay and tracks pinned hours."""
+
+    def __init__(self, source_name, fail=()):
+        self.source_name = source_name
+        self.fail = set(fail)
+        self.pinned = set()
+        self.max_pinned = 0
+        self.lock = threading.Lock()
+
+    def pin_timestamp(self, t):
+        with self.lock:
+            self.pinned.add(t)
+            self.max_pinned = max(self.max_pinned, len(self.pinned))
+
+    def cleanup_timestamp(self, t):
+        with self.lock:
+            self.pinned.discard(t)
+
+    def process(self, start, end, bbox=None, **kwargs):
+        time.sleep(random.uniform(0, 0.02))
+        if start in self.fail:
+            raise IOError("not found")
+        return Hour(start)
+
+
+class Hour:
+    def __init__(self, t):
+        self.t = t
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_hours_come_back_in_order_within_the_bound():
+    hrrr, rave = StubFetcher("HRRR"), StubFetcher("RAVE")
+    seen = []
+    with PrefetchScheduler(hrrr, rave, TIMES, depth=3, hrrr_workers=4, rave_workers=4) as scheduler:
+        for t, hrrr_ds, rave_ds in scheduler:
+            # The hour being handed out plus at most depth hours queued behind it
+            assert len(hrrr.pinned) <= 4
+            seen.append((t, hrrr_ds.t, rave_ds.t))
+
+    assert [s[0] for s in seen] == list(TIMES)
+    assert all(t == h == r for t, h, r in seen)
+    assert hrrr.max_pinned <= 4 and not hrrr.pinned and not rave.pinned
+
+
+def test_failed_downloads_and_skipped_rave_yield_none():
+    hrrr, rave = StubFetcher("HRRR", fail={TIMES[2]}), StubFetcher("RAVE")
+    skip = set(TIMES[5:8])
+    scheduler = PrefetchScheduler(hrrr, rave, TIMES, depth=2, rave_needed=lambda t: t not in skip)
+    try:
+        out = {t: (h, r) for t, h, r in scheduler}
+    finally:
+        scheduler.shutdown()
+
+    assert out[TIMES[2]][0] is None
+    assert all(out[t][1] is None for t in skip)
+    assert all(out[t][1] is not None for t in TIMES if t not in skip)
+
+
+def test_consumed_hours_are_closed_and_shutdown_releases_the_rest():
+    hrrr, rave = StubFetcher("HRRR"), StubFetcher("RAVE")
+    scheduler = PrefetchScheduler(hrrr, rave, TIMES, depth=3)
+    handed = []
+    for t, hrrr_ds, _ in scheduler:
+        handed.append(hrrr_ds)
+        if len(handed) == 3:
+            break
+    scheduler.shutdown()
+
+    assert all(ds.closed for ds in handed)
+    assert not hrrr.pinned and not rave.pinned
@@ -0,0 +1,127 @@
+import json
+import pandas as pd
+
+from fetchers.rave_fetcher import RAVEFetcher
+from fetchers.rave_index import RaveListingIndex
+
+BASE = "https://example.test/RAVE/"
+
+
+def name(t, version="c20240702"):
+    return f"RAVE-HrlyEmiss-3km_v2r0_blend_s{pd.Timestamp(t):%Y%m%d%H%M%S}0_e{pd.Timestamp(t):%Y%m%d%H}59590_{version}.nc"
+
+
+class Response:
+    def __init__(self, status_code, text="", etag=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {"ETag": etag} if etag else {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(f"HTTP {self.status_code}")
+
+
+class Listing:
+    """http_get stand-in serving one month directory with an ETag."""
+
+    def __init__(self, names):
+        self.names = names
+        self.requests = []
+
+    def __call__(self, url, headers=None):
+        self.requests.append((url, dict(headers or {})))
+        body = "".join(f'<a href="{n}">{n}</a>' for n in self.names)
+        etag = f'"{hash(body)}"'
+        if (headers or {}).get("If-None-Match") == etag:
+            return Response(304, etag=etag)
+        return Response(200, body, etag)
+
+
+JULY = pd.Period("2024-07", freq="M")
+OPEN = pd.Timestamp("2024-07-20")
+CLOSED = pd.Timestamp("2024-08-10")
+
+
+def test_open_month_revalidated_with_etag(tmp_path):
+    http = Listing([name("2024-07-01 00:00"), name("2024-07-01 01:00")])
+    index = RaveListingIndex(tmp_path / "listing.json", http, BASE)
+
+    assert index.refresh(JULY, now=OPEN)
+    assert not index.refresh(JULY, now=OPEN)
+    assert "If-None-Match" not in http.requests[0][1]
+    assert http.requests[1][1]["If-None-Match"]
+
+    # Entries survive the 304 and paths are stored relative to the base URL
+    assert index.months["2024/07"]["files"][0][1] == "2024/07/" + name("2024-07-01 00:00")
+    found = index.lookup("2024-07-01 00:00", "2024-07-01 00:30")
+    assert found == [("20240701000000", BASE + "2024/07/" + name("2024-07-01 00:00"))]
+
+
+def test_closed_month_not_requested_until_ttl(tmp_path):
+    http = Listing([name("2024-07-01 00:00")])
+    index = RaveListingIndex(tmp_path / "listing.json", http, BASE, closed_ttl=pd.Timedelta(days=30))
+
+    index.refresh(JULY, now=CLOSED)
+    assert index.months["2024/07"]["closed"]
+    index.refresh(JULY, now=CLOSED + pd.Timedelta(days=29))
+    assert len(http.requests) == 1
+
+    # Past the TTL a closed month costs one conditional request
+    http.names.append(name("2024-07-01 01:00"))
+    assert index.refresh(JULY, now=CLOSED + pd.Timedelta(days=31))
+    assert "If-None-Match" in http.requests[1][1]
+    assert len(index.lookup("2024-07-01", "2024-07-02")) == 2
+
+
+def test_index_keyed_on_base_url(tmp_path):
+    path = tmp_path / "listing.json"
+    index = RaveListingIndex(path, Listing([name("2024-07-01 00:00")]), BASE)
+    index.refresh(JULY, now=CLOSED)
+    index.save()
+
+    assert RaveListingIndex(path, None, BASE).months
+    assert not RaveListingIndex(path, None, "https://mirror.test/RAVE/").months
+
+    # Indexes written before the base URL was recorded held absolute URLs
+    path.write_text(json.dumps({"months": index.months}))
+    assert not RaveListingIndex(path, None, BASE).months
+
+
+def test_invalidate_forces_full_relist_once(tmp_path):
+    http = Listing([name("2024-07-01 00:00")])
+    index = RaveListingIndex(tmp_path / "listing.json", http, BASE)
+    index.refresh(JULY, now=CLOSED)
+
+    assert index.invalidate("2024-07-01 00:00")
+    assert not index.invalidate("2024-07-15 00:00")
+    index.refresh(JULY, now=CLOSED)
+    assert http.requests[-1][1] == {}
+
+
+def test_fetcher_relists_republished_file(tmp_path):
+    old, new = name("2024-07-01 00:00"), name("2024-07-01 00:00", version="c20240705")
+    http = Listing([old])
+    rave = RAVEFetcher(save_dir=tmp_path / "rave", listing_path=tmp_path / "listing.json", base_url=BASE)
+    rave.listing.http_get = http
+    [url] = rave.prefetch("2024-07-01 00:00", "2024-07-01 00:00").values()
+
+    fetched = []
+    def fetch(url, dest):
+        fetched.append(url)
+        if not url.endswith(new):
+            return None
+        dest.write_bytes(b"nc")
+        return dest
+
+    # The listed file is gone: the month is re-listed and the new file fetched
+    http.names = [new]
+    rave.downloader.fetch = fetch
+    assert rave._download_worker(url) == rave.save_dir / new
+    assert fetched == [BASE + "2024/07/" + old, BASE + "2024/07/" + new]
+    assert rave.url_map[pd.Timestamp("2024-07-01 00:00")] == BASE + "2024/07/" + new
+
+    # A file missing from the re-listed month too is not re-listed again
+    http.names = []
+    assert rave._download_worker(BASE + "2024/07/" + name("2024-07-01 02:00")) is None
+    assert len(http.requests) == 2
@@ -0,0 +1,9 @@
+import pickle
+import pytest
+
+from fetchers.raw_cache import RawFileCache
+
+
+def test_raw_cache_stays_in_process(tmp_path):
+    with pytest.raises(TypeError, match="root directory"):
+        pickle.dumps(RawFileCache(tmp_path))
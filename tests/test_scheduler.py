@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.manifest import empty_state, merge_state, missing_vars
+from pipeline.scheduler import ActiveFireSchedule
+
+TIMES = pd.date_range("2024-07-01", periods=96, freq="1h")
+
+
+def random_tasks(n, seed):
+    rng = np.random.default_rng(seed)
+    tasks = []
+    for i in range(n):
+        start = TIMES[0] + pd.Timedelta(hours=int(rng.integers(-24, 96)))
+        end = start + pd.Timedelta(hours=int(rng.integers(0, 48)))
+        if i % 7 == 3: start = None
+        if i % 11 == 5: end = None
+        tasks.append({"fire_id": f"F{i}", "start": start, "end": end})
+    return tasks
+
+
+def random_state(tasks, seed):
+    rng = np.random.default_rng(seed)
+    state = {}
+    for task in tasks[::2]:
+        stored = TIMES[rng.random(len(TIMES)) < 0.6]
+        state[task["fire_id"]] = merge_state(empty_state(), stored, ["t2m"])
+        if rng.random() < 0.5:
+            merge_state(state[task["fire_id"]], stored[::3], ["rave_frp"], backfill=True)
+    return state
+
+
+def naive_active(tasks, t, pad):
+    """The per-hour scan the schedule replaces: every task checked at every hour."""
+    active = []
+    for task in tasks:
+        if task["start"] is None or task["end"] is None:
+            active.append(task)
+        elif task["start"] - pd.Timedelta(hours=pad) <= t <= task["end"] + pd.Timedelta(hours=pad):
+            active.append(task)
+    return active
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("pad", [0, 6])
+def test_active_sets_match_naive_scan(seed, pad):
+    tasks = random_tasks(40, seed)
+    schedule = ActiveFireSchedule(tasks, time_pad_hours=pad)
+    for t, active in schedule.iter_active(TIMES):
+        assert active == naive_active(tasks, t, pad)
+
+
+@pytest.mark.parametrize("required", [None, {"t2m", "rave_frp"}])
+@pytest.mark.parametrize("seed", range(3))
+def test_plan_matches_naive_scan(seed, required):
+    tasks = random_tasks(30, seed)
+    state = random_state(tasks, seed)
+
+    expected = {}
+    for t in TIMES:
+        active = naive_active(tasks, t, 2)
+        for task in active:
+            s = state.get(task["fire_id"])
+            todo = (s is None or t not in s["times"]) if required is None else bool(missing_vars(s, t, required))
+            if todo:
+                expected[t] = active
+                break
+
+    assert ActiveFireSchedule(tasks, time_pad_hours=2).plan(TIMES, state, required=required) == expected
@@ -0,0 +1,106 @@
+import os
+import time
+import pandas as pd
+import pytest
+
+from pipeline.shard import WorkLedger, parse_shard, select_shard
+
+
+def plan(n_hours=48, n_fires=25):
+    """Hour plan with a varying number of active fires per hour."""
+    hours = pd.date_range("2024-07-01", periods=n_hours, freq="1h")
+    return {t: [{"fire_id": f"F{i}"} for i in range(n_fires) if (i + h) % 3] for h, t in enumerate(hours)}
+
+
+def units(hour_plan):
+    return [(task["fire_id"], t) for t, tasks in hour_plan.items() for task in tasks]
+
+
+@pytest.mark.parametrize("by", ["fire", "time"])
+@pytest.mark.parametrize("count", [1, 2, 3, 7])
+def test_shards_partition_every_unit(by, count):
+    full = plan()
+    shards = [units(select_shard(full, i, count, by=by)) for i in range(count)]
+    merged = [u for shard in shards for u in shard]
+    assert sorted(merged) == sorted(units(full))
+    assert len(set(merged)) == len(merged)
+
+
+def test_fire_shards_keep_a_fire_together():
+    full = plan()
+    owner = {}
+    for i in range(4):
+        for fid, _ in units(select_shard(full, i, 4, by="fire")):
+            assert owner.setdefault(fid, i) == i
+
+
+def test_time_shards_are_contiguous_and_balanced():
+    full = plan()
+    shards = [select_shard(full, i, 4, by="time") for i in range(4)]
+    for a, b in zip(shards, shards[1:]):
+        assert max(a) < min(b)
+    sizes = [len(units(s)) for s in shards]
+    assert max(sizes) - min(sizes) <= 2 * max(len(tasks) for tasks in full.values())
+
+
+def test_parse_shard():
+    assert parse_shard("3/8") == (3, 8)
+    for spec in ("8/8", "-1/4", "0/0"):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+def test_lease_held_until_stale(tmp_path):
+    first = WorkLedger(tmp_path, 0, 2, stale_after=60)
+    second = WorkLedger(tmp_path, 0, 2, stale_after=60)
+    second.owner = "other-host:1"
+    try:
+        assert first.acquire()
+        assert not second.acquire()
+
+        # The first worker stopped heart-beating a while ago
+        first._stop.set()
+        first._beat.join()
+        old = time.time() - 120
+        os.utime(first.lease_path, (old, old))
+        assert second.acquire()
+        assert first.lease_path.read_text() == "other-host:1"
+
+        # A worker that lost its lease does not remove the new owner's
+        first.release()
+        assert first.lease_path.exists()
+    finally:
+        second.release()
+    assert not first.lease_path.exists()
+
+
+def test_heartbeat_keeps_lease_fresh(tmp_path):
+    ledger = WorkLedger(tmp_path, 1, 2, stale_after=60, heartbeat_every=0.05)
+    assert ledger.acquire()
+    try:
+        old = time.time() - 120
+        os.utime(ledger.lease_path, (old, old))
+        time.sleep(0.3)
+        assert time.time() - ledger.lease_path.stat().st_mtime < 60
+        assert not WorkLedger(tmp_path, 1, 2, stale_after=60).acquire()
+    finally:
+        ledger.release()
+
+
+def test_pending_retries_failed_and_orphaned_units(tmp_path):
+    hours = pd.date_range("2024-07-01", periods=3, freq="1h")
+    full = {t: [{"fire_id": f"F{i}"} for i in range(3)] for t in hours}
+    t0, t1, t2 = hours
+    ledger = WorkLedger(tmp_path, 0, 1)
+    ledger.claim(t0, ["F1", "F2"])
+    ledger.done("F1", [t0])
+    ledger.claim(t1, ["F0", "F2"])
+    ledger.failed("F2", t1, "boom")
+    ledger.done("F0", [t1])
+    with open(ledger.log_path, "a") as f:
+        f.write('{"state": "done", "fir')  # torn line from a crash
+
+    todo = units(ledger.pending(full))
+    assert ("F1", t0) not in todo and ("F0", t1) not in todo
+    assert ("F2", t0) in todo and ("F2", t1) in todo
+    assert len(todo) == len(units(full)) - 2
@@ -0,0 +1,64 @@
+import warnings
+import numpy as np
+import pytest
+import scipy.sparse as sps
+import xarray as xr
+
+from processors.sparse_regrid import SparseRegridder
+
+
+def src_grid(ny=4, nx=5):
+    lat, lon = np.meshgrid(34 + 0.1 * np.arange(ny), 240 + 0.1 * np.arange(nx), indexing="ij")
+    frp = np.arange(2 * ny * nx, dtype="float32").reshape(2, ny, nx)
+    return xr.Dataset(
+        {"rave_frp": (("time", "grid_yt", "grid_xt"), frp)},
+        coords={"time": [0, 1], "lat": (("grid_yt", "grid_xt"), lat), "lon": (("grid_yt", "grid_xt"), lon)},
+    )
+
+
+def dst_grid(lat0=34.05, lon0=240.05, ny=3, nx=3, res=0.1):
+    lat, lon = np.meshgrid(lat0 + res * np.arange(ny), lon0 + res * np.arange(nx), indexing="ij")
+    return xr.Dataset(coords={"lat": (("y", "x"), lat), "lon": (("y", "x"), lon)})
+
+
+def half_mapped(src, dst):
+    """Destination cell k takes source cell k; the last three destination cells get no weight."""
+    n_out = dst.lat.size
+    rows = np.arange(n_out - 3)
+    matrix = sps.csr_matrix((np.ones(len(rows)), (rows, rows)), shape=(n_out, src.lat.size))
+    return matrix, src.lat.shape, dst.lat.shape, src.lat.dims, dst.lat.dims
+
+
+def test_unmapped_cells_are_zero_by_default():
+    src, dst = src_grid(), dst_grid()
+    out = SparseRegridder(*half_mapped(src, dst))(src, dst)
+    flat = out.rave_frp.values.reshape(2, -1)
+    assert out.rave_frp.dims == ("time", "y", "x") and out.rave_frp.dtype == np.float32
+    np.testing.assert_array_equal(flat[:, :6], src.rave_frp.values.reshape(2, -1)[:, :6])
+    assert (flat[:, 6:] == 0).all()
+
+
+def test_unmapped_to_nan_is_opt_in():
+    src, dst = src_grid(), dst_grid()
+    out = SparseRegridder(*half_mapped(src, dst), unmapped_to_nan=True)(src, dst)
+    flat = out.rave_frp.values.reshape(2, -1)
+    assert np.isnan(flat[:, 6:]).all() and not np.isnan(flat[:, :6]).any()
+
+
+@pytest.mark.parametrize("unmapped_to_nan", [False, True])
+def test_matches_xesmf_on_partially_covered_grid(tmp_path, unmapped_to_nan):
+    xe = pytest.importorskip("xesmf")
+    src = src_grid(8, 8)
+    # Half of the destination grid lies east of the source grid
+    dst = dst_grid(lat0=34.15, lon0=240.45, ny=5, nx=6)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        regridder = xe.Regridder(src, dst, "bilinear", unmapped_to_nan=unmapped_to_nan)
+        expected = regridder(src).rave_frp.values
+        regridder.to_netcdf(str(tmp_path / "w.nc"))
+
+    sparse = SparseRegridder.from_file(tmp_path / "w.nc", src, dst, unmapped_to_nan=unmapped_to_nan)
+    got = sparse(src, dst).rave_frp.values
+    assert (got == 0).any() or np.isnan(got).any()
+    np.testing.assert_allclose(got, expected, rtol=1e-6, equal_nan=True)
@@ -0,0 +1,56 @@
+import pandas as pd
+
+from fetchers.wfigs_cache import IncidentCache
+
+NOW = pd.Timestamp("2024-09-01")
+day = lambda d: pd.Timestamp("2024-01-01") + pd.Timedelta(days=d)
+
+
+def feature(oid, discovered, size):
+    return {"type": "Feature", "geometry": None, "properties": {
+        "OBJECTID": oid, "FireDiscoveryDateTime": int(discovered.value // 1_000_000), "IncidentSize": size,
+    }}
+
+
+def test_empty_cache_misses_everything(tmp_path):
+    cache = IncidentCache(tmp_path / "wfigs.sqlite")
+    assert cache.missing(day(0), day(10)) == [(day(0), day(10))]
+
+
+def test_gaps_between_covered_windows(tmp_path):
+    cache = IncidentCache(tmp_path / "wfigs.sqlite")
+    cache.store([], day(2), day(4), now=NOW)
+    cache.store([], day(6), day(8), now=NOW)
+    assert cache.missing(day(0), day(10)) == [(day(0), day(2)), (day(4), day(6)), (day(8), day(10))]
+    assert cache.missing(day(2), day(4)) == []
+    assert cache.missing(day(3), day(7)) == [(day(4), day(6))]
+
+
+def test_overlapping_windows_merge(tmp_path):
+    cache = IncidentCache(tmp_path / "wfigs.sqlite")
+    cache.store([], day(0), day(5), now=NOW)
+    cache.store([], day(3), day(9), now=NOW)
+    assert cache.missing(day(1), day(10)) == [(day(9), day(10))]
+
+
+def test_recent_part_of_window_is_refetched(tmp_path):
+    cache = IncidentCache(tmp_path / "wfigs.sqlite", refresh_days=30)
+    # Fetched on day 50: only discoveries up to day 20 are trusted
+    cache.store([], day(0), day(50), now=day(50))
+    assert cache.missing(day(0), day(50)) == [(day(20), day(50))]
+
+
+def test_coverage_only_counts_for_stricter_acre_filters(tmp_path):
+    cache = IncidentCache(tmp_path / "wfigs.sqlite")
+    cache.store([], day(0), day(10), min_acres=100, now=NOW)
+    assert cache.missing(day(0), day(10), min_acres=500) == []
+    assert cache.missing(day(0), day(10), min_acres=10) == [(day(0), day(10))]
+
+
+def test_select_filters_by_window_and_size(tmp_path):
+    cache = IncidentCache(tmp_path / "wfigs.sqlite")
+    feats = [feature(1, day(1), 50), feature(2, day(3), 500), feature(3, day(20), 500)]
+    cache.store(feats, day(0), day(30), now=NOW)
+    oids = lambda fs: sorted(f["properties"]["OBJECTID"] for f in fs)
+    assert oids(cache.select(day(0), day(10))) == [1, 2]
+    assert oids(cache.select(day(0), day(30), min_acres=100)) == [2, 3]
@@ -0,0 +1,82 @@
+import asyncio
+import pandas as pd
+import pytest
+
+from benchmarks.servers import wfigs_server
+from benchmarks.synthetic import make_wfigs_features
+from fetchers.wfigs_fetcher import WFIGSFetcher
+
+START, END = "2024-07-01", "2024-07-31"
+
+
+def ids(features):
+    return [f["properties"]["OBJECTID"] for f in features]
+
+
+def recording(fetcher):
+    """Records the query params of every request the fetcher sends."""
+    sent = []
+    get = fetcher.http.get
+    def wrapped(url, params=None, **kw):
+        sent.append(dict(params))
+        return get(url, params=params, **kw)
+    fetcher.http.get = wrapped
+    return sent
+
+
+@pytest.fixture
+def features():
+    return make_wfigs_features(2500, START, END)
+
+
+def test_pages_fan_out_after_count(features):
+    with wfigs_server(features) as srv:
+        fetcher = WFIGSFetcher(page_size=1000)
+        fetcher.URL = srv.url + "query"
+        sent = recording(fetcher)
+        got = fetcher._fetch_window(START, END, 0)
+
+    assert ids(got) == ids(features)
+    assert sent[0]["returnCountOnly"] == "true"
+    assert sorted(p["resultOffset"] for p in sent[1:]) == [0, 1000, 2000]
+
+
+def test_capped_pages_are_filled(features):
+    # The server returns at most 700 records, below the 1000 asked for
+    with wfigs_server(features, max_record_count=700) as srv:
+        fetcher = WFIGSFetcher(page_size=1000)
+        fetcher.URL = srv.url + "query"
+        sent = recording(fetcher)
+        got = fetcher._fetch_window(START, END, 0)
+
+    assert ids(got) == ids(features)
+    fills = sorted((p["resultOffset"], p["resultRecordCount"]) for p in sent[4:])
+    assert fills == [(700, 300), (1700, 300)]
+
+
+def test_async_pages_match_blocking(features):
+    from fetchers.async_http import AsyncHTTPClient
+
+    async def fetch(url):
+        fetcher = WFIGSFetcher(page_size=1000)
+        fetcher.URL = url + "query"
+        async with AsyncHTTPClient(per_host=4) as client:
+            return await fetcher._fetch_window_async(client, START, END, 0)
+
+    with wfigs_server(features, max_record_count=700) as srv:
+        assert ids(asyncio.run(fetch(srv.url))) == ids(features)
+
+
+def test_overlapping_windows_deduplicated(features, tmp_path):
+    with wfigs_server(features) as srv:
+        fetcher = WFIGSFetcher(cache_path=tmp_path / "wfigs.sqlite", page_size=1000)
+        fetcher.URL = srv.url + "query"
+        fetcher.fetch_data("2024-07-03", "2024-07-20", min_acres=0)
+        # The stub ignores the where clause, so the second gap serves every incident again
+        gdf = fetcher.fetch_data("2024-07-03", "2024-07-28", min_acres=0)
+
+    # Searched with two days of padding on either side
+    lo, hi = (pd.Timestamp(t).value // 1_000_000 for t in ("2024-07-01", "2024-07-30"))
+    expected = [i for i, f in zip(ids(features), features) if lo <= f["properties"]["FireDiscoveryDateTime"] <= hi]
+    assert gdf["OBJECTID"].is_unique
+    assert sorted(gdf["OBJECTID"]) == expected
@@ -0,0 +1,126 @@
+import math
+import geopandas as gpd
+import pandas as pd
+import pytest
+
+from fetchers.wfigs_fetcher import WFIGSFetcher
+
+DAY_MS = 86_400_000
+T0 = int(pd.Timestamp("2025-07-01").value // 1_000_000)
+
+
+def rowwise_fire_tasks(fetcher, gdf, base_pad=0.5):
+    """The original per-row generate_fire_tasks, kept as the reference."""
+    tasks = []
+    for idx, row in gdf.iterrows():
+        if row.geometry is None or row.geometry.is_empty: continue
+
+        acres = row.get("IncidentSize", 0)
+        if pd.isna(acres):
+            acres = 0
+
+        extra_pad = min((acres / 10000.0) * 0.1, 1.0)
+        dynamic_pad = base_pad + extra_pad
+
+        minx, miny, maxx, maxy = row.geometry.bounds
+        bbox_tuple = (minx - dynamic_pad, maxx + dynamic_pad, miny - dynamic_pad, maxy + dynamic_pad)
+
+        end_date = fetcher._parse_date(row.get("FireOutDateTime"))
+        end_date_type = "FireOutDateTime" if end_date is not None else None
+
+        if end_date is None:
+            end_date = fetcher._parse_date(row.get("ControlDateTime"))
+            if end_date is not None: end_date_type = "ControlDateTime"
+
+        if end_date is None:
+            end_date = fetcher._parse_date(row.get("ContainmentDateTime"))
+            if end_date is not None: end_date_type = "ContainmentDateTime"
+
+        tasks.append({
+            "fire_id": row.get("UniqueFireIdentifier", f"fire_{idx}"),
+            "name": row.get("IncidentName", "Unknown"),
+            "start": fetcher._parse_date(row.get("FireDiscoveryDateTime")),
+            "end": end_date,
+            "end_date_type": end_date_type,
+            "acres": acres,
+            "bbox": bbox_tuple,
+        })
+    return tasks
+
+
+def feature(k, size=500.0, out=None, control=None, contain=None, disc=T0, geometry=None):
+    lon, lat = -120.0 + k * 0.3, 35.0 + k * 0.1
+    return {
+        "type": "Feature",
+        "geometry": geometry if geometry is not None else {"type": "Point", "coordinates": [lon, lat]},
+        "properties": {
+            "OBJECTID": k + 1,
+            "UniqueFireIdentifier": f"2025-TEST-{k:04d}",
+            "IncidentName": f"TEST {k}",
+            "IncidentSize": size,
+            "FireDiscoveryDateTime": disc,
+            "FireOutDateTime": out,
+            "ControlDateTime": control,
+            "ContainmentDateTime": contain,
+        },
+    }
+
+
+def incidents():
+    features = [
+        feature(0, out=T0 + DAY_MS),
+        feature(1, control=T0 + 2 * DAY_MS, contain=T0 + DAY_MS),
+        feature(2, contain=T0 + 3 * DAY_MS),
+        feature(3),                                    # no end date
+        feature(4, size=None),                         # no size
+        feature(5, size=None, contain=T0 + DAY_MS),
+        feature(6, size=250_000.0),                    # pad capped at 1 degree
+        feature(7, out=0, control=T0 + DAY_MS),        # 0 counts as missing
+        feature(8, disc=None),                         # no discovery date
+        feature(9, geometry={"type": "Polygon", "coordinates": [[[-110, 40], [-109, 40], [-109, 41], [-110, 40]]]}),
+    ]
+    gdf = gpd.GeoDataFrame.from_features(features)
+    return gdf.set_crs(epsg=4326)
+
+
+def same(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    if isinstance(a, float) and math.isnan(a):
+        return isinstance(b, float) and math.isnan(b)
+    return a == b
+
+
+def assert_same_tasks(got, expected):
+    assert len(got) == len(expected)
+    for g, e in zip(got, expected):
+        assert g.keys() == e.keys()
+        for key in e:
+            if key == "bbox":
+                assert g[key] == pytest.approx(e[key])
+            else:
+                assert same(g[key], e[key]), (e["fire_id"], key, g[key], e[key])
+        # Missing sizes are an int 0, never 0.0
+        assert isinstance(g["acres"], int) == isinstance(e["acres"], int)
+
+
+@pytest.mark.parametrize("base_pad", [0.0, 0.5])
+def test_table_matches_rowwise(base_pad):
+    fetcher = WFIGSFetcher()
+    gdf = incidents()
+    assert_same_tasks(fetcher.generate_fire_tasks(gdf, base_pad=base_pad), rowwise_fire_tasks(fetcher, gdf, base_pad))
+
+
+def test_missing_columns_match_rowwise():
+    fetcher = WFIGSFetcher()
+    gdf = incidents().drop(columns=["IncidentSize", "IncidentName", "ControlDateTime"])
+    assert_same_tasks(fetcher.generate_fire_tasks(gdf), rowwise_fire_tasks(fetcher, gdf))
+
+
+def test_missing_values_are_none():
+    tasks = {t["fire_id"]: t for t in WFIGSFetcher().generate_fire_tasks(incidents())}
+    ongoing = tasks["2025-TEST-0003"]
+    assert ongoing["end"] is None and ongoing["end_date_type"] is None
+    assert tasks["2025-TEST-0004"]["acres"] == 0 and isinstance(tasks["2025-TEST-0004"]["acres"], int)
+    assert tasks["2025-TEST-0007"]["end_date_type"] == "ControlDateTime"
+    assert tasks["2025-TEST-0008"]["start"] is None
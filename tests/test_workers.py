@@ -0,0 +1,127 @@
+import concurrent.futures
+import multiprocessing
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from fetchers.hrrr_fetcher import HRRRFetcher
+from fetchers.rave_fetcher import RAVEFetcher
+from pipeline.writer import BufferedZarrWriter, ChunkPolicy
+from pipeline.workers import fire_windows, build_fire_hour, iter_fire_hours, share_dataset, open_shared
+from processors.grid import RegridderCache
+
+
+def hrrr_hour():
+    lat, lon = np.meshgrid(np.linspace(30, 40, 50), np.linspace(-120, -110, 60), indexing="ij")
+    return xr.Dataset(
+        {"t2m": (("y", "x"), np.arange(50 * 60, dtype="float64").reshape(50, 60))},
+        coords={"latitude": (("y", "x"), lat), "longitude": (("y", "x"), lon % 360)},
+    )
+
+
+def fetched_hour(t):
+    """An HRRR hour as the fetcher returns it: float32 fields with a length-1 time dim."""
+    ds = hrrr_hour().astype("float32")
+    return ds.assign(t2m=ds.t2m + pd.Timestamp(t).hour).expand_dims(time=[pd.Timestamp(t)])
+
+
+def rave_hour(t):
+    lat, lon = np.meshgrid(np.arange(29, 41, 0.1), np.arange(238, 252, 0.1), indexing="ij")
+    frp = np.full((1, *lat.shape), 5.0, dtype="float32")
+    return xr.Dataset(
+        {
+            "FRP_MEAN": (("time", "grid_yt", "grid_xt"), frp),
+            "grid_latt": (("grid_yt", "grid_xt"), lat.astype("float32")),
+            "grid_lont": (("grid_yt", "grid_xt"), lon.astype("float32")),
+        },
+        coords={"time": [pd.Timestamp(t)]},
+    )
+
+
+def nearest_weights(self, src_ds, dst_ds, weights_path):
+    """Stand-in for the ESMF weight build: each destination cell takes its nearest source cell."""
+    src = np.stack([src_ds.lat.values.ravel(), src_ds.lon.values.ravel()], axis=1)
+    dst = np.stack([dst_ds.lat.values.ravel(), dst_ds.lon.values.ravel()], axis=1)
+    col = np.array([np.argmin(((src - p) ** 2).sum(axis=1)) for p in dst])
+    xr.Dataset({
+        "row": ("n_s", np.arange(1, len(dst) + 1)),
+        "col": ("n_s", col + 1),
+        "S": ("n_s", np.ones(len(dst))),
+    }).to_netcdf(weights_path)
+
+
+def task(fid, bbox):
+    return {"fire_id": fid, "name": fid, "bbox": bbox, "temporal_clip_status": "CLIPPED"}
+
+
+@pytest.fixture
+def fetchers(tmp_path):
+    hrrr = HRRRFetcher(save_dir=tmp_path / "hrrr", index_dir=tmp_path / "grid_index", idx_dir=tmp_path / "idx")
+    rave = RAVEFetcher(save_dir=tmp_path / "rave", index_dir=tmp_path / "grid_index", listing_path=tmp_path / "listing.json")
+    return hrrr, rave
+
+
+def test_pool_matches_serial(fetchers, tmp_path):
+    hrrr, rave = fetchers
+    conus = hrrr_hour()
+    tasks = [task(f"F{i}", (-118 + i, -117 + i, 33, 34)) for i in range(3)] + [task("miss", (0, 1, 0, 1))]
+
+    serial = list(iter_fire_hours(tasks, conus, None, hrrr, rave, tmp_path / "w", rave_for=set()))
+    pool = concurrent.futures.ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        pooled = list(iter_fire_hours(tasks, conus, None, hrrr, rave, tmp_path / "w", pool=pool, rave_for=set()))
+    finally:
+        pool.shutdown()
+
+    for (t1, m1, e1), (t2, m2, e2) in zip(serial, pooled):
+        assert t1["fire_id"] == t2["fire_id"]
+        if t1["fire_id"] == "miss":
+            assert m1 is None and m2 is None and e1 is not None and e2 is not None
+        else:
+            assert e1 is None and e2 is None
+            xr.testing.assert_identical(m1.load(), m2)
+
+
+def test_missing_rave_hour_matches_regridded_layout(fetchers, tmp_path, monkeypatch):
+    monkeypatch.setattr(RegridderCache, "_build_weights", nearest_weights)
+    hrrr, rave = fetchers
+    fire = task("F1", (-118, -116, 33, 35))
+    t0, t1, t2 = pd.date_range("2024-07-01", periods=3, freq="1h")
+
+    def hour(t, with_rave):
+        hrrr_conus = fetched_hour(t)
+        rave_conus = rave_hour(t) if with_rave else None
+        windows = fire_windows(fire, hrrr_conus, rave_conus, hrrr, rave)
+        return build_fire_hour(fire, hrrr_conus, rave_conus, windows, tmp_path / "w")
+
+    regridded, missing = hour(t0, True), hour(t1, False)
+    assert regridded.rave_frp.dims == missing.rave_frp.dims == ("time", "y", "x")
+    assert regridded.rave_frp.dtype == missing.rave_frp.dtype == np.float32
+    assert missing.indexes["time"][0] == t1 and missing.rave_frp.isnull().all()
+
+    # Buffered together, or appended after a group that started without RAVE
+    writer = BufferedZarrWriter(tmp_path / "fires.zarr", flush_hours=2, policy=ChunkPolicy(time_chunk=2))
+    writer.append("F1", regridded)
+    writer.append("F1", missing)
+    writer.append("F2", missing)
+    writer.flush()
+    writer.append("F2", hour(t2, True))
+    writer.close()
+
+    for fid in ("F1", "F2"):
+        stored = xr.open_zarr(tmp_path / "fires.zarr", group=fid, consolidated=False)
+        assert stored.rave_frp.dims == ("time", "y", "x")
+        assert stored.rave_frp.dtype == np.float32
+        assert stored.sizes["time"] == 2
+    assert (stored.rave_frp.isel(time=1) == 5.0).all()
+
+
+def test_shared_dataset_keeps_grid_mapping_coord(tmp_path):
+    # Decoded HRRR hours carry Herbie's CF grid mapping as a 0-d None coordinate
+    ds = hrrr_hour().assign_coords(gribfile_projection=None)
+    ds.gribfile_projection.attrs = {"grid_mapping_name": "lambert_conformal_conic", "standard_parallel": [38.5, 38.5]}
+    ds.t2m.attrs["grid_mapping"] = "gribfile_projection"
+
+    shared = open_shared(share_dataset(ds, root=tmp_path))
+    xr.testing.assert_identical(shared, ds)
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from pipeline.manifest import StoreManifest
+from pipeline.writer import BufferedZarrWriter, ChunkPolicy
+
+TIMES = pd.date_range("2024-07-01", periods=10, freq="1h")
+
+
+def hour(t, names=("t2m",), ny=6, nx=5):
+    t = pd.Timestamp(t)
+    data = {
+        name: (("time", "y", "x"), np.full((1, ny, nx), t.hour + 100 * i, dtype="float32"))
+        for i, name in enumerate(names)
+    }
+    return xr.Dataset(data, coords={
+        "time": [t],
+        "latitude": (("y", "x"), np.linspace(30, 31, ny * nx).reshape(ny, nx)),
+        "longitude": (("y", "x"), np.linspace(-120, -119, ny * nx).reshape(ny, nx)),
+    })
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "fires.zarr"
+    manifest = StoreManifest(path)
+    written = []
+    writer = BufferedZarrWriter(
+        path, flush_hours=6, policy=ChunkPolicy(time_chunk=4, spatial_chunk=4),
+        manifest=manifest, on_write=lambda fid, times: written.append((fid, len(times))),
+    )
+    return path, writer, manifest, written
+
+
+def test_append_batches_by_flush_hours(store):
+    path, writer, manifest, written = store
+    for t in TIMES:
+        writer.append("F1", hour(t))
+    assert written == [("F1", 6)]
+
+    writer.close()
+    assert written == [("F1", 6), ("F1", 4)]
+
+    ds = xr.open_zarr(path, group="F1", consolidated=False)
+    assert (ds.indexes["time"] == TIMES).all()
+    np.testing.assert_array_equal(ds.t2m.values[:, 0, 0], TIMES.hour)
+    assert ds.t2m.encoding["chunks"] == (4, 4, 4)
+
+    state = manifest.state("F1")
+    assert (state["times"] == TIMES).all() and state["vars"] == {"t2m"}
+
+
+def test_backfill_new_variable(store):
+    path, writer, manifest, _ = store
+    for t in TIMES:
+        writer.append("F1", hour(t))
+    writer.flush()
+
+    # A new variable for a scattered subset of the stored hours, flushed as one
+    # batch that does not line up with the time chunks
+    filled = TIMES[[1, 2, 3, 4, 5, 8]]
+    for t in filled:
+        writer.write_variables("F1", hour(t, names=("t2m", "frp")).drop_vars("t2m"))
+    writer.close()
+
+    ds = xr.open_zarr(path, group="F1", consolidated=False)
+    frp = ds.frp.load()
+    assert ds.frp.encoding["chunks"] == (4, 4, 4)
+    np.testing.assert_array_equal(frp.sel(time=filled).values[:, 0, 0], filled.hour + 100)
+    assert frp.sel(time=TIMES.difference(filled)).isnull().all()
+    np.testing.assert_array_equal(ds.t2m.values[:, 0, 0], TIMES.hour)
+
+    state = manifest.state("F1")
+    assert state["vars"] == {"t2m", "frp"}
+    assert (state["var_times"]["frp"] == filled).all()
+
+
+def test_close_raises_flush_errors(store):
+    path, writer, _, _ = store
+    writer.append("F1", hour(TIMES[0]))
+    # Backfilling a group that was never written fails at flush time
+    writer.write_variables("F2", hour(TIMES[0]))
+    with pytest.raises(Exception):
+        writer.close()
+    # The healthy fire was still written
+    assert xr.open_zarr(path, group="F1", consolidated=False).sizes["time"] == 1
+
+
+def test_single_hour_first_flush_keeps_later_times(store):
+    path, writer, _, _ = store
+    first = hour(TIMES[0])
+    first.time.encoding = {"units": "days since 2024-07-01", "dtype": "int64"}
+    writer.append("F1", first)
+    writer.flush()
+    for t in TIMES[1:3]:
+        writer.append("F1", hour(t))
+    writer.close()
+
+    ds = xr.open_zarr(path, group="F1", consolidated=False)
+    assert (ds.indexes["time"] == TIMES[:3]).all()